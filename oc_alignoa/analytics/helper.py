@@ -148,7 +148,8 @@ def get_api_url(df, verbose=True):
     return result
 
 
-def get_openalex_full_metadata(query_list: List[str], inp_dir: str, out_dir: str) -> None:
+def get_openalex_full_metadata(query_list: List[str], inp_dir: str, out_dir: str, decompression: str = 'auto',
+                               compression: Union[str, None] = None) -> None:
     """
     Retrieves from the OpenAlex dump the full metadata about the bibliographic resources identified by the OpenAlex IDs
     in the input query_list; stores the output to a CSV file. A reciprocally compatible query_list and inp_dir
@@ -158,14 +159,17 @@ def get_openalex_full_metadata(query_list: List[str], inp_dir: str, out_dir: str
         :param query_list: a list of strings of the form 'W\d+' or 'S\d+' (e.g. 'W12345678' or 'S12345678').
         :param inp_dir: either the path to the Works folder or the Sources folder of the OA dump.
         :param out_dir: the path to the output folder, where the results will be stored in JSON-L files.
+        :param decompression: the backend used to decompress the files of the OA dump (see utils.get_decompression_backend()).
+        :param compression: the codec used to compress the output JSON-L files, one among 'gzip', 'zstd' and 'lz4'
+            (default: None, plain files), see utils.MultiFileWriter.
         :return:
     """
     query_set = set(query_list)
     makedirs(out_dir, exist_ok=True)
     oaid_iri_prefix = 'https://openalex.org/'
 
-    with MultiFileWriter(out_dir, file_extension='json') as writer:
-        for record in OpenAlexProcessor.read_compressed_openalex_dump(inp_dir):
+    with MultiFileWriter(out_dir, file_extension='json', compression=compression) as writer:
+        for record in OpenAlexProcessor.read_compressed_openalex_dump(inp_dir, decompression=decompression):
             if record['id'].removeprefix(oaid_iri_prefix) in query_set:
                 writer.write_row(record)
 
@@ -230,7 +234,7 @@ def intersect_venues_primary_entities(meta_archive_path:str, omid_db_path:str):
         cur = conn.cursor()
         query = 'SELECT omid FROM Omid WHERE omid = ?'
         visited_venues = set()
-        for row in tqdm(mp.read_compressed_meta_dump(meta_archive_path)):
+        for row in tqdm(mp.read_compressed_meta_dump(meta_archive_path, columns=['venue'])):
             v = row['venue']
             if not v:
                 continue
@@ -1,5 +1,5 @@
 from collections import defaultdict
-from oc_alignoa.utils import read_csv_tables, MultiFileWriter
+from oc_alignoa.utils import read_csv_tables, MultiFileWriter, open_compressed, JSON_FILE_EXTENSIONS
 from helper import create_mm_oaids_lists, get_openalex_full_metadata
 from oc_alignoa.mapping import OpenAlexProcessor
 from pprint import pprint
@@ -134,9 +134,14 @@ class OpenAlexFlattener:
         writer.writeheader()
         return writer
 
+    @staticmethod
+    def _list_jsonl_files(inp_dir: str) -> list:
+        return [f for f in glob.glob(os.path.join(inp_dir, '*.json*')) if f.endswith(JSON_FILE_EXTENSIONS)]
+
     def flatten_sources(self, inp_dir: str):
         """
-        Modified to read non-compressed (.json) files in a flat directory, instead of compressed files in a directory tree.
+        Modified to read JSON-L files in a flat directory, instead of compressed files in a directory tree. The files
+        can be either plain (.json) or compressed with gzip, zstd or lz4 (e.g. .json.zst), see utils.open_compressed().
         :param inp_dir: the directory storing the file to be flattened (used for inserting multi-mapped OpenAlex full
         records into a relational database).
         :return:
@@ -161,9 +166,9 @@ class OpenAlexFlattener:
             seen_source_ids = set()
 
             files_done = 0
-            for jsonl_file_name in tqdm(glob.glob(os.path.join(inp_dir, '*.json'))):
+            for jsonl_file_name in tqdm(self._list_jsonl_files(inp_dir)):
                 print(jsonl_file_name)
-                with open(jsonl_file_name, 'r', newline='', encoding='utf-8') as sources_jsonl:
+                with open_compressed(jsonl_file_name, 'rt', newline='', encoding='utf-8') as sources_jsonl:
                     for source_json in sources_jsonl:
                         if not source_json.strip():
                             continue
@@ -195,7 +200,8 @@ class OpenAlexFlattener:
 
     def flatten_works(self, inp_dir: str):
         """
-        Modified to read non-compressed (.part) files in a flat directory, instead of compressed files in a directory tree.
+        Modified to read JSON-L files in a flat directory, instead of compressed files in a directory tree. The files
+        can be either plain (.json) or compressed with gzip, zstd or lz4 (e.g. .json.zst), see utils.open_compressed().
         :param inp_dir: the directory storing the file to be flattened (used for inserting multi-mapped OpenAlex full
         records into a relational database).
         :return:
@@ -230,9 +236,9 @@ class OpenAlexFlattener:
             related_works_writer = self._init_dict_writer(related_works_csv, file_spec['related_works'])
 
             files_done = 0
-            for jsonl_file_name in tqdm(glob.glob(os.path.join(inp_dir, '*.json'))):
+            for jsonl_file_name in tqdm(self._list_jsonl_files(inp_dir)):
                 print(jsonl_file_name)
-                with open(jsonl_file_name, 'r', newline='', encoding='utf-8') as works_jsonl:
+                with open_compressed(jsonl_file_name, 'rt', newline='', encoding='utf-8') as works_jsonl:
                     for work_json in works_jsonl:
                         if not work_json.strip():
                             continue
@@ -702,13 +708,17 @@ if __name__ == '__main__':
     mm_works_list, mm_sources_list = create_mm_oaids_lists(config['mm_csv_dir'])
 
     print(f'Unzipping OpenAlex compressed JSON-L files of all Sources to {config["sources_full_metadata_dir"]}.')
-    with MultiFileWriter(config['sources_full_metadata_dir'], file_extension='json') as writer:
-        for row in OpenAlexProcessor.read_compressed_openalex_dump(config['oa_dump_sources']):
-            writer.write(row)
+    with MultiFileWriter(config['sources_full_metadata_dir'], file_extension='json',
+                         compression=config.get('compression')) as writer:
+        for row in OpenAlexProcessor.read_compressed_openalex_dump(config['oa_dump_sources'],
+                                                                   decompression=config.get('decompression', 'auto')):
+            writer.write_row(row)
 
     print(f'Writing full metadata JSON-L files for multi-mapped Works at {config["works_full_metadata_dir"]}.')
     get_openalex_full_metadata(query_list=mm_works_list, inp_dir=config['oa_dump_works'],
-                               out_dir=config['works_full_metadata_dir'])
+                               out_dir=config['works_full_metadata_dir'],
+                               decompression=config.get('decompression', 'auto'),
+                               compression=config.get('compression'))
 
     # >> (2) Flatten into CSV files the JSON-L files containing the records selected in the previous step.
     print(f'Flattening full metadata JSON-L files for multi-mapped Works at {config["works_full_metadata_dir"]}.')
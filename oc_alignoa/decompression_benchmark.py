@@ -0,0 +1,62 @@
+#!python
+# Copyright (c) 2023 Elia Rizzetto <elia.rizzetto@studio.unibo.it>.
+#
+# Permission to use, copy, modify, and/or distribute this software for any purpose
+# with or without fee is hereby granted, provided that the above copyright notice
+# and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND
+# FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT, INDIRECT,
+# OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS OF USE,
+# DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS
+# SOFTWARE.
+
+from oc_alignoa.utils import open_gzip, get_decompression_backend, DECOMPRESSION_BACKENDS
+from os.path import getsize
+import argparse
+import time
+
+
+def benchmark_decompression(file_paths: list, backends: list = DECOMPRESSION_BACKENDS, chunk_size: int = 1 << 20) -> dict:
+    """
+    Measures the throughput of each decompression backend on a set of local gzip files (e.g. a few part files of the
+    OpenAlex dump), by reading them entirely in chunks.
+    :param file_paths: the paths to the .gz files to decompress
+    :param backends: the backends to measure (default: all of them). Backends that are not available are skipped.
+    :param chunk_size: the number of bytes read at a time (default: 1 MiB)
+    :return: a dict mapping the name of each measured backend to a dict storing the elapsed time in seconds ('seconds'),
+        the compressed input throughput ('in_mb_s') and the decompressed output throughput ('out_mb_s') in MB/s
+    """
+    compressed_bytes = sum(getsize(f) for f in file_paths)
+    results = dict()
+    for backend in backends:
+        if get_decompression_backend(backend) != backend:
+            print(f'{backend}: not available, skipped')
+            continue
+        decompressed_bytes = 0
+        start_time = time.perf_counter()
+        for file_path in file_paths:
+            with open_gzip(file_path, backend) as f:
+                while chunk := f.read(chunk_size):
+                    decompressed_bytes += len(chunk)
+        elapsed = time.perf_counter() - start_time
+        results[backend] = {
+            'seconds': elapsed,
+            'in_mb_s': compressed_bytes / elapsed / 1e6,
+            'out_mb_s': decompressed_bytes / elapsed / 1e6,
+        }
+        print(f"{backend}: {elapsed:.2f} s, {results[backend]['in_mb_s']:.1f} MB/s compressed, "
+              f"{results[backend]['out_mb_s']:.1f} MB/s decompressed")
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure the throughput of the available gzip decompression backends.')
+    parser.add_argument('files', nargs='+', help='Paths to local .gz files, e.g. part files of the OpenAlex dump.')
+    parser.add_argument('--backends', '-b', nargs='+', default=list(DECOMPRESSION_BACKENDS),
+                        choices=DECOMPRESSION_BACKENDS, help='The backends to measure (default: all).')
+    args = parser.parse_args()
+
+    benchmark_decompression(args.files, args.backends)
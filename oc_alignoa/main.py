@@ -25,6 +25,9 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Process and map OMID to OpenAlex IDs.')
     parser.add_argument('--config', '-c', dest='config', type=str, default='mapping_config.yaml',
                         help='Path to the YAML configuration file.')
+    parser.add_argument('--resume', action='store_true',
+                        help='Resume an interrupted run: the extraction stages restart from their last checkpoint and the '
+                             'database tables already completed are skipped.')
 
 
     args = parser.parse_args()
@@ -39,19 +42,36 @@ if __name__ == '__main__':
     mapping = Mapping()
 
     # Extract OMIDs, PIDs and types from meta tables and make new tables
-    meta_processor.preprocess_meta_tables(**settings['meta_tables'])
+    meta_processor.preprocess_meta_tables(**settings['meta_tables'], resume=args.resume)
 
-    # Create CSV table for OpenAlex Work IDs
-    openalex_processor.create_openalex_ids_table(**settings['openalex_works'])
-    # Create CSV table for OpenAlex Source IDs
-    openalex_processor.create_openalex_ids_table(**settings['openalex_sources'])
+    if settings.get('direct_db_load'):
+        # Stream PIDs in OpenAlex directly from the dump into the database tables
+        for direct_db_load_settings in settings['direct_db_load'].values():
+            openalex_processor.load_openalex_ids_db(**direct_db_load_settings, resume=args.resume)
+    else:
+        # Create CSV table for OpenAlex Work IDs
+        openalex_processor.create_openalex_ids_table(**settings['openalex_works'], resume=args.resume)
+        # Create CSV table for OpenAlex Source IDs
+        openalex_processor.create_openalex_ids_table(**settings['openalex_sources'], resume=args.resume)
 
-    # Create database tables for PIDs in OpenAlex
-    openalex_processor.create_id_db_table(**settings['db_works_doi'])
-    openalex_processor.create_id_db_table(**settings['db_works_pmid'])
-    openalex_processor.create_id_db_table(**settings['db_works_pmcid'])
-    openalex_processor.create_id_db_table(**settings['db_sources_issn'])
-    openalex_processor.create_id_db_table(**settings['db_sources_wikidata'])
+        # Create database tables for PIDs in OpenAlex
+        openalex_processor.create_id_db_table(**settings['db_works_doi'], resume=args.resume)
+        openalex_processor.create_id_db_table(**settings['db_works_pmid'], resume=args.resume)
+        openalex_processor.create_id_db_table(**settings['db_works_pmcid'], resume=args.resume)
+        openalex_processor.create_id_db_table(**settings['db_sources_issn'], resume=args.resume)
+        openalex_processor.create_id_db_table(**settings['db_sources_wikidata'], resume=args.resume)
+
+        # Create the CSV and database tables for the PIDs of responsible agents, if configured (see meta_mapping)
+        for ra_entities in ['authors', 'institutions', 'funders']:
+            if settings.get(f'openalex_{ra_entities}'):
+                openalex_processor.create_openalex_ids_table(**settings[f'openalex_{ra_entities}'], resume=args.resume)
+        for ra_table in ['db_authors_orcid', 'db_institutions_ror', 'db_funders_ror']:
+            if settings.get(ra_table):
+                openalex_processor.create_id_db_table(**settings[ra_table], resume=args.resume)
 
     # Map OMID to OpenAlex IDs
-    mapping.map_omid_openalex_ids(**settings['mapping'])
+    if settings.get('meta_mapping'):
+        # Map the primary entities, the venues and the responsible agents in a single stage
+        mapping.map_meta_tables(**settings['meta_mapping'])
+    else:
+        mapping.map_omid_openalex_ids(**settings['mapping'])
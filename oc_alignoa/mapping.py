@@ -13,23 +13,62 @@
 # ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS
 # SOFTWARE.
 
-from os.path import join, splitext, basename, isdir
-from os import listdir, makedirs, walk
+from os.path import join, splitext, basename, isdir, relpath, exists, getsize, abspath, dirname
+from os import listdir, makedirs, walk, sep, remove, stat
 import csv
+import shutil
 import json
 from io import TextIOWrapper
 from zipfile import ZipFile
 from typing import Generator, Literal, Union
 import logging
-import gzip
 import sqlite3 as sql
 from csv import DictReader, DictWriter
 from tqdm import tqdm
 import time
-from oc_alignoa.utils import read_csv_tables, MultiFileWriter
+import re
+import math
+from contextlib import closing, ExitStack
+from collections import defaultdict
+from itertools import groupby
+from operator import itemgetter
+import tempfile
+from urllib.request import pathname2url
+from hashlib import blake2b
+import pandas as pd
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from oc_alignoa.utils import read_csv_tables, read_table_file, list_table_files, open_gzip, MultiFileWriter, \
+    SchemeRoutingWriter, CheckpointJournal, ExternalDeduplicator, ExternalSorter, LRUCache, get_writer_options, \
+    skip_records_with_id_prefix, remove_table_files
+
+CHECKPOINT_FILE = 'checkpoint.jsonl'  # name of the journal file written in the output directory of a checkpointed process
+TableFormat = Literal['csv', 'parquet', 'csv.gz', 'csv.zst', 'csv.lz4']  # see utils.get_writer_options()
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+    pc = None
 
 
 class MetaProcessor:
+    VENUE_FIELDNAMES = ['omid', 'ids']  # fields of the rows of the 'venues' table
+    RA_FIELDNAMES = ['omid', 'ids', 'ra_role']  # fields of the rows of the 'resp_ags' table
+    TABLE_FIELDNAMES = {'primary_ents': ['omid', 'ids', 'type'], 'venues': VENUE_FIELDNAMES, 'resp_ags': RA_FIELDNAMES}
+    # fields of the rows of the OC Meta dump needed to create each reduced table
+    TABLE_COLUMNS = {
+        'primary_ents': ['id', 'type'],
+        'venues': ['id', 'venue'],
+        'resp_ags': ['id', 'author', 'publisher', 'editor'],
+    }
+
     def __init__(self):
         pass
 
@@ -122,18 +161,252 @@ class MetaProcessor:
                     continue
 
     @staticmethod
-    def read_compressed_meta_dump(csv_dump_path: str):
+    def read_compressed_meta_dump(csv_dump_path: str, columns: Union[list, None] = None, skip_openalex: bool = False):
+        """
+        Reads all the CSV files of the OC Meta dump, one row at a time (see read_meta_dump_member()).
+        :param csv_dump_path: the Zip archive storing the OC Meta CSV dump
+        :param columns: the fields to keep in the output rows (default: None, i.e. all the fields)
+        :param skip_openalex: if True, the rows whose entity already has an OpenAlex ID are skipped (default: False)
+        :return: a generator of dicts, each corresponding to a row of the dump
+        """
+        with ZipFile(csv_dump_path) as archive:
+            for csv_file in tqdm(archive.namelist()):
+                if csv_file.endswith('.csv'):
+                    yield from MetaProcessor.read_meta_dump_member(archive, csv_file, columns, skip_openalex)
+
+    @staticmethod
+    def read_meta_dump_member(archive: ZipFile, csv_file: str, columns: Union[list, None] = None,
+                              skip_openalex: bool = False):
+        """
+        Reads a single CSV file of the OC Meta dump from the already opened Zip archive storing it.
+        :param archive: the opened Zip archive storing the OC Meta CSV dump
+        :param csv_file: the name of the CSV file inside the archive
+        :param columns: the fields to keep in the output rows (default: None, i.e. all the fields). The values of the
+            other fields are dropped as soon as each line is parsed, without building a dict over the whole row.
+        :param skip_openalex: if True, the rows whose 'id' field stores an OpenAlex ID are skipped on the raw bytes of
+            the lines, before they are decoded and parsed (see utils.skip_records_with_id_prefix()) (default: False)
+        :return: a generator of dicts, each corresponding to a row of the CSV file
+        """
         csv.field_size_limit(131072 * 12)
+        logging.info(f'Processing file {csv_file}')
+        with archive.open(csv_file, 'r') as f:
+            if skip_openalex:
+                lines = skip_records_with_id_prefix(f, 'id', 'openalex:')
+            else:
+                lines = TextIOWrapper(f, encoding='utf-8')
+            if columns is None:
+                yield from DictReader(lines, dialect='unix')
+                return
+            reader = csv.reader(lines, dialect='unix')
+            header = next(reader, [])
+            missing = [col for col in columns if col not in header]
+            if missing:
+                raise ValueError(f'Columns {missing} not found in the header of {csv_file}')
+            positions = [(col, header.index(col)) for col in columns]
+            for row in reader:
+                if len(row) < len(header):  # as DictReader, fill the missing fields with None
+                    row += [None] * (len(header) - len(row))
+                yield {col: row[i] for col, i in positions}
+
+    @staticmethod
+    def read_meta_dump_member_chunks(archive: ZipFile, csv_file: str, chunk_size: int = 100000,
+                                     columns: Union[list, None] = None):
+        """
+        Reads a single CSV file of the OC Meta dump from the already opened Zip archive storing it, in chunks of
+        chunk_size rows. All the values are read as strings, empty values included.
+        :param archive: the opened Zip archive storing the OC Meta CSV dump
+        :param csv_file: the name of the CSV file inside the archive
+        :param chunk_size: the number of rows in each chunk (default: 100,000)
+        :param columns: the fields to read (default: None, i.e. all the fields). The values of the other fields are
+            skipped by the parser and never converted to strings.
+        :return: a generator of pyarrow RecordBatches, each storing a chunk of the rows of the CSV file
+        """
+        logging.info(f'Processing file {csv_file}')
+        with archive.open(csv_file, 'r') as f:
+            for chunk in pd.read_csv(f, encoding='utf-8', dtype=str, keep_default_na=False, chunksize=chunk_size,
+                                     usecols=columns):
+                schema = pa.schema([(col, pa.string()) for col in chunk.columns])
+                yield from pa.Table.from_pandas(chunk, schema, preserve_index=False).combine_chunks().to_batches()
+
+    @staticmethod
+    def read_compressed_meta_dump_chunks(csv_dump_path: str, chunk_size: int = 100000,
+                                         columns: Union[list, None] = None):
+        """
+        Reads all the CSV files of the OC Meta dump in chunks of chunk_size rows (see read_meta_dump_member_chunks()).
+        :param csv_dump_path: the Zip archive storing the OC Meta CSV dump
+        :param chunk_size: the number of rows in each chunk (default: 100,000)
+        :param columns: the fields to read (default: None, i.e. all the fields)
+        :return: a generator of pyarrow RecordBatches
+        """
         with ZipFile(csv_dump_path) as archive:
             for csv_file in tqdm(archive.namelist()):
                 if csv_file.endswith('.csv'):
-                    logging.info(f'Processing file {csv_file}')
-                    with archive.open(csv_file, 'r') as f:
-                        reader = DictReader(TextIOWrapper(f, encoding='utf-8'), dialect='unix')
-                        for row in reader:
-                            yield row
+                    yield from MetaProcessor.read_meta_dump_member_chunks(archive, csv_file, chunk_size, columns)
 
-    def preprocess_meta_tables(self, meta_dump_zip:str, meta_ids_out:str, all_rows:bool = True) -> None:
+    @staticmethod
+    def has_id_prefix(ids, prefix: str) -> np.ndarray:
+        """
+        Vectorised check of whether any of the whitespace-separated IDs in each string starts with prefix.
+        :param ids: a pyarrow array of strings of whitespace-separated IDs
+        :param prefix: the prefix of the IDs (e.g. 'openalex:')
+        :return: a boolean numpy array with one element for each string
+        """
+        tokens = pc.utf8_split_whitespace(ids)
+        parents = pc.list_parent_indices(tokens).to_numpy()
+        matches = pc.starts_with(pc.list_flatten(tokens), prefix).to_numpy(zero_copy_only=False)
+        return np.bincount(parents[matches], minlength=len(ids)) > 0
+
+    @staticmethod
+    def split_omid_and_ids(ids) -> tuple:
+        """
+        Vectorised counterpart of the extraction of the OMID and of the other PIDs of an entity from a string of
+        whitespace-separated IDs, as done by get_entity_ids(), get_venue_ids() and get_ra_ids(): the strings are split
+        into a flat array of IDs, the 'omid:' IDs are told apart from the others, and the other IDs are joined back
+        into one string for each input string.
+        :param ids: a pyarrow array of strings of whitespace-separated IDs (e.g. 'omid:br/06070 issn:2703-1012')
+        :return: a tuple of two pyarrow arrays: the OMIDs (the last 'omid:' ID of each string, or an empty string) and
+            the other IDs, separated by a single whitespace
+        """
+        tokens = pc.utf8_split_whitespace(ids)
+        flat = pc.list_flatten(tokens)
+        parents = pc.list_parent_indices(tokens).to_numpy()
+        is_omid = pc.starts_with(flat, 'omid:').to_numpy(zero_copy_only=False)
+
+        last_omid = np.full(len(ids), -1, dtype=np.int64)
+        np.maximum.at(last_omid, parents[is_omid], np.flatnonzero(is_omid))
+        omids = pc.fill_null(pc.take(flat, pa.array(last_omid, mask=last_omid < 0)), '')
+
+        offsets = np.zeros(len(ids) + 1, dtype=np.int32)
+        np.cumsum(np.bincount(parents[~is_omid], minlength=len(ids)), out=offsets[1:])
+        other_ids = pa.ListArray.from_arrays(pa.array(offsets), flat.filter(pa.array(~is_omid)))
+        return omids, pc.binary_join(other_ids, ' ')
+
+    @staticmethod
+    def get_bracket_content(values) -> tuple:
+        """
+        Vectorised counterpart of the extraction of the IDs of an entity from the square brackets in the value of the
+        'venue', 'author', 'publisher' or 'editor' field (e.g. 'Name [omid:ra/123 orcid:0000-...]'), i.e. the string
+        between the first '[' and the first ']'.
+        :param values: a pyarrow array of non-empty strings
+        :return: a tuple of two pyarrow arrays: the content of the brackets (an empty string if the first ']' precedes
+            the first '[') and a boolean mask of the malformed values, i.e. those missing either bracket
+        """
+        open_pos = pc.find_substring(values, '[')
+        close_pos = pc.find_substring(values, ']')
+        malformed = pc.or_(pc.less(open_pos, 0), pc.less(close_pos, 0))
+        content = pc.struct_field(pc.extract_regex(values, r'\[(?P<content>[^\]]*)\]'), [0])
+        content = pc.utf8_trim_whitespace(pc.fill_null(content, ''))
+        return pc.if_else(pc.greater(close_pos, open_pos), content, ''), malformed
+
+    def process_meta_chunks(self, chunks, primary_ents_writer: Union[MultiFileWriter, None],
+                            out_venue_rows: Union[set, ExternalDeduplicator, None],
+                            out_ra_rows: Union[set, ExternalDeduplicator, None], all_rows: bool = True) -> None:
+        """
+        Vectorised counterpart of process_meta_rows(), processing the rows of the OC Meta dump in chunks stored in
+        pyarrow RecordBatches: the OMIDs and the PIDs of the primary entities, of the venues and of the responsible
+        agents are extracted with pyarrow compute kernels over whole columns, producing the same output rows.
+        :param chunks: an iterable of pyarrow RecordBatches storing chunks of the rows of the OC Meta dump (see
+            read_meta_dump_member_chunks())
+        :param primary_ents_writer: the writer for the reduced table of the primary entities (None to skip them)
+        :param out_venue_rows: the set (or the ExternalDeduplicator) storing the reduced rows of the venues (None to
+            skip them)
+        :param out_ra_rows: the set (or the ExternalDeduplicator) storing the reduced rows of the responsible agents
+            (None to skip them)
+        :param all_rows: flag to indicate whether to process all rows or only those that do not already have an openalex ID
+        :return: None
+        """
+        for chunk in chunks:
+            # skip rows whose entity already has an openalex ID if all_rows is False
+            if all_rows is False:
+                chunk = chunk.filter(pa.array(~self.has_id_prefix(chunk['id'], 'openalex:')))
+            if chunk.num_rows == 0:
+                continue
+
+            # primary entities are unique -> write them directly to the output file
+            if primary_ents_writer is not None:
+                omids, ids = self.split_omid_and_ids(chunk['id'])
+                has_ids = pc.not_equal(ids, '')
+                for omid, pids, res_type in zip(omids.filter(has_ids).to_pylist(), ids.filter(has_ids).to_pylist(),
+                                                chunk['type'].filter(has_ids).to_pylist()):
+                    primary_ents_writer.write_row({'omid': omid, 'ids': pids, 'type': res_type})
+
+            venues = chunk['venue'].filter(pc.not_equal(chunk['venue'], '')) if out_venue_rows is not None else []
+            if len(venues):
+                content, malformed = self.get_bracket_content(venues)
+                for venue in venues.filter(malformed).to_pylist():
+                    self.get_venue_ids({'venue': venue})  # raises the same error as process_meta_rows()
+                omids, ids = self.split_omid_and_ids(content)
+                has_ids = pc.not_equal(ids, '')
+                out_venue_rows.update(zip(omids.filter(has_ids).to_pylist(), ids.filter(has_ids).to_pylist()))
+
+            for field in ['author', 'publisher', 'editor'] if out_ra_rows is not None else []:
+                rows = pc.indices_nonzero(pc.not_equal(chunk[field], ''))
+                values = pc.take(chunk[field], rows)
+                if len(values) == 0:
+                    continue
+                if field != 'publisher':  # author and editor fields can contain multiple entities, separated by '; '
+                    entities = pc.split_pattern(values, '; ')
+                    rows = pc.take(rows, pc.list_parent_indices(entities))
+                    values = pc.list_flatten(entities)
+                values = pc.utf8_trim_whitespace(values)
+                content, malformed = self.get_bracket_content(values)
+                for idx, ra_entity in zip(rows.filter(malformed).to_pylist(), values.filter(malformed).to_pylist()):
+                    logging.error(f'Error: {field} field of row {chunk.slice(idx, 1).to_pylist()[0]} is not in the '
+                                  f'expected format. The entity corresponding to {ra_entity} is not processed.')
+                omids, ids = self.split_omid_and_ids(content.filter(pc.invert(malformed)))
+                has_ids = pc.not_equal(ids, '')
+                out_ra_rows.update((omid, pids, field) for omid, pids in
+                                   zip(omids.filter(has_ids).to_pylist(), ids.filter(has_ids).to_pylist()))
+
+    def process_meta_rows(self, rows, primary_ents_writer: Union[MultiFileWriter, None],
+                          out_venue_rows: Union[set, ExternalDeduplicator, None],
+                          out_ra_rows: Union[set, ExternalDeduplicator, None], all_rows: bool = True) -> None:
+        """
+        Writes the reduced rows of the primary entities in the input rows of the OC Meta dump to primary_ents_writer,
+        and adds the reduced rows of the venues and of the responsible agents, converted to tuples, respectively to
+        out_venue_rows and out_ra_rows. The tables whose writer (or set) is None are skipped, so that the rows only need
+        the fields listed for the other tables in TABLE_COLUMNS.
+        :param rows: an iterable of dicts, each corresponding to a row of the OC Meta dump
+        :param primary_ents_writer: the writer for the reduced table of the primary entities
+        :param out_venue_rows: the set (or the ExternalDeduplicator) storing the reduced rows of the venues, as tuples
+            of the values of VENUE_FIELDNAMES
+        :param out_ra_rows: the set (or the ExternalDeduplicator) storing the reduced rows of the responsible agents,
+            as tuples of the values of RA_FIELDNAMES
+        :param all_rows: flag to indicate whether to process all rows or only those that do not already have an openalex ID
+        :return: None
+        """
+        for row in rows:
+
+            # skip row if entity already has an openalex ID and all_rows is False
+            if any(pid.startswith('openalex:') for pid in row['id'].split()) and all_rows is False:
+                continue
+
+            # create a row for the resource uniquely identified by the OMID in the 'id' field
+            if primary_ents_writer is not None:
+                primary_entity_out_row: dict = self.get_entity_ids(row)
+                if primary_entity_out_row:
+                    primary_ents_writer.write_row(primary_entity_out_row)  # primary entities are unique -> write them directly to the output file
+
+            # create a row for the resource identified by the OMID in the 'venue' field
+            if out_venue_rows is not None:
+                venue_out_row: dict = self.get_venue_ids(row)
+                if venue_out_row:
+                    out_venue_rows.add(tuple(venue_out_row[k] for k in self.VENUE_FIELDNAMES))
+
+            # create a row for each of the entities in the responsible agent fields ('author', 'publisher', 'editor' of the input row
+            for field in ['author', 'publisher', 'editor'] if out_ra_rows is not None else []:
+                for ra_out_row in self.get_ra_ids(row, field):
+                    # todo: consider splitting authors, publishers, editors into separate tables
+                    #  (and modifying the get_ra_ids function accordingly,
+                    #  i.e. removing a then unnecessary 'ra_role' field in the output dictionary)
+
+                    out_ra_rows.add(tuple(ra_out_row[k] for k in self.RA_FIELDNAMES))
+
+    def preprocess_meta_tables(self, meta_dump_zip:str, meta_ids_out:str, all_rows:bool = True,
+                               checkpoint: bool = False, resume: bool = False,
+                               output_format: TableFormat = 'csv', workers: int = 1,
+                               dedup_max_rows: int = 5000000, parser: Literal['csv', 'arrow'] = 'csv',
+                               chunk_size: int = 100000, tables: Union[list, None] = None) -> None:
         """
         Preprocesses the OC Meta tables to create reduced tables with essential metadata. For each entity represented in a
         row in the original table, the reduced output table contains the OMID ('omid' field) and the PIDs ('ids' field) of
@@ -153,58 +426,239 @@ class MetaProcessor:
                  'venue' field of the original table
                 * 'resp_ags_' if the table concerns the entities whose IDs are stored in the 'author', 'publisher',
                     or 'editor' fields of the original table
+        :param checkpoint: if True, each CSV file of the dump is processed separately and recorded as completed in a
+            journal stored in meta_ids_out (see CHECKPOINT_FILE), so that the process can be resumed after a crash. The
+            rows of the venues and of the responsible agents are staged per file in meta_ids_out/partial and are
+            deduplicated over the whole dump once all the files have been processed.
+        :param resume: if True, resumes a process interrupted while running with checkpoint=True, skipping the files of
+            the dump recorded as completed in the journal. The tables of primary entities not recorded in the journal,
+            e.g. written by a run without checkpoint, are deleted, as their rows are written again. Implies
+            checkpoint=True. Without resume, all the existing tables in the directories of the tables to create are
+            deleted before processing the dump.
+        :param output_format: the format of the output tables, one among 'csv' (default), 'parquet', 'csv.gz',
+            'csv.zst' and 'csv.lz4' (see utils.get_writer_options())
+        :param workers: the number of processes the CSV files of the dump are distributed over (default: 1). If
+            greater than 1, each worker process opens the archive and processes a CSV file at a time (see
+            preprocess_meta_member()), and the rows of the venues and of the responsible agents are deduplicated over
+            the whole dump once all the files have been processed, as with checkpoint=True.
+        :param dedup_max_rows: the max number of distinct rows of venues (and of responsible agents) kept in memory
+            while removing the duplicates over the whole dump (default: 5,000,000). Beyond this budget, the rows are
+            spilled to sorted run files in meta_ids_out and deduplicated with a k-way merge (see
+            utils.ExternalDeduplicator).
+        :param parser: the engine used to parse the CSV files of the dump and to extract the IDs, either 'csv'
+            (default), which reads one row at a time with csv.DictReader, or 'arrow', which reads chunks of chunk_size
+            rows into pyarrow RecordBatches and extracts the IDs with vectorised string kernels (see
+            process_meta_chunks()). If pyarrow is not installed, the 'csv' parser is used instead.
+        :param chunk_size: the number of rows in each chunk read by the 'arrow' parser (default: 100,000)
+        :param tables: the reduced tables to create, among 'primary_ents', 'venues' and 'resp_ags' (default: None, i.e.
+            all of them). Only the fields of the dump needed for these tables are read (see TABLE_COLUMNS), and the
+            extraction of the IDs of the entities of the other tables is skipped entirely.
         :return: None (writes the reduced tables to disk)
         """
+        tables = list(self.TABLE_FIELDNAMES) if tables is None else list(tables)
+        unknown_tables = [t for t in tables if t not in self.TABLE_FIELDNAMES]
+        if unknown_tables:
+            raise ValueError(f"Unknown tables {unknown_tables}. Supported tables: 'primary_ents', 'venues', 'resp_ags'")
+        if parser not in ('csv', 'arrow'):
+            raise ValueError(f"Unknown parser '{parser}'. Supported parsers: 'csv', 'arrow'")
+        if parser == 'arrow' and pa is None:
+            logging.warning("pyarrow is not installed: falling back to the 'csv' parser for the OC Meta dump.")
+            parser = 'csv'
+        if not resume:
+            # the tables of a previous run are named after the files of the dump only if it used checkpoints or workers
+            for t in tables:
+                remove_table_files(join(meta_ids_out, t))
+
+        if checkpoint or resume or workers > 1:
+            journal = CheckpointJournal(join(meta_ids_out, CHECKPOINT_FILE), resume) if checkpoint or resume else None
+            self._preprocess_meta_tables_by_member(meta_dump_zip, meta_ids_out, all_rows, max(workers, 1), journal,
+                                                   resume, output_format, dedup_max_rows, parser, chunk_size, tables)
+            return
+
         csv.field_size_limit(131072 * 4)  # increase the default limit for csv field size
-        primary_ents_out_dir = join(meta_ids_out, 'primary_ents')
-        makedirs(primary_ents_out_dir, exist_ok=True)
-        venues_out_dir = join(meta_ids_out, 'venues')
-        makedirs(venues_out_dir, exist_ok=True)
-        resp_ags_out_dir = join(meta_ids_out, 'resp_ags')
-        makedirs(resp_ags_out_dir, exist_ok=True)
         logging.info(f'Processing {meta_dump_zip} for reduced OC Meta table creation')
 
-        out_venue_rows = set()  # stores rows dicts converted to tuples in a single file (venues)
-        out_ra_rows = set()  # stores rows dicts converted to tuples in a single file (resp_ags)
-        with (
-            MultiFileWriter(primary_ents_out_dir, fieldnames=['omid', 'ids', 'type']) as primary_ents_writer,
-            MultiFileWriter(venues_out_dir, fieldnames=['omid', 'ids']) as venues_writer,
-            MultiFileWriter(resp_ags_out_dir, fieldnames=['omid', 'ids', 'ra_role']) as resp_ags_writer
-        ):
-            for row in self.read_compressed_meta_dump(meta_dump_zip):
+        columns = self.get_meta_columns(tables)
+        writer_options = get_writer_options(output_format)
+        with ExitStack() as stack:
+            # store rows dicts converted to tuples (venues and resp_ags), spilling them to disk beyond dedup_max_rows
+            unique_rows = {t: stack.enter_context(ExternalDeduplicator(meta_ids_out, dedup_max_rows))
+                           for t in tables if t != 'primary_ents'}
+            writers = {t: stack.enter_context(MultiFileWriter(join(meta_ids_out, t), fieldnames=self.TABLE_FIELDNAMES[t],
+                                                              **writer_options)) for t in tables}
+            if parser == 'arrow':
+                self.process_meta_chunks(self.read_compressed_meta_dump_chunks(meta_dump_zip, chunk_size, columns),
+                                         writers.get('primary_ents'), unique_rows.get('venues'),
+                                         unique_rows.get('resp_ags'), all_rows)
+            else:
+                self.process_meta_rows(self.read_compressed_meta_dump(meta_dump_zip, columns, not all_rows),
+                                       writers.get('primary_ents'), unique_rows.get('venues'),
+                                       unique_rows.get('resp_ags'), all_rows)
 
-                # skip row if entity already has an openalex ID and all_rows is False
-                if any(pid.startswith('openalex:') for pid in row['id'].split()) and all_rows is False:
-                    continue
+            # this prevents duplicates in the whole dataset
+            for table, rows in unique_rows.items():
+                for r in rows:
+                    writers[table].write_row(dict(zip(self.TABLE_FIELDNAMES[table], r)))
 
-                primary_entity_out_row: dict = self.get_entity_ids(row)
-                venue_out_row: dict = self.get_venue_ids(row)
+    @staticmethod
+    def get_meta_columns(tables: list) -> list:
+        """
+        Returns the fields of the rows of the OC Meta dump needed to create the given reduced tables (see TABLE_COLUMNS).
+        :param tables: the names of the reduced tables, among 'primary_ents', 'venues' and 'resp_ags'
+        :return: the list of the names of the fields, without duplicates
+        """
+        return list(dict.fromkeys(col for t in tables for col in MetaProcessor.TABLE_COLUMNS[t]))
 
-                # create a row for the resource uniquely identified by the OMID in the 'id' field
-                if primary_entity_out_row:
-                    primary_ents_writer.write_row(primary_entity_out_row)  # primary entities are unique -> write them directly to the output file
+    @staticmethod
+    def get_member_prefix(csv_file: str) -> str:
+        """
+        Returns the prefix of the names of the output files written for a CSV file of the OC Meta dump, i.e. the path
+        of the file inside the Zip archive, without extension and with '_' as separator, followed by '_'.
+        :param csv_file: the name of the CSV file inside the archive (e.g. 'csv/0.csv')
+        :return: the prefix (e.g. 'csv_0_')
+        """
+        return splitext(csv_file)[0].replace('/', '_') + '_'
 
-                # create a row for the resource identified by the OMID in the 'venue' field
-                if venue_out_row:
-                    out_venue_rows.add(tuple(venue_out_row.items()))
+    def preprocess_meta_member(self, meta_dump_zip: str, csv_file: str, meta_ids_out: str, all_rows: bool = True,
+                               output_format: str = 'csv', parser: str = 'csv', chunk_size: int = 100000,
+                               tables: Union[list, None] = None) -> tuple:
+        """
+        Preprocesses a single CSV file of the OC Meta dump: the rows of the primary entities are written to the
+        'primary_ents' table, while the rows of the venues and of the responsible agents, deduplicated within the file,
+        are staged in meta_ids_out/partial (see merge_staged_meta_rows()). The output files are named with the prefix
+        returned by get_member_prefix(). It is the unit of work of each worker process when preprocess_meta_tables()
+        runs in parallel.
+        :param meta_dump_zip: the Zip archive storing the OC Meta CSV dump
+        :param csv_file: the name of the CSV file inside the archive
+        :param meta_ids_out: the output directory of preprocess_meta_tables()
+        :param all_rows: flag to indicate whether to process all rows or only those that do not already have an openalex ID
+        :param output_format: the format of the output tables (see utils.get_writer_options())
+        :param parser: the engine used to parse the CSV file, either 'csv' or 'arrow' (see preprocess_meta_tables())
+        :param chunk_size: the number of rows in each chunk read by the 'arrow' parser
+        :param tables: the reduced tables to create (default: None, i.e. all of them; see preprocess_meta_tables())
+        :return: a tuple storing the name of the processed file and the list of the paths to the files written
+        """
+        tables = list(self.TABLE_FIELDNAMES) if tables is None else tables
+        columns = self.get_meta_columns(tables)
+        file_prefix = self.get_member_prefix(csv_file)
+        writer_options = get_writer_options(output_format)
+        # stores rows dicts converted to tuples (venues and resp_ags in the current file)
+        unique_rows = {t: set() for t in tables if t != 'primary_ents'}
+        with ExitStack() as stack:
+            archive = stack.enter_context(ZipFile(meta_dump_zip))
+            # primary entities are written directly to the output table, the other rows are staged for the merge
+            writers = {t: stack.enter_context(MultiFileWriter(join(meta_ids_out, t) if t == 'primary_ents' else
+                                                              join(meta_ids_out, 'partial', t),
+                                                              fieldnames=self.TABLE_FIELDNAMES[t],
+                                                              file_prefix=file_prefix, **writer_options))
+                       for t in tables}
+            if parser == 'arrow':
+                self.process_meta_chunks(self.read_meta_dump_member_chunks(archive, csv_file, chunk_size, columns),
+                                         writers.get('primary_ents'), unique_rows.get('venues'),
+                                         unique_rows.get('resp_ags'), all_rows)
+            else:
+                self.process_meta_rows(self.read_meta_dump_member(archive, csv_file, columns, not all_rows),
+                                       writers.get('primary_ents'), unique_rows.get('venues'),
+                                       unique_rows.get('resp_ags'), all_rows)
+            for table, rows in unique_rows.items():
+                for r in rows:
+                    writers[table].write_row(dict(zip(self.TABLE_FIELDNAMES[table], r)))
+        files_written = [f for writer in writers.values() for f in writer.files_written]
+        return csv_file, files_written
 
-                # create a row for each of the entities in the responsible agent fields ('author', 'publisher', 'editor' of the input row
-                for field in ['author', 'publisher', 'editor']:
-                    for ra_out_row in self.get_ra_ids(row, field):
-                        # todo: consider splitting authors, publishers, editors into separate tables
-                        #  (and modifying the get_ra_ids function accordingly,
-                        #  i.e. removing a then unnecessary 'ra_role' field in the output dictionary)
+    def _preprocess_meta_tables_by_member(self, meta_dump_zip: str, meta_ids_out: str, all_rows: bool, workers: int,
+                                          journal: Union[CheckpointJournal, None], resume: bool,
+                                          output_format: str = 'csv', dedup_max_rows: int = 5000000,
+                                          parser: str = 'csv', chunk_size: int = 100000,
+                                          tables: Union[list, None] = None) -> None:
+        tables = list(self.TABLE_FIELDNAMES) if tables is None else tables
+        partial_dir = join(meta_ids_out, 'partial')
+        if not resume and isdir(partial_dir):  # rows staged by a previous run
+            shutil.rmtree(partial_dir)
+        for t in tables:
+            makedirs(join(meta_ids_out, t) if t == 'primary_ents' else join(partial_dir, t), exist_ok=True)
+        logging.info(f'Processing {meta_dump_zip} for reduced OC Meta table creation with {workers} worker processes')
 
-                        out_ra_rows.add(tuple(ra_out_row.items()))
+        with ZipFile(meta_dump_zip) as archive:
+            members = [n for n in archive.namelist() if n.endswith('.csv')]
+        if journal:
+            if resume:  # e.g. the output of a previous run without a checkpoint, which is written again
+                for d in (join(meta_ids_out, 'primary_ents'), partial_dir):
+                    journal.discard_unrecorded_files(d, meta_ids_out)
+            members = [m for m in members if not journal.is_completed(m)]
+            for csv_file in members:  # discard the output of files whose processing was interrupted
+                for d in (join(meta_ids_out, 'primary_ents'), partial_dir):
+                    CheckpointJournal.discard_partial_files(d, self.get_member_prefix(csv_file))
 
-            # this prevents duplicates inside the same file (not in the whole dataset)
-            for r in out_venue_rows:
-                venues_writer.write_row(dict(r))
-            for r in out_ra_rows:
-                resp_ags_writer.write_row(dict(r))
+        with ExitStack() as stack:
+            pbar = stack.enter_context(tqdm(total=len(members), desc=f"Processing {meta_dump_zip}", unit="file"))
+            if workers > 1:
+                executor = stack.enter_context(ProcessPoolExecutor(max_workers=workers))
+                futures = [executor.submit(self.preprocess_meta_member, meta_dump_zip, m, meta_ids_out, all_rows,
+                                           output_format, parser, chunk_size, tables) for m in members]
+                results = (future.result() for future in as_completed(futures))
+            else:
+                results = (self.preprocess_meta_member(meta_dump_zip, m, meta_ids_out, all_rows, output_format,
+                                                       parser, chunk_size, tables) for m in members)
+            for csv_file, files_written in results:
+                if journal:
+                    journal.record(csv_file, [relpath(f, meta_ids_out) for f in files_written])
+                pbar.update(1)
+
+        self.merge_staged_meta_rows(meta_ids_out, output_format, dedup_max_rows)
+
+    @staticmethod
+    def merge_staged_meta_rows(meta_ids_out: str, output_format: TableFormat = 'csv',
+                               dedup_max_rows: int = 5000000) -> None:
+        """
+        Merges the rows of the venues and of the responsible agents staged per file of the OC Meta dump in
+        meta_ids_out/partial into the 'venues' and 'resp_ags' tables, removing the duplicates over the whole dump, then
+        deletes the staging directory.
+        :param meta_ids_out: the output directory of preprocess_meta_tables()
+        :param output_format: the format of the merged tables (see utils.get_writer_options())
+        :param dedup_max_rows: the max number of distinct rows kept in memory while removing the duplicates (see
+            utils.ExternalDeduplicator)
+        :return: None
+        """
+        partial_dir = join(meta_ids_out, 'partial')
+        if not isdir(partial_dir):  # the staged rows have already been merged
+            return
+        for table, fieldnames in (('venues', MetaProcessor.VENUE_FIELDNAMES), ('resp_ags', MetaProcessor.RA_FIELDNAMES)):
+            if not isdir(join(partial_dir, table)):  # the table is not created (see the 'tables' parameter)
+                continue
+            out_dir = join(meta_ids_out, table)
+            makedirs(out_dir, exist_ok=True)
+            CheckpointJournal.discard_partial_files(out_dir, '')  # output of a previously interrupted merge
+            with (
+                ExternalDeduplicator(meta_ids_out, dedup_max_rows) as unique_rows,
+                MultiFileWriter(out_dir, fieldnames=fieldnames, **get_writer_options(output_format)) as writer
+            ):
+                for r in read_csv_tables(join(partial_dir, table)):
+                    unique_rows.add(tuple(r[k] for k in fieldnames))
+                for r in unique_rows:
+                    writer.write_row(dict(zip(fieldnames, r)))
+        shutil.rmtree(partial_dir)
 
 
 class OpenAlexProcessor:
+    _IDS_KEY_PATTERN = re.compile(rb'"ids"\s*:\s*\{')  # locates the 'ids' object in a line of the dump
+    _PARTITION_PATTERN = re.compile(r'(updated_date=[^_/\\]+)')  # the name of a partition of the dump
+    INGESTED_PARTITIONS_FILE = 'ingested_partitions.json'
+
+    # tags of the OpenAlex entity types in the integer encoding of OpenAlex IDs (see encode_openalex_id())
+    OPENALEX_ID_TAGS = {'W': 1, 'S': 2, 'A': 3, 'I': 4, 'P': 5, 'F': 6, 'C': 7}
+    _OPENALEX_ID_PREFIXES = {v: k for k, v in OPENALEX_ID_TAGS.items()}
+    _OPENALEX_ID_TAG_SHIFT = 56  # the tag is stored in the high bits, the numeric part of the ID in the 56 low bits
+
+    # the PID schemes extracted by the get_*_ids methods for each OpenAlex entity type
+    SUPPORTED_ID_TYPES = {
+        'work': ['doi', 'pmid', 'pmcid'],
+        'source': ['issn', 'wikidata'],
+        'author': ['orcid'],
+        'publisher': ['ror', 'wikidata'],
+        'institution': ['ror', 'wikidata'],
+        'funder': ['ror', 'wikidata'],
+    }
 
     def __init__(self):
         pass
@@ -354,25 +808,284 @@ class OpenAlexProcessor:
                 yield output_row
 
     @staticmethod
-    def read_compressed_openalex_dump(in_dir: str):
+    def encode_openalex_id(openalex_id: str) -> int:
+        """
+        Encodes an OpenAlex ID as a 64-bit integer, storing the tag of the entity type (see OPENALEX_ID_TAGS) in the
+        high bits and the numeric part of the ID in the low bits, e.g. 'W2741809807' -> (1 << 56) + 2741809807.
+        :param openalex_id: the OpenAlex ID, without the 'https://openalex.org/' prefix (e.g. 'W2741809807')
+        :return: the integer encoding of the ID
+        """
+        return (OpenAlexProcessor.OPENALEX_ID_TAGS[openalex_id[0].upper()] << OpenAlexProcessor._OPENALEX_ID_TAG_SHIFT) \
+            + int(openalex_id[1:])
+
+    @staticmethod
+    def decode_openalex_id(value: Union[int, str]) -> str:
+        """
+        Decodes an OpenAlex ID encoded with encode_openalex_id(). Values that are not integers, i.e. the IDs read from
+        tables storing them as text, are returned unchanged.
+        :param value: the integer encoding of the ID
+        :return: the OpenAlex ID (e.g. 'W2741809807')
+        """
+        if not isinstance(value, int):
+            return value
+        shift = OpenAlexProcessor._OPENALEX_ID_TAG_SHIFT
+        return OpenAlexProcessor._OPENALEX_ID_PREFIXES[value >> shift] + str(value & ((1 << shift) - 1))
+
+    @staticmethod
+    def encode_openalex_id_column(openalex_ids: pd.Series) -> pd.Series:
+        """
+        Vectorised version of encode_openalex_id(), for the 'openalex_id' column of a DataFrame.
+        :param openalex_ids: a Series of OpenAlex IDs (e.g. 'W2741809807')
+        :return: a Series of int64 storing the integer encoding of the IDs
+        """
+        tags = openalex_ids.str[0].str.upper().map(OpenAlexProcessor.OPENALEX_ID_TAGS).astype('int64')
+        return tags * (1 << OpenAlexProcessor._OPENALEX_ID_TAG_SHIFT) + openalex_ids.str[1:].astype('int64')
+
+    @staticmethod
+    def has_int_openalex_ids(conn: sql.Connection, table_name: str) -> bool:
+        """
+        Checks whether the OpenAlex IDs in a database table are stored with their integer encoding.
+        :param conn: the connection to the database
+        :param table_name: the name of the table
+        :return: True if the 'openalex_id' column of the table is declared as INTEGER, False otherwise
+        """
+        return any(col[1] == 'openalex_id' and col[2].upper() == 'INTEGER'
+                   for col in conn.execute(f"PRAGMA table_info({table_name})"))
+
+    @staticmethod
+    def pid_fingerprint(pid: str) -> int:
+        """
+        Computes a stable 64-bit fingerprint of a PID, i.e. the first 8 bytes of the BLAKE2b digest of the normalised
+        (stripped and lowercased) PID, read as a signed integer so that it fits an SQLite INTEGER column.
+        :param pid: the prefixed PID (e.g. 'doi:10.1234/abc')
+        :return: the fingerprint of the PID
+        """
+        return int.from_bytes(blake2b(pid.strip().lower().encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+
+    @staticmethod
+    def has_pid_hash_key(conn: sql.Connection, table_name: str) -> bool:
+        """
+        Checks whether a database table is keyed on the fingerprints of the PIDs (see pid_fingerprint()).
+        :param conn: the connection to the database
+        :param table_name: the name of the table
+        :return: True if the table has a 'pid_hash' column, False otherwise
+        """
+        return any(col[1] == 'pid_hash' for col in conn.execute(f"PRAGMA table_info({table_name})"))
+
+    @staticmethod
+    def get_id_table_schema(int_ids: bool = False, hash_keys: bool = False) -> str:
+        """
+        Returns the column definitions of a database table storing the PIDs of OpenAlex entities.
+        :param int_ids: if True, the 'openalex_id' column stores the integer encoding of the OpenAlex IDs
+        :param hash_keys: if True, a 'pid_hash' column stores the fingerprint of the PID in 'supported_id'
+        :return: the column definitions, to be used in a CREATE TABLE statement
+        """
+        columns = f"supported_id TEXT, openalex_id {'INTEGER' if int_ids else 'TEXT'}"
+        return columns + ', pid_hash INTEGER' if hash_keys else columns
+
+    @staticmethod
+    def get_id_index_query(table_name: str, hash_keys: bool = False) -> str:
+        """
+        Returns the statement creating the index for looking up the rows of a PID table.
+        :param table_name: the name of the table
+        :param hash_keys: if True, the index is created on the 'pid_hash' column instead of the 'supported_id' column
+        :return: the CREATE INDEX statement
+        """
+        return "CREATE INDEX IF NOT EXISTS idx_{} ON {}({});".format(table_name.lower(), table_name,
+                                                                    'pid_hash' if hash_keys else 'supported_id')
+
+    @staticmethod
+    def prepare_id_df(id_df: pd.DataFrame, int_ids: bool = False, hash_keys: bool = False) -> pd.DataFrame:
+        """
+        Converts a DataFrame read from the CSV tables of PIDs (supported_id, openalex_id) to the columns of a database
+        table created with the same int_ids and hash_keys options (see get_id_table_schema()).
+        """
+        if int_ids:
+            id_df = id_df.assign(openalex_id=OpenAlexProcessor.encode_openalex_id_column(id_df['openalex_id']))
+        if hash_keys:
+            id_df = id_df.assign(pid_hash=id_df['supported_id'].map(OpenAlexProcessor.pid_fingerprint))
+        return id_df
+
+    @staticmethod
+    def get_dump_files(in_dir: str) -> list:
+        """
+        Lists the compressed JSON-Lines files (.gz) stored at any depth inside a folder of the OpenAlex dump.
+        :param in_dir: the folder of the OpenAlex dump storing the entities of a given type (e.g. 'data/works')
+        :return: the sorted list of the paths to the .gz files
+        """
+        return sorted(join(root, file) for root, dirs, files in walk(in_dir) for file in files if file.endswith('.gz'))
+
+    @staticmethod
+    def get_shard_prefix(in_dir: str, file_path: str) -> str:
+        """
+        Derives from the path of an input file of the OpenAlex dump the prefix for naming the output files created from
+        it, e.g. 'updated_date=2023-05-01_part_000_' for the file 'updated_date=2023-05-01/part_000.gz' in in_dir.
+        :param in_dir: the folder of the OpenAlex dump the input file belongs to
+        :param file_path: the path to the input file
+        :return: the prefix for the names of the output files
+        """
+        return relpath(file_path, in_dir).removesuffix('.gz').replace(sep, '_') + '_'
+
+    @staticmethod
+    def get_partition(file_name: str) -> str:
+        """
+        Returns the 'updated_date' partition of the OpenAlex dump an input file, or an output file created from it
+        (see get_shard_prefix()), belongs to.
+        :param file_name: the path to an input .gz file or the name of an output file, e.g.
+            'updated_date=2023-05-01/part_000.gz' or 'updated_date=2023-05-01_part_000_0.csv'
+        :return: the name of the partition, e.g. 'updated_date=2023-05-01', or an empty string if the file does not
+            belong to any partition
+        """
+        match = OpenAlexProcessor._PARTITION_PATTERN.search(file_name)
+        return match.group(1) if match else ''
+
+    @staticmethod
+    def parse_ids_only(line: bytes, loads=json.loads) -> dict:
+        """
+        Parses a line of the OpenAlex dump decoding only the 'ids' object of the entity, instead of the whole JSON
+        object. The 'ids' object is located at byte level and the OpenAlex ID of the entity (the 'id' field) is taken
+        from its 'openalex' key. If the 'ids' object cannot be isolated unambiguously (e.g. the key occurs more than
+        once in the line or its value contains a closing brace), the whole line is parsed instead.
+        :param line: a line of a JSON-Lines file of the OpenAlex dump
+        :param loads: the function used to decode JSON (default: json.loads)
+        :return: a dict with the 'id' and 'ids' fields of the entity, or the whole entity if falling back to a full parse
+        """
+        if line.count(b'"ids"') == 1:
+            match = OpenAlexProcessor._IDS_KEY_PATTERN.search(line)
+            if match:
+                start = match.end() - 1
+                end = line.find(b'}', start)
+                try:
+                    ids = loads(line[start:end + 1])
+                    if isinstance(ids, dict) and isinstance(ids.get('openalex'), str):
+                        return {'id': ids['openalex'], 'ids': ids}
+                except ValueError:
+                    pass
+        return loads(line)
+
+    @staticmethod
+    def get_line_parser(parser: Literal['json', 'orjson', 'ids_only'] = 'json'):
+        """
+        Returns the function used to parse the lines of the OpenAlex dump.
+        :param parser: the parser backend, one among:
+            * 'json': full parse with the json module of the standard library
+            * 'orjson': full parse with the orjson library
+            * 'ids_only': partial parse of the 'id' and 'ids' fields only (see parse_ids_only()); it is enough for
+                extracting PIDs with the get_*_ids methods, and it uses orjson to decode the 'ids' object if available
+            If orjson is not installed, the json module is used instead.
+        :return: a function taking a line (bytes) of the dump as input and returning a dict
+        """
+        if parser not in ('json', 'orjson', 'ids_only'):
+            raise ValueError("ValueError: the parser '{}' is not supported.".format(parser))
+        if parser == 'orjson' and orjson is None:
+            logging.warning('orjson is not installed: falling back to the json module for parsing the OpenAlex dump.')
+        loads = orjson.loads if orjson is not None and parser != 'json' else json.loads
+        if parser == 'ids_only':
+            return lambda line: OpenAlexProcessor.parse_ids_only(line, loads)
+        return loads
+
+    @staticmethod
+    def read_dump_file(file_path: str, parser: Literal['json', 'orjson', 'ids_only'] = 'json',
+                       decompression: str = 'auto') -> Generator[dict, None, None]:
+        """
+        Reads a single compressed JSON-Lines file of the OpenAlex dump.
+        :param file_path: the path to the .gz file
+        :param parser: the parser backend (see get_line_parser())
+        :param decompression: the decompression backend (see utils.get_decompression_backend())
+        :return: a generator of dicts, each representing an OpenAlex entity
+        """
+        loads = OpenAlexProcessor.get_line_parser(parser)
+        with open_gzip(file_path, decompression) as inp_jsonl:
+            for line in inp_jsonl:
+                try:
+                    line = loads(line)
+                    yield line
+                except json.decoder.JSONDecodeError as e:
+                    logging.error(f'Error while processing {file_path}: {e}.\n Critical entity: {line}')
+                    print(f'Error while processing {file_path}: {e}.\n Critical entity: {line}')
+                    continue
+
+    @staticmethod
+    def read_compressed_openalex_dump(in_dir: str, parser: Literal['json', 'orjson', 'ids_only'] = 'json',
+                                      decompression: str = 'auto'):
 
         logging.info(f'Processing input folder {in_dir} for OpenAlex table creation')
-        input_files = [join(root, file) for root, dirs, files in walk(in_dir) for file in files if file.endswith('.gz')]
+        input_files = OpenAlexProcessor.get_dump_files(in_dir)
 
         for f in tqdm(input_files, desc=f"Processing {in_dir}", unit="file"):
             logging.info(f'Processing file {f}')
-            with gzip.open(f, 'r') as inp_jsonl:
-                for line in inp_jsonl:
-                    try:
-                        line = json.loads(line)
-                        yield line
-                    except json.decoder.JSONDecodeError as e:
-                        logging.error(f'Error while processing {f}: {e}.\n Critical entity: {line}')
-                        print(f'Error while processing {f}: {e}.\n Critical entity: {line}')
-                        continue
+            yield from OpenAlexProcessor.read_dump_file(f, parser, decompression)
+
+    @staticmethod
+    def get_ids_extractor(entity_type: str):
+        """
+        Returns the function extracting the external PIDs of the specified OpenAlex entity type.
+        :param entity_type: the OpenAlex entity type (one among 'work', 'source', 'author', 'publisher', 'institution',
+            'funder')
+        :return: one of the get_*_ids methods of OpenAlexProcessor
+        """
+        extractors = {
+            'work': OpenAlexProcessor.get_work_ids,
+            'source': OpenAlexProcessor.get_source_ids,
+            'author': OpenAlexProcessor.get_author_ids,
+            'publisher': OpenAlexProcessor.get_publisher_ids,
+            'institution': OpenAlexProcessor.get_institution_ids,
+            'funder': OpenAlexProcessor.get_funder_ids,
+        }
+        try:
+            return extractors[entity_type.lower().strip()]
+        except KeyError:
+            raise ValueError("ValueError: the entity type '{}' is not supported.".format(entity_type))
+
+    @staticmethod
+    def get_ids_writer(out_dir: str, split_by_id_type: bool = False, **kwargs) -> Union[MultiFileWriter, SchemeRoutingWriter]:
+        """
+        Returns the writer for the tables of OpenAlex IDs (of the form: supported_id, openalex_id).
+        :param out_dir: the directory where the output tables will be written
+        :param split_by_id_type: if True, the rows are routed to a subdirectory of out_dir named after the scheme of
+            their PID (e.g. 'doi', 'pmid'), otherwise they are all written to out_dir
+        :param kwargs: any other keyword argument accepted by MultiFileWriter (e.g. file_prefix)
+        :return: a MultiFileWriter or a SchemeRoutingWriter instance
+        """
+        if split_by_id_type:
+            return SchemeRoutingWriter(out_dir, key='supported_id', fieldnames=['supported_id', 'openalex_id'], **kwargs)
+        return MultiFileWriter(out_dir, fieldnames=['supported_id', 'openalex_id'], **kwargs)
+
+    @staticmethod
+    def extract_file_ids(file_path: str, in_dir: str, out_dir: str, entity_type: str, parser: str = 'json',
+                         split_by_id_type: bool = False, decompression: str = 'auto', output_format: str = 'csv') -> tuple:
+        """
+        Extracts the external PIDs of the entities stored in a single file of the OpenAlex dump and writes them to a
+        set of CSV files of its own, named with the prefix returned by get_shard_prefix(). It is the unit of work
+        of each worker process when create_openalex_ids_table() runs in parallel.
+        :param file_path: the path to the .gz file to process
+        :param in_dir: the folder of the OpenAlex dump the file belongs to
+        :param out_dir: the directory where the output tables will be written
+        :param entity_type: the OpenAlex entity type
+        :param parser: the parser backend (see get_line_parser())
+        :param split_by_id_type: if True, the PIDs are routed to a subdirectory of out_dir for each PID scheme
+        :param decompression: the decompression backend (see utils.get_decompression_backend())
+        :param output_format: the format of the output tables (see utils.get_writer_options())
+        :return: a tuple storing the path to the processed file, the number of rows written for it and the list of the
+            paths to the CSV files written
+        """
+        process_line = OpenAlexProcessor.get_ids_extractor(entity_type)
+        rows_written = 0
+        prefix = OpenAlexProcessor.get_shard_prefix(in_dir, file_path)
+        with OpenAlexProcessor.get_ids_writer(out_dir, split_by_id_type, file_prefix=prefix,
+                                              **get_writer_options(output_format)) as writer:
+            for line in OpenAlexProcessor.read_dump_file(file_path, parser, decompression):
+                for r in process_line(line):
+                    writer.write_row(r)
+                    rows_written += 1
+        return file_path, rows_written, writer.files_written
 
     def create_openalex_ids_table(self, inp_dir: str, out_dir: str, entity_type: Literal[
-        'work', 'source', 'author', 'publisher', 'institution', 'funder']) -> None:
+        'work', 'source', 'author', 'publisher', 'institution', 'funder'], workers: int = 1,
+                                  parser: Literal['json', 'orjson', 'ids_only'] = 'json',
+                                  split_by_id_type: bool = False, incremental: bool = False,
+                                  decompression: str = 'auto', checkpoint: bool = False, resume: bool = False,
+                                  output_format: TableFormat = 'csv') -> None:
         """
         Creates a CSV table with the OpenAlex IDs for the specified entity type. Each row of the table contains the
         OpenAlex ID and a string storing the external PIDs of the entity separated by a single whitespace. For entities
@@ -381,76 +1094,1383 @@ class OpenAlexProcessor:
         :param inp_dir: the directory where the OpenAlex dump is stored, in the form of compressed JSONL files
         :param out_dir: the directory where the output tables will be written, in the form of CSV files
         :param entity_type: the OpenAlex entity type
+        :param workers: the number of processes the input files are distributed over (default: 1). If greater than 1,
+            each input file is processed by a worker process, which writes its own set of CSV files named after the
+            input file (see get_shard_prefix()).
+        :param parser: the backend used to parse the lines of the dump (default: 'json'). Setting it to 'ids_only'
+            avoids decoding the fields of the entities that are not needed for extracting their PIDs (see
+            get_line_parser()).
+        :param split_by_id_type: if True, each PID is routed, as the dump is read, to a separate table for each PID
+            scheme, stored in a subdirectory of out_dir named after the scheme (e.g. 'doi', 'pmid', 'pmcid' for Works).
+            create_id_db_table() then reads only the subdirectory of the ID type it is creating the table for.
+        :param incremental: if True, only the 'updated_date' partitions of the dump that were not processed by previous
+            incremental runs on the same out_dir are processed. The partitions processed are recorded in a JSON file in
+            out_dir (see INGESTED_PARTITIONS_FILE) and each input file is written to its own set of CSV files, named after
+            the input file, so that create_id_db_table() can then ingest only the new partitions.
+        :param decompression: the backend used to decompress the files of the dump, one among 'auto' (default), 'isal',
+            'zlib-ng', 'pigz' and 'gzip' (see utils.get_decompression_backend())
+        :param checkpoint: if True, each input file is written to its own set of CSV files, named after the input file,
+            and is recorded as completed, together with the CSV files produced from it, in a journal stored in out_dir
+            (see CHECKPOINT_FILE), so that the process can be resumed after a crash
+        :param resume: if True, resumes a process interrupted while running with checkpoint=True: the input files
+            recorded as completed in the journal are skipped and the CSV files written for any other input file are
+            discarded before it is processed again. Unless incremental is True, the tables in out_dir not recorded in the
+            journal, e.g. written by a run without checkpoint, are also deleted. Implies checkpoint=True. Without resume
+            and incremental, all the existing tables in out_dir and in its subdirectories are deleted before processing
+            the dump.
+        :param output_format: the format of the output tables, one among 'csv' (default), 'parquet', 'csv.gz',
+            'csv.zst' and 'csv.lz4' (see utils.get_writer_options())
         :return: None
         """
 
-        if entity_type.lower().strip() == 'work':
-            process_line = self.get_work_ids
-        elif entity_type.lower().strip() == 'source':
-            process_line = self.get_source_ids
-        elif entity_type.lower().strip() == 'author':
-            process_line = self.get_author_ids
-        elif entity_type.lower().strip() == 'publisher':
-            process_line = self.get_publisher_ids
-        elif entity_type.lower().strip() == 'institution':
-            process_line = self.get_institution_ids
-        elif entity_type.lower().strip() == 'funder':
-            process_line = self.get_funder_ids
-        else:
-            raise ValueError("ValueError: the entity type '{}' is not supported.".format(entity_type))
+        process_line = self.get_ids_extractor(entity_type)
 
         makedirs(out_dir, exist_ok=True)
+        journal = CheckpointJournal(join(out_dir, CHECKPOINT_FILE), resume) if checkpoint or resume else None
+        if resume and not incremental:
+            # e.g. the output of a previous run without a checkpoint, which is written again (the files of the
+            # partitions ingested by previous incremental runs are not recorded in the journal, and are kept)
+            journal.discard_unrecorded_files(out_dir, out_dir)
+        elif not resume and not incremental:
+            # the tables of a previous run are named after the input files only if it used checkpoints or workers
+            remove_table_files(out_dir)
+
+        if incremental:
+            self._create_openalex_ids_table_incremental(inp_dir, out_dir, entity_type, workers, parser, split_by_id_type,
+                                                        decompression, journal, output_format)
+            return
+
+        if workers > 1 or journal:
+            self._create_openalex_ids_table_parallel(inp_dir, out_dir, entity_type, workers, parser, split_by_id_type,
+                                                     decompression, journal=journal, output_format=output_format)
+            return
 
-        with MultiFileWriter(out_dir, fieldnames=['supported_id', 'openalex_id']) as writer:
-            for line in self.read_compressed_openalex_dump(inp_dir):
+        with self.get_ids_writer(out_dir, split_by_id_type, **get_writer_options(output_format)) as writer:
+            for line in self.read_compressed_openalex_dump(inp_dir, parser, decompression):
                 for r in process_line(line): # returns a generator of dicts, each corresponding to a row in the output csv
                     writer.write_row(r)
 
+    def _create_openalex_ids_table_incremental(self, inp_dir: str, out_dir: str, entity_type: str, workers: int,
+                                               parser: str, split_by_id_type: bool, decompression: str,
+                                               journal: Union[CheckpointJournal, None], output_format: str = 'csv') -> None:
+        manifest_path = join(out_dir, self.INGESTED_PARTITIONS_FILE)
+        ingested = set()
+        if exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                ingested.update(json.load(f))
+
+        input_files = [f for f in self.get_dump_files(inp_dir) if self.get_partition(relpath(f, inp_dir)) not in ingested]
+        new_partitions = sorted({self.get_partition(relpath(f, inp_dir)) for f in input_files})
+        logging.info(f'Incremental run on {inp_dir}: {len(new_partitions)} new partitions ({len(input_files)} files)')
+        print(f'Processing {len(new_partitions)} new partitions of {inp_dir}: {new_partitions}')
+
+        self._create_openalex_ids_table_parallel(inp_dir, out_dir, entity_type, max(workers, 1), parser,
+                                                 split_by_id_type, decompression, input_files, journal, output_format)
+
+        # partitions are recorded only once all their files have been processed
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(sorted(ingested.union(new_partitions)), f, indent=4)
+
+    def _create_openalex_ids_table_parallel(self, inp_dir: str, out_dir: str, entity_type: str, workers: int,
+                                            parser: str, split_by_id_type: bool, decompression: str,
+                                            input_files: Union[list, None] = None,
+                                            journal: Union[CheckpointJournal, None] = None,
+                                            output_format: str = 'csv') -> None:
+        start_time = time.time()
+        input_files = self.get_dump_files(inp_dir) if input_files is None else input_files
+        logging.info(f'Processing input folder {inp_dir} for OpenAlex table creation with {workers} worker processes')
+        total_rows = 0
+
+        if journal:
+            skipped = [f for f in input_files if journal.is_completed(relpath(f, inp_dir))]
+            if skipped:
+                logging.info(f'Resuming: skipping {len(skipped)} files already completed')
+                print(f'Resuming: skipping {len(skipped)} files of {inp_dir} already completed')
+            input_files = [f for f in input_files if not journal.is_completed(relpath(f, inp_dir))]
+            for f in input_files:  # discard the output of files whose processing was interrupted
+                CheckpointJournal.discard_partial_files(out_dir, self.get_shard_prefix(inp_dir, f))
+
+        with ExitStack() as stack:
+            pbar = stack.enter_context(tqdm(total=len(input_files), desc=f"Processing {inp_dir}", unit="file"))
+            if workers > 1:
+                executor = stack.enter_context(ProcessPoolExecutor(max_workers=workers))
+                futures = [executor.submit(self.extract_file_ids, f, inp_dir, out_dir, entity_type, parser,
+                                           split_by_id_type, decompression, output_format) for f in input_files]
+                results = (future.result() for future in as_completed(futures))
+            else:
+                results = (self.extract_file_ids(f, inp_dir, out_dir, entity_type, parser, split_by_id_type,
+                                                 decompression, output_format) for f in input_files)
+            for file_path, rows_written, files_written in results:
+                logging.info(f'Processed file {file_path}: {rows_written} rows written')
+                if journal:
+                    journal.record(relpath(file_path, inp_dir), [relpath(f, out_dir) for f in files_written])
+                total_rows += rows_written
+                pbar.set_postfix(rows=total_rows)
+                pbar.update(1)
+
+        print(f"Extracted {total_rows} PIDs of OpenAlex {entity_type}s from {len(input_files)} files with {workers} "
+              f"workers in {(time.time() - start_time) / 60} minutes")
+
+    @staticmethod
+    def get_table_name(entity_type: str, id_type: str) -> str:
+        """
+        Returns the name of the database table storing the PIDs of the specified scheme for the specified entity type,
+        e.g. 'WorksDoi' for DOIs of Works.
+        :param entity_type: the OpenAlex entity type (e.g. 'work', 'source')
+        :param id_type: the PID scheme (e.g. 'doi', 'issn')
+        :return: the name of the table
+        """
+        return f'{entity_type.strip().capitalize()}s{id_type.strip().capitalize()}'
+
     @staticmethod
     def create_id_db_table(inp_dir: str, db_path: str,
                            id_type: Literal['doi', 'pmid', 'pmcid', 'wikidata', 'issn'],
-                           entity_type: Literal['work', 'source']) -> None:
+                           entity_type: Literal['work', 'source'], incremental: bool = False,
+                           merged_ids_dir: Union[str, None] = None, decompression: str = 'auto',
+                           int_ids: bool = False, hash_keys: bool = False, bloom_filter: bool = False,
+                           resume: bool = False) -> None:
         """
         Creates and indexes a database table containing the IDs of the specified ID scheme for the specified entity type.
-        :param inp_dir: the folder containing the csv files to be processed (the preliminary tables of the form: supported_id, openalex_id)
+        :param inp_dir: the folder containing the csv files to be processed (the preliminary tables of the form: supported_id, openalex_id).
+            If inp_dir contains a subdirectory named after id_type (i.e. the tables were created with
+            split_by_id_type=True), only the files in that subdirectory are read and no filtering is needed.
         :param db_path: the path to the database file
         :param id_type: the type of ID to be processed (one among "doi", "pmid", "pmcid", "wikidata", "issn")
         :param entity_type: the type of OpenAlex entity to be processed (one among "work", "source")
+        :param incremental: if True, the table is updated instead of being created from scratch: only the CSV files
+            belonging to 'updated_date' partitions that have not been ingested yet (see the IngestedPartitions table)
+            are read, in chronological order, and the rows already in the table for the OpenAlex entities in each of
+            them are replaced with the new ones. Requires the CSV files to be created with
+            create_openalex_ids_table(incremental=True). Entities whose PIDs of id_type were all removed in a more recent
+            partition are not detected, as they are not represented in the CSV tables.
+        :param merged_ids_dir: the folder of the OpenAlex dump storing the IDs of the entities of entity_type that
+            have been merged into other entities (e.g. 'data/merged_ids/works'). Only used if incremental is True: the
+            rows of merged entities are deleted, as their PIDs are stored in the record of the entity they were
+            merged into.
+        :param decompression: the backend used to decompress the files in merged_ids_dir (see
+            utils.get_decompression_backend())
+        :param int_ids: if True, the OpenAlex IDs are stored in an INTEGER column with their integer encoding (see
+            encode_openalex_id()), which makes the table and its indexes smaller than with TEXT IDs. When updating an
+            existing table (incremental=True), the IDs are stored in the same way as in the existing rows.
+        :param hash_keys: if True, the table also stores the 64-bit fingerprint of each PID (see pid_fingerprint()) in
+            an INTEGER 'pid_hash' column, which is indexed instead of the much larger 'supported_id' TEXT column. The
+            PIDs are kept in 'supported_id' to discard fingerprint collisions at lookup time. When updating an existing
+            table (incremental=True), the keys of the existing table are kept.
+        :param bloom_filter: if True, a Bloom filter of the PIDs in the table is also built (again) and stored next to
+            the database file (see PidBloomFilter), to be used by Mapping.map_omid_openalex_ids()
+        :param resume: if True, resumes an interrupted run: the table is skipped if it already exists and is complete
+            (i.e. its index was created), while a partially loaded table is dropped and created again. Ignored if
+            incremental is True.
         :return: None
         """
 
-        table_name = f'{entity_type.capitalize()}s{id_type.capitalize()}'
+        table_name = OpenAlexProcessor.get_table_name(entity_type, id_type)
         start_time = time.time()
         with sql.connect(db_path) as conn:
             cursor = conn.cursor()
 
+            if resume and not incremental and OpenAlexProcessor._resume_id_db_table(cursor, table_name):
+                print(f'Table {table_name} is already complete: skipping it')
+                return
             cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table_name,))
-            if cursor.fetchone():
+            if cursor.fetchone() and not incremental:
                 raise ValueError(f"Table {table_name} already exists")
 
-            for file_df in read_csv_tables(inp_dir, use_pandas=True):
+            id_type_dir = join(inp_dir, id_type)
+            routed = isdir(id_type_dir)  # PIDs were already routed to a separate table for each scheme
 
-                # Select only the rows with the ID type specified as a parameter and create a new DataFrame
-                id_df = file_df[file_df['supported_id'].str.startswith(id_type)]
+            if incremental:
+                OpenAlexProcessor._update_id_db_table(conn, id_type_dir if routed else inp_dir, table_name, id_type,
+                                                      routed, merged_ids_dir, decompression, int_ids, hash_keys)
+                hash_keys = OpenAlexProcessor.has_pid_hash_key(conn, table_name)
+            else:
+                if int_ids or hash_keys:
+                    cursor.execute(f"CREATE TABLE {table_name} ({OpenAlexProcessor.get_id_table_schema(int_ids, hash_keys)})")
+                for file_df in read_csv_tables(id_type_dir if routed else inp_dir, use_pandas=True):
 
-                # Append the DataFrame's rows to the existing table in the database
-                id_df.to_sql(table_name, conn, if_exists='append', index=False)
+                    # Select only the rows with the ID type specified as a parameter and create a new DataFrame
+                    id_df = file_df if routed else file_df[file_df['supported_id'].str.startswith(id_type)]
+                    id_df = OpenAlexProcessor.prepare_id_df(id_df, int_ids, hash_keys)
+
+                    # Append the DataFrame's rows to the existing table in the database
+                    id_df.to_sql(table_name, conn, if_exists='append', index=False)
 
             print('Creating index...')
-            create_idx_query = "CREATE INDEX IF NOT EXISTS idx_{} ON {}(supported_id);".format(table_name.lower(), table_name)
-            cursor.execute(create_idx_query)
+            cursor.execute(OpenAlexProcessor.get_id_index_query(table_name, hash_keys))
             conn.commit()
+            if bloom_filter:
+                print('Building Bloom filter...')
+                PidBloomFilter.build(conn, table_name, PidBloomFilter.get_filter_dir(db_path))
 
         print(
             f"Creating and indexing the database table for {id_type.upper()}s took {(time.time() - start_time) / 60} minutes")
 
+    @staticmethod
+    def _resume_id_db_table(cursor: sql.Cursor, table_name: str) -> bool:
+        """
+        Checks whether a PID table was completed by a previous run, i.e. whether its lookup index exists, which is only
+        created once all the rows have been loaded (see get_id_index_query()). A partially loaded table is dropped.
+        :return: True if the table is complete, False if it does not exist (anymore)
+        """
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type='index' AND name=?", (f'idx_{table_name.lower()}',))
+        if cursor.fetchone():
+            return True
+        cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
+        return False
+
+    @staticmethod
+    def _update_id_db_table(conn: sql.Connection, inp_dir: str, table_name: str, id_type: str, routed: bool,
+                            merged_ids_dir: Union[str, None], decompression: str, int_ids: bool = False,
+                            hash_keys: bool = False) -> None:
+        cursor = conn.cursor()
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {table_name} ({OpenAlexProcessor.get_id_table_schema(int_ids, hash_keys)})")
+        # an existing table keeps its encoding and keys
+        int_ids = OpenAlexProcessor.has_int_openalex_ids(conn, table_name)
+        hash_keys = OpenAlexProcessor.has_pid_hash_key(conn, table_name)
+        encode = OpenAlexProcessor.encode_openalex_id if int_ids else str
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table_name.lower()}_openalex_id ON {table_name}(openalex_id)")
+        cursor.execute("CREATE TABLE IF NOT EXISTS IngestedPartitions (table_name TEXT, partition TEXT)")
+        ingested = {r[0] for r in cursor.execute("SELECT partition FROM IngestedPartitions WHERE table_name=?", (table_name,))}
+
+        files_by_partition = defaultdict(list)
+        for file_path in list_table_files(inp_dir):
+            files_by_partition[OpenAlexProcessor.get_partition(basename(file_path))].append(file_path)
+
+        for partition in sorted(p for p in files_by_partition if p not in ingested):
+            logging.info(f'Ingesting partition {partition} into {table_name}')
+            # rows inserted before this partition, which are the only ones to be replaced by the partition's rows
+            max_rowid = cursor.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table_name}").fetchone()[0]
+            for file_path in tqdm(files_by_partition[partition], desc=f"Ingesting {partition}", unit="file"):
+                for file_df in read_table_file(file_path, use_pandas=True):
+                    id_df = file_df if routed else file_df[file_df['supported_id'].str.startswith(id_type)]
+                    id_df = OpenAlexProcessor.prepare_id_df(id_df, int_ids, hash_keys)
+                    cursor.executemany(f"DELETE FROM {table_name} WHERE openalex_id=? AND rowid<=?",
+                                       ((oaid.item() if int_ids else oaid, max_rowid) for oaid in id_df['openalex_id'].unique()))
+                    id_df.to_sql(table_name, conn, if_exists='append', index=False)
+            cursor.execute("INSERT INTO IngestedPartitions VALUES (?, ?)", (table_name, partition))
+            conn.commit()
+
+        if merged_ids_dir:
+            merged_partition = 'merged_ids/{}'
+            for file_path in sorted(join(root, f) for root, dirs, files in walk(merged_ids_dir) for f in files
+                                    if f.endswith('.csv.gz')):
+                partition = merged_partition.format(relpath(file_path, merged_ids_dir))
+                if partition in ingested:
+                    continue
+                with open_gzip(file_path, decompression) as f:
+                    merged_df = pd.read_csv(f, usecols=['id'], dtype=str)
+                cursor.executemany(f"DELETE FROM {table_name} WHERE openalex_id=?",
+                                   ((encode(oaid.removeprefix('https://openalex.org/')),) for oaid in merged_df['id']))
+                logging.info(f'Deleted merged entities in {file_path} from {table_name}')
+                cursor.execute("INSERT INTO IngestedPartitions VALUES (?, ?)", (table_name, partition))
+                conn.commit()
+
+    def load_openalex_ids_db(self, inp_dir: str, db_path: str, entity_type: Literal[
+        'work', 'source', 'author', 'publisher', 'institution', 'funder'], id_types: Union[list, None] = None,
+                             batch_size: int = 500000, parser: Literal['json', 'orjson', 'ids_only'] = 'json',
+                             csv_out_dir: Union[str, None] = None, split_by_id_type: bool = False,
+                             decompression: str = 'auto', int_ids: bool = False, hash_keys: bool = False,
+                             output_format: TableFormat = 'csv', bloom_filter: bool = False,
+                             resume: bool = False) -> None:
+        """
+        Streams the PIDs extracted from the OpenAlex dump directly into the database, creating a table for each of the
+        specified ID types (the same tables created by create_id_db_table(), e.g. 'WorksDoi', 'WorksPmid'), without
+        writing and re-reading intermediate CSV tables. Rows are inserted in large transactions with bulk-load
+        settings (no rollback journal, no synchronous writes, large page cache) and the tables are indexed only
+        after all the rows have been loaded.
+        :param inp_dir: the directory where the OpenAlex dump is stored, in the form of compressed JSONL files
+        :param db_path: the path to the database file
+        :param entity_type: the OpenAlex entity type
+        :param id_types: the PID schemes to create a table for (default: all the schemes extracted for entity_type, see
+            SUPPORTED_ID_TYPES). PIDs of other schemes are discarded.
+        :param batch_size: the number of rows inserted in the database in each transaction (default: 500,000)
+        :param parser: the backend used to parse the lines of the dump (see get_line_parser())
+        :param csv_out_dir: if specified, the extracted PIDs are also written to CSV tables in this directory, as in
+            create_openalex_ids_table() (default: None, i.e. no CSV tables are written)
+        :param split_by_id_type: if True and csv_out_dir is specified, the CSV tables are split by PID scheme (see
+            create_openalex_ids_table())
+        :param decompression: the backend used to decompress the files of the dump (see
+            utils.get_decompression_backend())
+        :param int_ids: if True, the OpenAlex IDs are stored with their integer encoding (see create_id_db_table())
+        :param hash_keys: if True, the tables are keyed on the fingerprints of the PIDs (see create_id_db_table())
+        :param output_format: the format of the tables written to csv_out_dir, if specified (see
+            create_openalex_ids_table())
+        :param bloom_filter: if True, a Bloom filter of the PIDs in each table is also built (see create_id_db_table())
+        :param resume: if True, resumes an interrupted run: nothing is loaded if all the tables already exist and are
+            complete, otherwise the partially loaded tables are dropped and the dump is loaded again
+        :return: None
+        """
+        process_line = self.get_ids_extractor(entity_type)
+        entity_type = entity_type.lower().strip()
+        id_types = id_types or self.SUPPORTED_ID_TYPES[entity_type]
+        table_names = {id_type: self.get_table_name(entity_type, id_type) for id_type in id_types}
+        start_time = time.time()
+
+        with closing(sql.connect(db_path)) as conn, ExitStack() as stack:
+            cursor = conn.cursor()
+            if resume:
+                # the tables are loaded in a single pass over the dump: all of them are loaded again if one is partial
+                completed = [self._resume_id_db_table(cursor, table_name) for table_name in table_names.values()]
+                if all(completed):
+                    print(f"Tables {', '.join(table_names.values())} are already complete: skipping them")
+                    return
+                for table_name in table_names.values():
+                    cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
+                conn.commit()
+            for table_name in table_names.values():
+                cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table_name,))
+                if cursor.fetchone():
+                    raise ValueError(f"Table {table_name} already exists")
+
+            # bulk-load settings: they only hold for the current connection
+            cursor.execute('PRAGMA journal_mode = OFF')
+            cursor.execute('PRAGMA synchronous = OFF')
+            cursor.execute('PRAGMA cache_size = -1048576')  # ~1 GB
+            cursor.execute('PRAGMA temp_store = MEMORY')
+
+            for table_name in table_names.values():
+                cursor.execute(f"CREATE TABLE {table_name} ({self.get_id_table_schema(int_ids, hash_keys)})")
+            conn.commit()
+            encode = self.encode_openalex_id if int_ids else str
+
+            csv_writer = stack.enter_context(
+                self.get_ids_writer(csv_out_dir, split_by_id_type, **get_writer_options(output_format))
+            ) if csv_out_dir else None
+
+            batches = {id_type: [] for id_type in id_types}
+            buffered_rows = 0
+            loaded_rows = 0
+            for line in self.read_compressed_openalex_dump(inp_dir, parser, decompression):
+                for r in process_line(line):
+                    if csv_writer:
+                        csv_writer.write_row(r)
+                    id_type = r['supported_id'].split(':', 1)[0]
+                    if id_type in batches:
+                        row = (r['supported_id'], encode(r['openalex_id']))
+                        batches[id_type].append(row + (self.pid_fingerprint(r['supported_id']),) if hash_keys else row)
+                        buffered_rows += 1
+                if buffered_rows >= batch_size:
+                    loaded_rows += self._insert_id_batches(conn, batches, table_names)
+                    buffered_rows = 0
+            loaded_rows += self._insert_id_batches(conn, batches, table_names)
+
+            for table_name in table_names.values():
+                print(f'Creating index on {table_name}...')
+                cursor.execute(self.get_id_index_query(table_name, hash_keys))
+            conn.commit()
+            if bloom_filter:
+                for table_name in table_names.values():
+                    print(f'Building Bloom filter of {table_name}...')
+                    PidBloomFilter.build(conn, table_name, PidBloomFilter.get_filter_dir(db_path))
+
+        print(f"Loading and indexing {loaded_rows} PIDs of OpenAlex {entity_type}s into the database tables "
+              f"{', '.join(table_names.values())} took {(time.time() - start_time) / 60} minutes")
+
+    @staticmethod
+    def _insert_id_batches(conn: sql.Connection, batches: dict, table_names: dict) -> int:
+        inserted = 0
+        for id_type, rows in batches.items():
+            if rows:
+                conn.executemany(f"INSERT INTO {table_names[id_type]} VALUES ({', '.join('?' * len(rows[0]))})", rows)
+                inserted += len(rows)
+                rows.clear()
+        conn.commit()
+        return inserted
+
+
+class SortedPidIndex:
+    """
+    A read-only copy of the lookup tables of the database of OpenAlex IDs (see Mapping.LOOKUP_TABLES and
+    Mapping.RA_LOOKUP_TABLES), compiled into sorted fixed-width arrays stored as .npy files. For each table, the arrays
+    store the fingerprints of the PIDs (see OpenAlexProcessor.pid_fingerprint()), sorted, the integer encoding of the
+    corresponding OpenAlex IDs (see OpenAlexProcessor.encode_openalex_id()) and the position of each PID in a binary
+    file storing all the PIDs of the table, used to discard the PIDs that only share the fingerprint with the searched
+    one. The arrays are opened as memory maps: PIDs are looked up with binary searches reading a few pages of the files,
+    and all the processes using the same index share a single copy of it in the page cache.
+
+    :param index_dir: the directory storing the index, created with build()
+    """
+    MANIFEST_FILE = 'manifest.json'  # written last by build(), lists the tables and the database the index derives from
+    ARRAYS = ('keys', 'ids', 'starts', 'lengths')
+
+    def __init__(self, index_dir: str):
+        with open(join(index_dir, self.MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        self.tables = dict()
+        for table_name in self.manifest['tables']:
+            # memory maps are viewed as plain arrays, which are faster to index
+            arrays = {a: np.load(join(index_dir, f'{table_name}.{a}.npy'), mmap_mode='r').view(np.ndarray)
+                      for a in self.ARRAYS}
+            pids_path = join(index_dir, f'{table_name}.pids')
+            # empty files cannot be memory-mapped
+            arrays['pids'] = np.memmap(pids_path, dtype=np.uint8, mode='r').view(np.ndarray) if getsize(pids_path) \
+                else np.empty(0, np.uint8)
+            self.tables[table_name] = arrays
+
+    @staticmethod
+    def build(db_path: str, index_dir: str, batch_size: int = 1000000) -> None:
+        """
+        Compiles the lookup tables of a database of OpenAlex IDs into an index stored in index_dir. Each table is
+        sorted in memory, which takes about 40 bytes per row, plus the size of the numpy arrays written to disk.
+        :param db_path: the path to the database file
+        :param index_dir: the directory where to store the index
+        :param batch_size: the number of rows read from the database at a time (default: 1,000,000)
+        :return: None
+        """
+        makedirs(index_dir, exist_ok=True)
+        manifest_path = join(index_dir, SortedPidIndex.MANIFEST_FILE)
+        if exists(manifest_path):
+            remove(manifest_path)  # the index is not valid until it is fully rebuilt
+        tables = []
+        with closing(sql.connect(db_path)) as conn:
+            existing = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+            for table_name in Mapping.LOOKUP_TABLES + Mapping.RA_LOOKUP_TABLES:
+                if table_name not in existing:
+                    continue
+                # the fingerprints already stored in tables keyed on them are not computed again
+                hash_keys = OpenAlexProcessor.has_pid_hash_key(conn, table_name)
+                columns = 'supported_id, openalex_id, pid_hash' if hash_keys else 'supported_id, openalex_id'
+                keys, ids, lengths = [np.empty(0, np.int64)], [np.empty(0, np.int64)], [np.empty(0, np.int32)]
+                with open(join(index_dir, f'{table_name}.pids'), 'wb') as pids_file:
+                    cursor = conn.execute(f'SELECT {columns} FROM {table_name}')
+                    while rows := cursor.fetchmany(batch_size):
+                        pids = [r[0].encode('utf-8') for r in rows]
+                        pids_file.write(b''.join(pids))
+                        lengths.append(np.fromiter(map(len, pids), np.int32, len(pids)))
+                        keys.append(np.fromiter((r[2] if hash_keys else OpenAlexProcessor.pid_fingerprint(r[0])
+                                                 for r in rows), np.int64, len(rows)))
+                        ids.append(np.fromiter((r[1] if isinstance(r[1], int) else
+                                                OpenAlexProcessor.encode_openalex_id(r[1]) for r in rows),
+                                               np.int64, len(rows)))
+                keys, ids, lengths = np.concatenate(keys), np.concatenate(ids), np.concatenate(lengths)
+                starts = np.cumsum(lengths, dtype=np.int64) - lengths
+                order = np.argsort(keys, kind='stable')
+                for name, array in zip(SortedPidIndex.ARRAYS, (keys, ids, starts, lengths)):
+                    np.save(join(index_dir, f'{table_name}.{name}.npy'), array[order])
+                tables.append(table_name)
+
+        db_stat = stat(db_path)
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump({'tables': tables, 'db_size': db_stat.st_size, 'db_mtime_ns': db_stat.st_mtime_ns}, f)
+
+    @staticmethod
+    def is_current(index_dir: str, db_path: str) -> bool:
+        """
+        Checks whether an index was built from the current version of a database, i.e. the size and the modification
+        time of the database file did not change since then.
+        :param index_dir: the directory storing the index
+        :param db_path: the path to the database file
+        :return: True if the index exists and is current, False otherwise
+        """
+        manifest_path = join(index_dir, SortedPidIndex.MANIFEST_FILE)
+        if not exists(manifest_path):
+            return False
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        db_stat = stat(db_path)
+        return manifest['db_size'] == db_stat.st_size and manifest['db_mtime_ns'] == db_stat.st_mtime_ns
+
+    def lookup_openalex_ids(self, table_name: str, pids: list) -> dict:
+        """
+        Looks up the OpenAlex IDs associated with several PIDs in a table of the index, with the same results as
+        Mapping.lookup_openalex_ids_batch() on the database table. Tables missing from the database are empty.
+        :param table_name: the name of the table (e.g. 'WorksDoi')
+        :param pids: the prefixed PIDs to look up
+        :return: a dict mapping each PID found in the table to the list of the integer encodings of its OpenAlex IDs
+        """
+        results = defaultdict(list)
+        table = self.tables.get(table_name)
+        if table is None or not pids:
+            return results
+        pids = list(pids)
+        keys = table['keys']
+        fingerprints = np.fromiter(map(OpenAlexProcessor.pid_fingerprint, pids), np.int64, len(pids))
+        positions = np.searchsorted(keys, fingerprints)
+        found = positions < len(keys)
+        found[found] = keys[positions[found]] == fingerprints[found]
+        for j in np.flatnonzero(found).tolist():
+            pid, i, fingerprint = pids[j], int(positions[j]), fingerprints[j]
+            encoded_pid = pid.encode('utf-8')
+            while i < len(keys) and keys[i] == fingerprint:
+                # fingerprints are computed on normalised PIDs, while the tables are searched for the exact PID
+                offset = int(table['starts'][i])
+                if table['lengths'][i] == len(encoded_pid) and \
+                        table['pids'][offset:offset + len(encoded_pid)].tobytes() == encoded_pid:
+                    results[pid].append(int(table['ids'][i]))
+                i += 1
+        return results
+
+
+class PidBloomFilter:
+    """
+    A Bloom filter storing the fingerprints of the PIDs of a lookup table of the database of OpenAlex IDs (see
+    OpenAlexProcessor.pid_fingerprint()), used by Mapping to skip the lookups of PIDs that are certainly absent from the
+    table. PIDs the filter might contain are looked up as usual, so the results of the mapping do not change. Each bit
+    array is sized for ERROR_RATE false positives and stored as a .npy file in a directory next to the database file,
+    together with a JSON file describing it (see get_filter_dir()).
+
+    :param bits: the bit array of the filter
+    :param hashes: the number of bits set for each PID
+    """
+    ERROR_RATE = 0.01  # expected fraction of absent PIDs the filters might contain, i.e. about 9.6 bits per PID
+    _MIX = 0x9E3779B97F4A7C15  # multiplier deriving the second hash of a PID from its fingerprint
+    _MASK = (1 << 64) - 1
+
+    def __init__(self, bits: np.ndarray, hashes: int):
+        self.bits = bits
+        self.hashes = hashes
+        self.size = len(bits) * 8
+        self._bytes = memoryview(bits)  # faster than the array when reading single bits
+        # counters of the PIDs checked, of those certainly absent and of those looked up but not found
+        self.probes = 0
+        self.skipped = 0
+        self.false_positives = 0
+
+    @staticmethod
+    def get_filter_dir(db_path: str) -> str:
+        """
+        Returns the directory storing the Bloom filters of the tables of a database, i.e. the path to the database
+        file without its extension, followed by '_bloom'.
+        """
+        return splitext(db_path)[0] + '_bloom'
+
+    def _bit_positions(self, fingerprints: np.ndarray) -> np.ndarray:
+        # double hashing: the i-th bit of a PID is (h1 + i * h2) mod size, computed with 64-bit unsigned overflow
+        h1 = fingerprints.astype(np.int64).view(np.uint64)
+        h2 = ((h1 ^ (h1 >> np.uint64(31))) * np.uint64(self._MIX)) | np.uint64(1)
+        steps = np.arange(self.hashes, dtype=np.uint64)
+        return (h1[:, None] + steps[None, :] * h2[:, None]) % np.uint64(self.size)
+
+    @staticmethod
+    def build(conn: sql.Connection, table_name: str, filter_dir: str, batch_size: int = 1000000) -> 'PidBloomFilter':
+        """
+        Builds the Bloom filter of a table of PIDs and stores it in filter_dir, replacing the existing one, if any.
+        :param conn: the connection to the database
+        :param table_name: the name of the table (e.g. 'WorksDoi')
+        :param filter_dir: the directory where to store the filter (see get_filter_dir())
+        :param batch_size: the number of rows read from the database at a time (default: 1,000,000)
+        :return: the filter
+        """
+        makedirs(filter_dir, exist_ok=True)
+        info_path = join(filter_dir, f'{table_name}.bloom.json')
+        if exists(info_path):
+            remove(info_path)  # the filter is not valid until it is fully rebuilt
+        n_pids, max_rowid = conn.execute(f'SELECT COUNT(*), COALESCE(MAX(rowid), 0) FROM {table_name}').fetchone()
+        n_bits = max(64, math.ceil(-max(n_pids, 1) * math.log(PidBloomFilter.ERROR_RATE) / math.log(2) ** 2))
+        n_bits = -(-n_bits // 8) * 8
+        hashes = max(1, round(n_bits / max(n_pids, 1) * math.log(2)))
+        bloom_filter = PidBloomFilter(np.zeros(n_bits // 8, np.uint8), hashes)
+
+        # the fingerprints already stored in tables keyed on them are not computed again
+        hash_keys = OpenAlexProcessor.has_pid_hash_key(conn, table_name)
+        cursor = conn.execute(f"SELECT {'pid_hash' if hash_keys else 'supported_id'} FROM {table_name}")
+        while rows := cursor.fetchmany(batch_size):
+            fingerprints = np.fromiter((r[0] if hash_keys else OpenAlexProcessor.pid_fingerprint(r[0])
+                                        for r in rows), np.int64, len(rows))
+            positions = bloom_filter._bit_positions(fingerprints).ravel()
+            np.bitwise_or.at(bloom_filter.bits, positions >> np.uint64(3),
+                             np.left_shift(1, positions & np.uint64(7)).astype(np.uint8))
+
+        np.save(join(filter_dir, f'{table_name}.bloom.npy'), bloom_filter.bits)
+        with open(info_path, 'w', encoding='utf-8') as f:
+            json.dump({'hashes': hashes, 'pids': n_pids, 'max_rowid': max_rowid}, f)
+        return bloom_filter
+
+    @staticmethod
+    def load(conn: sql.Connection, filter_dir: str, table_names: list) -> dict:
+        """
+        Loads the Bloom filters of several tables of a database. Filters that are missing, or that were built before
+        rows were added to their table, are not loaded.
+        :param conn: the connection to the database
+        :param filter_dir: the directory storing the filters (see get_filter_dir())
+        :param table_names: the names of the tables
+        :return: a dict mapping the name of each table whose filter was loaded to the filter
+        """
+        existing = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        bloom_filters = dict()
+        for table_name in table_names:
+            info_path = join(filter_dir, f'{table_name}.bloom.json')
+            if table_name not in existing:
+                continue
+            if not exists(info_path):
+                logging.warning(f'No Bloom filter found for {table_name} in {filter_dir}')
+                continue
+            with open(info_path, 'r', encoding='utf-8') as f:
+                info = json.load(f)
+            # rows are only appended to the tables, while deleted rows do not make the filters miss any PID
+            if conn.execute(f'SELECT COALESCE(MAX(rowid), 0) FROM {table_name}').fetchone()[0] != info['max_rowid']:
+                logging.warning(f'The Bloom filter of {table_name} is out of date and is not used')
+                continue
+            bits = np.load(join(filter_dir, f'{table_name}.bloom.npy'))
+            bloom_filters[table_name] = PidBloomFilter(bits, info['hashes'])
+        return bloom_filters
+
+    def might_contain(self, pid: str) -> bool:
+        """
+        Checks whether the filter might contain a PID: if not, the PID is certainly absent from the table.
+        """
+        self.probes += 1
+        h1 = OpenAlexProcessor.pid_fingerprint(pid) & self._MASK
+        h2 = ((h1 ^ (h1 >> 31)) * self._MIX & self._MASK) | 1
+        for i in range(self.hashes):
+            position = ((h1 + i * h2) & self._MASK) % self.size
+            if not self._bytes[position >> 3] & (1 << (position & 7)):
+                self.skipped += 1
+                return False
+        return True
+
+    def filter_pids(self, pids: list) -> list:
+        """
+        Selects the PIDs the filter might contain among several PIDs (see might_contain()).
+        """
+        pids = list(pids)
+        if not pids:
+            return pids
+        fingerprints = np.fromiter(map(OpenAlexProcessor.pid_fingerprint, pids), np.int64, len(pids))
+        positions = self._bit_positions(fingerprints)
+        bits = self.bits[positions >> np.uint64(3)] & np.left_shift(1, positions & np.uint64(7)).astype(np.uint8)
+        kept = np.flatnonzero(bits.all(axis=1)).tolist()
+        self.probes += len(pids)
+        self.skipped += len(pids) - len(kept)
+        return [pids[i] for i in kept]
+
+    @staticmethod
+    def get_stats(bloom_filters: dict) -> dict:
+        """
+        Sums the counters of several filters: the PIDs checked ('probes'), the PIDs certainly absent, whose lookups
+        were skipped ('skipped'), and the PIDs looked up without being found ('false_positives').
+        """
+        return {counter: sum(getattr(f, counter) for f in bloom_filters.values())
+                for counter in ('probes', 'skipped', 'false_positives')}
+
+    @staticmethod
+    def format_stats(stats: dict) -> str:
+        absent = stats['skipped'] + stats['false_positives']
+        return (f"Bloom filters: skipped {stats['skipped']} of {stats['probes']} PID lookups, "
+                f"{stats['false_positives']} false positives "
+                f"({stats['false_positives'] / absent if absent else 0:.4%} of the absent PIDs)")
+
 
 class Mapping:
+    # the lookup tables queried by map_omid_openalex_ids()
+    LOOKUP_TABLES = ['SourcesIssn', 'WorksDoi', 'WorksPmid', 'WorksPmcid', 'SourcesWikidata']
+    # the database of the fingerprints of the mapped rows, stored in out_dir by incremental runs
+    FINGERPRINT_INDEX_FILE = 'mapping_index.db'
+    PREVIOUS_OUTPUT_DIR = 'previous'  # the subdirectory the output of the previous run is moved to by incremental runs
+    LOOKUP_QUERY_SIZE = 500  # max number of PIDs looked up by a single query, below SQLite's limit of host parameters
+    PID_INDEX_BATCH_SIZE = 10000  # default number of rows looked up at once in a SortedPidIndex
+    READ_ONLY_MMAP_SIZE = 1 << 40  # max bytes of a read-only database memory-mapped (SQLite caps it at compile time)
+    # the lookup table and the priority of each supported PID scheme: only the PIDs of an entity with the lowest
+    # priority value are looked up (see select_lookup_pids())
+    PID_LOOKUP_TABLES = {'issn': ('SourcesIssn', 0), 'doi': ('WorksDoi', 1), 'pmid': ('WorksPmid', 2),
+                         'pmcid': ('WorksPmcid', 2), 'wikidata': ('SourcesWikidata', 2)}
+    # the lookup tables of each supported PID scheme of responsible agents, in order of precedence: a PID is only looked
+    # up in a table if it was not found in the previous ones (see select_ra_lookup_pids())
+    RA_PID_LOOKUP_TABLES = {'orcid': ['AuthorsOrcid'], 'ror': ['InstitutionsRor', 'FundersRor']}
+    RA_LOOKUP_TABLES = ['AuthorsOrcid', 'InstitutionsRor', 'FundersRor']
+    # the field of the rows of each reduced OC Meta table (see MetaProcessor.TABLE_FIELDNAMES) copied to the output of
+    # map_meta_tables(), if any
+    META_TABLE_FIELDS = {'primary_ents': 'type', 'venues': None, 'resp_ags': 'ra_role'}
+
     def __init__(self):
         pass
 
     @staticmethod
-    def map_omid_openalex_ids(inp_dir:str, db_path:str, out_dir:str, multi_mapped_dir:str, non_mapped_dir:str, type_field=True, all_rows=True) -> None:
+    def lookup_openalex_ids(cursor: sql.Cursor, table_name: str, pid: str, hash_keys: bool = False) -> list:
+        """
+        Looks up the OpenAlex IDs associated with a PID in a database table.
+        :param cursor: the cursor to the database
+        :param table_name: the name of the table to query (e.g. 'WorksDoi')
+        :param pid: the prefixed PID to look up (e.g. 'doi:10.1234/abc')
+        :param hash_keys: if True, the table is keyed on the fingerprints of the PIDs (see
+            OpenAlexProcessor.pid_fingerprint()): rows are searched by fingerprint, and those whose PID differs from
+            the searched one (i.e. fingerprint collisions) are discarded.
+        :return: the list of the result rows, each storing the OpenAlex ID as its first item
+        """
+        if hash_keys:
+            query = "SELECT openalex_id FROM {} WHERE pid_hash=? AND supported_id=?".format(table_name)
+            cursor.execute(query, (OpenAlexProcessor.pid_fingerprint(pid), pid))
+        else:
+            query = "SELECT openalex_id FROM {} WHERE supported_id=?".format(table_name)
+            cursor.execute(query, (pid,))
+        return cursor.fetchall()
+
+    @staticmethod
+    def select_lookup_pids(entity_ids: list) -> list:
+        """
+        Selects the PIDs of an OC Meta entity to look up in the database: if the entity has an ISSN, only ISSNs are
+        looked up; otherwise, if it has a DOI, only DOIs are looked up; otherwise, all the other supported PIDs are
+        looked up.
+        :param entity_ids: the list of the prefixed PIDs of the entity
+        :return: the list of the (table name, PID) tuples to look up, e.g. [('WorksDoi', 'doi:10.1234/abc')]
+        """
+        # if there is an ISSN for the entity in OC Meta, look only for ISSN in OpenAlex
+        if any(x.startswith('issn:') for x in entity_ids):
+            return [('SourcesIssn', pid) for pid in entity_ids if pid.startswith('issn')]
+
+        # if there is a DOI for the entity in OC Meta and no ISSNs, look only for DOI in OpenAlex
+        if any(x.startswith('doi:') for x in entity_ids):
+            return [('WorksDoi', pid) for pid in entity_ids if pid.startswith('doi:')]
+
+        # if there is no ISSN nor DOI for the entity in OC Meta, look for all the other IDs in OpenAlex
+        lookups = []
+        for pid in entity_ids:
+            if pid.startswith('pmid:'):
+                lookups.append(('WorksPmid', pid))
+            elif pid.startswith('pmcid:'):
+                lookups.append(('WorksPmcid', pid))
+            elif pid.startswith('wikidata:'):
+                lookups.append(('SourcesWikidata', pid))
+            # only PIDs for bibliographic resources supported by both OC Meta and OpenAlex are considered
+        return lookups
+
+    @staticmethod
+    def select_ra_lookup_pids(entity_ids: list, tables) -> list:
+        """
+        Selects the PIDs of an OC Meta responsible agent to look up in the database, i.e. all its ORCIDs and RORs, each
+        in the first table of its scheme (see RA_PID_LOOKUP_TABLES). The PIDs not found there are looked up in the
+        following tables of the scheme (see get_ra_fallback_lookup()): e.g. RORs are looked up in the table of funders
+        only if they are not found in the table of institutions, so that organisations that are both are mapped to
+        the institution.
+        :param entity_ids: the list of the prefixed PIDs of the agent
+        :param tables: the names of the lookup tables in the database: PIDs are not looked up in the other tables
+        :return: the list of the (table name, PID) tuples to look up, e.g. [('AuthorsOrcid', 'orcid:0000-0001-...')]
+        """
+        lookups = []
+        for pid in entity_ids:
+            table_name = next((t for t in Mapping.RA_PID_LOOKUP_TABLES.get(pid.split(':', 1)[0], ()) if t in tables),
+                              None)
+            if table_name is not None:
+                lookups.append((table_name, pid))
+        return lookups
+
+    @staticmethod
+    def get_ra_lookup_tables(conn: sql.Connection) -> list:
+        """
+        Returns the tables of RA_LOOKUP_TABLES that exist in the database, the only ones where the PIDs of responsible
+        agents are looked up.
+        :param conn: the connection to the database
+        :return: the list of the names of the tables
+        """
+        existing = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        return [t for t in Mapping.RA_LOOKUP_TABLES if t in existing]
+
+    @staticmethod
+    def get_ra_fallback_lookup(table_name: str, pid: str, tables) -> Union[tuple, None]:
+        """
+        Returns the lookup of a PID of a responsible agent not found in a table, i.e. the (table name, PID) tuple of the
+        next table of its scheme in RA_PID_LOOKUP_TABLES, if any.
+        :param table_name: the table where the PID was not found
+        :param pid: the prefixed PID
+        :param tables: the names of the lookup tables in the database: PIDs are not looked up in the other tables
+        :return: the (table name, PID) tuple to look up, or None if there are no tables left for the PID
+        """
+        scheme_tables = Mapping.RA_PID_LOOKUP_TABLES.get(pid.split(':', 1)[0], [])
+        following = scheme_tables[scheme_tables.index(table_name) + 1:] if table_name in scheme_tables else []
+        return next(((t, pid) for t in following if t in tables), None)
+
+    @staticmethod
+    def get_openalex_ids(cursor: sql.Cursor, entity_ids: list, hashed_tables: dict,
+                         bloom_filters: Union[dict, None] = None, lookup_cache: Union[LRUCache, None] = None,
+                         ra_ids: bool = False) -> set:
+        """
+        Looks up the OpenAlex IDs of an OC Meta entity from its PIDs, selected by select_lookup_pids().
+        :param cursor: the cursor to the database
+        :param entity_ids: the list of the prefixed PIDs of the entity
+        :param hashed_tables: a dict mapping the name of each table in LOOKUP_TABLES to True if the table is keyed on
+            the fingerprints of the PIDs (see lookup_openalex_ids())
+        :param bloom_filters: if specified, a dict mapping the name of some of the tables to their PidBloomFilter: PIDs
+            certainly absent from a table are not looked up
+        :param lookup_cache: if specified, the cache storing the OpenAlex IDs of the recently looked up PIDs (found or
+            not) by (table name, PID): PIDs in the cache are not looked up again
+        :param ra_ids: if True, the entity is a responsible agent, whose PIDs are selected by select_ra_lookup_pids()
+            among the tables in hashed_tables
+        :return: the set of the OpenAlex IDs of the entity, as stored in the database
+        """
+        oa_ids = set()
+        lookups = Mapping.select_ra_lookup_pids(entity_ids, hashed_tables) if ra_ids \
+            else Mapping.select_lookup_pids(entity_ids)
+        for table_name, pid in lookups:  # fallback lookups of responsible agents are appended while iterating
+            found = lookup_cache.get((table_name, pid)) if lookup_cache is not None else None
+            if found is None:
+                bloom_filter = bloom_filters.get(table_name) if bloom_filters else None
+                if bloom_filter is not None and not bloom_filter.might_contain(pid):
+                    found = ()
+                else:
+                    found = tuple(res[0] for res in
+                                  Mapping.lookup_openalex_ids(cursor, table_name, pid, hashed_tables[table_name]))
+                    if bloom_filter is not None and not found:
+                        bloom_filter.false_positives += 1
+                if lookup_cache is not None:
+                    lookup_cache.put((table_name, pid), found)
+            oa_ids.update(found)
+            if ra_ids and not found:
+                fallback = Mapping.get_ra_fallback_lookup(table_name, pid, hashed_tables)
+                if fallback is not None:
+                    lookups.append(fallback)
+        return oa_ids
+
+    @staticmethod
+    def lookup_openalex_ids_batch(cursor: sql.Cursor, table_name: str, pids: list, hash_keys: bool = False) -> dict:
+        """
+        Looks up the OpenAlex IDs associated with several PIDs in a database table, with one query for every
+        LOOKUP_QUERY_SIZE PIDs (see lookup_openalex_ids()).
+        :param cursor: the cursor to the database
+        :param table_name: the name of the table to query (e.g. 'WorksDoi')
+        :param pids: the distinct prefixed PIDs to look up
+        :param hash_keys: if True, the table is keyed on the fingerprints of the PIDs (see lookup_openalex_ids())
+        :return: a dict mapping each PID found in the table to the list of its OpenAlex IDs
+        """
+        results = defaultdict(list)
+        pids = list(pids)
+        for start in range(0, len(pids), Mapping.LOOKUP_QUERY_SIZE):
+            chunk = pids[start:start + Mapping.LOOKUP_QUERY_SIZE]
+            placeholders = ', '.join('?' * len(chunk))
+            if hash_keys:
+                query = "SELECT supported_id, openalex_id FROM {} WHERE pid_hash IN ({})".format(table_name,
+                                                                                                 placeholders)
+                cursor.execute(query, [OpenAlexProcessor.pid_fingerprint(pid) for pid in chunk])
+                chunk_set = set(chunk)
+                for supported_id, oaid in cursor.fetchall():
+                    if supported_id in chunk_set:  # fingerprint collisions are discarded
+                        results[supported_id].append(oaid)
+            else:
+                query = "SELECT supported_id, openalex_id FROM {} WHERE supported_id IN ({})".format(table_name,
+                                                                                                     placeholders)
+                cursor.execute(query, chunk)
+                for supported_id, oaid in cursor.fetchall():
+                    results[supported_id].append(oaid)
+        return results
+
+    @staticmethod
+    def get_openalex_ids_batch(cursor: sql.Cursor, entities_ids: list, hashed_tables: dict,
+                               pid_index: Union[SortedPidIndex, None] = None,
+                               bloom_filters: Union[dict, None] = None,
+                               lookup_cache: Union[LRUCache, None] = None, ra_ids: bool = False) -> list:
+        """
+        Looks up the OpenAlex IDs of several OC Meta entities at once: the PIDs selected for all the entities (see
+        select_lookup_pids()) are grouped by lookup table and each group is resolved with as few queries as possible
+        (see lookup_openalex_ids_batch()), then the results are scattered back to the entities.
+        :param cursor: the cursor to the database
+        :param entities_ids: a list storing the list of the prefixed PIDs of each entity
+        :param hashed_tables: a dict mapping the name of each table in LOOKUP_TABLES to True if the table is keyed on
+            the fingerprints of the PIDs (see lookup_openalex_ids())
+        :param pid_index: if specified, the PIDs are looked up in this index instead of the database (see
+            SortedPidIndex.lookup_openalex_ids())
+        :param bloom_filters: if specified, a dict mapping the name of some of the tables to their PidBloomFilter: PIDs
+            certainly absent from a table are not looked up
+        :param lookup_cache: if specified, the cache of the recently looked up PIDs (see get_openalex_ids())
+        :param ra_ids: if True, the entities are responsible agents (see get_openalex_ids()): the PIDs not found are
+            looked up again in the fallback tables of their scheme, all at once (see get_ra_fallback_lookup())
+        :return: a list storing the set of the OpenAlex IDs of each entity, in the same order as entities_ids
+        """
+        if ra_ids:
+            entities_lookups = [Mapping.select_ra_lookup_pids(entity_ids, hashed_tables) for entity_ids in entities_ids]
+        else:
+            entities_lookups = [Mapping.select_lookup_pids(entity_ids) for entity_ids in entities_ids]
+        found = defaultdict(dict)
+        pending = entities_lookups
+        while any(pending):
+            for table_name, table_found in Mapping._lookup_table_pids(cursor, pending, hashed_tables, pid_index,
+                                                                      bloom_filters, lookup_cache).items():
+                found[table_name].update(table_found)
+            if not ra_ids:
+                break
+            pending = [[fallback for table_name, pid in lookups if not found[table_name].get(pid)
+                        if (fallback := Mapping.get_ra_fallback_lookup(table_name, pid, hashed_tables)) is not None]
+                       for lookups in pending]
+            entities_lookups = [lookups + fallbacks for lookups, fallbacks in zip(entities_lookups, pending)]
+        return [{oaid for table_name, pid in lookups for oaid in found[table_name].get(pid, ())}
+                for lookups in entities_lookups]
+
+    @staticmethod
+    def _lookup_table_pids(cursor: sql.Cursor, entities_lookups: list, hashed_tables: dict,
+                           pid_index: Union[SortedPidIndex, None], bloom_filters: Union[dict, None],
+                           lookup_cache: Union[LRUCache, None]) -> dict:
+        # resolves the lookups of all the entities grouped by table: returns the found PIDs of each table
+        table_pids = defaultdict(set)
+        for lookups in entities_lookups:
+            for table_name, pid in lookups:
+                table_pids[table_name].add(pid)
+        cached = defaultdict(dict)  # the OpenAlex IDs of the PIDs found in the cache, by table
+        if lookup_cache is not None:
+            for table_name, pids in table_pids.items():
+                for pid in pids:
+                    oa_ids = lookup_cache.get((table_name, pid))
+                    if oa_ids is not None:
+                        cached[table_name][pid] = oa_ids
+                pids.difference_update(cached[table_name])
+            missed = {table_name: list(pids) for table_name, pids in table_pids.items()}
+        if bloom_filters:
+            for table_name in table_pids.keys() & bloom_filters.keys():
+                table_pids[table_name] = bloom_filters[table_name].filter_pids(table_pids[table_name])
+        if pid_index is not None:
+            found = {table_name: pid_index.lookup_openalex_ids(table_name, pids)
+                     for table_name, pids in table_pids.items()}
+        else:
+            found = {table_name: Mapping.lookup_openalex_ids_batch(cursor, table_name, pids, hashed_tables[table_name])
+                     for table_name, pids in table_pids.items()}
+        if bloom_filters:
+            for table_name in table_pids.keys() & bloom_filters.keys():
+                bloom_filters[table_name].false_positives += len(table_pids[table_name]) - len(found[table_name])
+        if lookup_cache is not None:
+            for table_name, pids in missed.items():
+                for pid in pids:
+                    lookup_cache.put((table_name, pid), tuple(found[table_name].get(pid, ())))
+                found[table_name].update(cached[table_name])
+        return found
+
+    @staticmethod
+    def _create_staging_tables(conn: sql.Connection) -> None:
+        # temporary tables are stored outside the database file and dropped when the connection is closed
+        conn.execute('CREATE TEMP TABLE MetaRows (rid INTEGER PRIMARY KEY, omid TEXT, type TEXT)')
+        conn.execute('CREATE TEMP TABLE MetaPids (rid INTEGER, priority INTEGER, lookup_table TEXT, pid TEXT, '
+                     'pid_hash INTEGER)')
+
+    @staticmethod
+    def _drop_staging_tables(conn: sql.Connection) -> None:
+        for table in ['MetaRows', 'MetaPids', 'SelectedPids', 'Matches']:
+            conn.execute(f'DROP TABLE IF EXISTS temp.{table}')
+
+    @staticmethod
+    def stage_rows(conn: sql.Connection, rows: list, start_rid: int, hashed_tables: dict) -> None:
+        """
+        Loads a batch of rows of the reduced OC Meta tables into the staging tables created in the database connection
+        for the 'sql' execution mode of map_omid_openalex_ids(): MetaRows stores the OMID and the type of each row,
+        MetaPids stores each of its PIDs supported by a lookup table, with the priority of its scheme (see
+        PID_LOOKUP_TABLES).
+        :param conn: the connection to the database
+        :param rows: the list of the (row, PIDs) tuples to stage
+        :param start_rid: the progressive number identifying the first row of the batch
+        :param hashed_tables: a dict mapping the name of each table in LOOKUP_TABLES to True if the table is keyed on
+            the fingerprints of the PIDs (see lookup_openalex_ids())
+        :return: None
+        """
+        conn.executemany('INSERT INTO MetaRows VALUES (?, ?, ?)',
+                         ((start_rid + i, row['omid'], row.get('type')) for i, (row, _) in enumerate(rows)))
+        pids = []
+        for i, (_, entity_ids) in enumerate(rows):
+            for pid in entity_ids:
+                lookup = Mapping.PID_LOOKUP_TABLES.get(pid.split(':', 1)[0])
+                if lookup is None:
+                    continue  # only PIDs supported by both OC Meta and OpenAlex are considered
+                table_name, priority = lookup
+                pid_hash = OpenAlexProcessor.pid_fingerprint(pid) if hashed_tables[table_name] else None
+                pids.append((start_rid + i, priority, table_name, pid, pid_hash))
+        conn.executemany('INSERT INTO MetaPids VALUES (?, ?, ?, ?, ?)', pids)
+
+    @staticmethod
+    def map_staged_rows(conn: sql.Connection, hashed_tables: dict) -> Generator:
+        """
+        Computes in SQL the OpenAlex IDs of the rows loaded with stage_rows(): the PIDs with the lowest priority of each
+        row are selected with a window function (i.e. the same rules of select_lookup_pids()), joined to their lookup
+        tables and grouped by row.
+        :param conn: the connection to the database
+        :param hashed_tables: a dict mapping the name of each table in LOOKUP_TABLES to True if the table is keyed on
+            the fingerprints of the PIDs (see lookup_openalex_ids())
+        :return: yields a (OMID, type, set of OpenAlex IDs) tuple for each staged row, in the order they were staged
+        """
+        conn.execute("""CREATE TEMP TABLE SelectedPids AS
+            SELECT rid, lookup_table, pid, pid_hash FROM (
+                SELECT *, MIN(priority) OVER (PARTITION BY rid) AS min_priority FROM MetaPids
+            ) WHERE priority = min_priority""")
+        joins = []
+        for (table_name,) in conn.execute('SELECT DISTINCT lookup_table FROM SelectedPids').fetchall():
+            if hashed_tables[table_name]:
+                condition = 't.pid_hash = s.pid_hash AND t.supported_id = s.pid'
+            else:
+                condition = 't.supported_id = s.pid'
+            joins.append(f"SELECT s.rid, t.openalex_id FROM SelectedPids s JOIN {table_name} t ON {condition} "
+                         f"WHERE s.lookup_table = '{table_name}'")
+        if joins:
+            conn.execute('CREATE TEMP TABLE Matches AS SELECT DISTINCT rid, openalex_id FROM ({})'.format(
+                ' UNION ALL '.join(joins)))
+        else:
+            conn.execute('CREATE TEMP TABLE Matches (rid INTEGER, openalex_id)')
+        conn.execute('CREATE INDEX temp.idx_matches_rid ON Matches(rid)')
+
+        query = ("SELECT r.omid, r.type, group_concat(m.openalex_id, ' ') FROM MetaRows r "
+                 "LEFT JOIN Matches m ON m.rid = r.rid GROUP BY r.rid ORDER BY r.rid")
+        for omid, res_type, oa_ids in conn.execute(query):
+            # OpenAlex IDs stored with their integer encoding are concatenated as digit strings
+            yield omid, res_type, {int(x) if x.isdigit() else x for x in oa_ids.split(' ')} if oa_ids else set()
+
+    @staticmethod
+    def read_openalex_pids(openalex_tables_dirs: dict) -> Generator:
+        """
+        Reads the PIDs of the tables created with OpenAlexProcessor.create_openalex_ids_table() (also with
+        split_by_id_type=True) that would be loaded into one of the LOOKUP_TABLES, e.g. the DOIs of Works.
+        :param openalex_tables_dirs: a dict mapping each OpenAlex entity type to the directory storing its tables, e.g.
+            {'work': 'openalex_tables/works', 'source': 'openalex_tables/sources'}
+        :return: yields a (PID, OpenAlex ID) tuple for each row of the tables
+        """
+        for entity_type, tables_dir in openalex_tables_dirs.items():
+            schemes = [s for s in OpenAlexProcessor.SUPPORTED_ID_TYPES[entity_type]
+                       if OpenAlexProcessor.get_table_name(entity_type, s) in Mapping.LOOKUP_TABLES]
+            dirs = [tables_dir] + [join(tables_dir, s) for s in schemes if isdir(join(tables_dir, s))]
+            for row in read_csv_tables(*dirs):
+                if row['supported_id'].split(':', 1)[0] in schemes:
+                    yield row['supported_id'], row['openalex_id']
+
+    @staticmethod
+    def merge_join_pids(meta_pids, openalex_pids) -> Generator:
+        """
+        Joins two streams of tuples sorted by PID with a single sequential pass over each of them.
+        :param meta_pids: the (PID, row number) tuples of the rows to map, sorted
+        :param openalex_pids: the (PID, OpenAlex ID) tuples of the OpenAlex tables, sorted
+        :return: yields a (row number, OpenAlex ID) tuple for each pair of tuples with the same PID
+        """
+        openalex_groups = groupby(openalex_pids, key=itemgetter(0))
+        openalex_pid, openalex_ids = None, []
+        for pid, meta_group in groupby(meta_pids, key=itemgetter(0)):
+            while openalex_pid is None or openalex_pid < pid:
+                openalex_pid, openalex_group = next(openalex_groups, (None, ()))
+                if openalex_pid is None:
+                    return  # no more PIDs in the OpenAlex tables
+                openalex_ids = [oaid for _, oaid in openalex_group]
+            if openalex_pid == pid:
+                for _, rid in meta_group:
+                    for oaid in openalex_ids:
+                        yield rid, oaid
+
+    @staticmethod
+    def sort_merge_rows(rows, meta_pids: ExternalSorter, openalex_tables_dirs: dict, tmp_dir: str,
+                        max_rows_in_memory: int) -> Generator:
+        """
+        Computes the OpenAlex IDs of the rows to map with an external sort-merge join, which only reads and writes
+        files sequentially and keeps at most max_rows_in_memory rows in memory for each sort: the PIDs of the OpenAlex
+        tables are sorted, merge-joined with the sorted PIDs of the rows, and the matches are sorted by row number to
+        be merged with the rows.
+        :param rows: the (row number, OMID, type) tuples of the rows to map, sorted by row number (a zero-padded string)
+        :param meta_pids: the (PID, row number) tuples of the PIDs of the rows selected by select_lookup_pids()
+        :param openalex_tables_dirs: the directories storing the OpenAlex tables (see read_openalex_pids())
+        :param tmp_dir: the directory where the sorted runs are stored
+        :param max_rows_in_memory: the max number of rows sorted in memory (see utils.ExternalSorter)
+        :return: yields a (OMID, type, set of OpenAlex IDs) tuple for each row, in the same order as rows
+        """
+        with ExternalSorter(tmp_dir, max_rows_in_memory) as openalex_pids, \
+                ExternalSorter(tmp_dir, max_rows_in_memory) as matches:
+            openalex_pids.update(Mapping.read_openalex_pids(openalex_tables_dirs))
+            matches.update(Mapping.merge_join_pids(meta_pids, openalex_pids))
+            match_groups = groupby(matches, key=itemgetter(0))
+            match_rid, match_group = next(match_groups, (None, ()))
+            for rid, omid, res_type in rows:
+                oa_ids = set()
+                if match_rid == rid:
+                    oa_ids = {oaid for _, oaid in match_group}
+                    match_rid, match_group = next(match_groups, (None, ()))
+                yield omid, res_type, oa_ids
+
+    @staticmethod
+    def _write_mapping(row: dict, oa_ids, extra_field: Union[str, None], writer: MultiFileWriter,
+                       multi_mapped_writer: DictWriter, non_mapped_writer: MultiFileWriter) -> None:
+        if oa_ids:
+            # OpenAlex IDs stored with their integer encoding are decoded only when written to the output
+            oa_ids_str = ' '.join(OpenAlexProcessor.decode_openalex_id(x) for x in oa_ids)
+            if extra_field:
+                out_row = {'omid': row['omid'], 'openalex_id': oa_ids_str,
+                           extra_field: row[extra_field]}
+            else:
+                out_row = {'omid': row['omid'], 'openalex_id': oa_ids_str}
+
+            if len(oa_ids) > 1:
+                # multi-mapped OMID
+                multi_mapped_writer.writerow(out_row)
+            else:
+                writer.write_row(out_row)
+        else:
+            if extra_field:
+                non_mapped_writer.write_row({'omid': row['omid'], extra_field: row[extra_field]})
+            else:
+                non_mapped_writer.write_row({'omid': row['omid']})
+
+    @staticmethod
+    def open_read_only_db(db_path: str) -> sql.Connection:
+        """
+        Opens a database that is not modified while it is open, e.g. the database of OpenAlex IDs during the mapping,
+        as read-only and immutable: SQLite neither locks the file nor checks whether it changed, and its pages are
+        read through a memory map of up to READ_ONLY_MMAP_SIZE bytes shared with the other processes reading it.
+        :param db_path: the path to the database file
+        :return: the connection to the database
+        """
+        conn = sql.connect('file:{}?mode=ro&immutable=1'.format(pathname2url(abspath(db_path))), uri=True)
+        conn.execute(f'PRAGMA mmap_size={Mapping.READ_ONLY_MMAP_SIZE}')
+        return conn
+
+    @staticmethod
+    def map_table_file(file_path: str, db_path: str, out_dir: str, multi_mapped_path: str, non_mapped_dir: str,
+                       extra_field: Union[str, None], all_rows: bool, output_format: str, lookup_batch_size: int,
+                       pid_index_dir: Union[str, None], bloom_filter: bool = False,
+                       lookup_cache_size: int = 0, ra_ids: bool = False) -> tuple:
+        """
+        Maps the rows of a single table of the reduced OC Meta tables, as done by map_omid_openalex_ids() with the
+        'python' execution mode, opening the database as read-only (see open_read_only_db()). Used by the worker
+        processes of map_omid_openalex_ids() and map_meta_tables(): the mapped and non-mapped tables are written to
+        files named after the input file (e.g. '0_0.csv' for '0.csv'), so that several processes can write to the
+        same directories.
+        :param file_path: the path to the input table
+        :param db_path: the path to the database file
+        :param out_dir: the directory where the mapping tables are written
+        :param multi_mapped_path: the path to the CSV file where the multi-mapped OMIDs are written, without a header
+        :param non_mapped_dir: the directory where the tables of non-mapped entities are written
+        :param extra_field: the field of the input rows copied to the output (e.g. 'type'), or None
+        :param all_rows: see map_omid_openalex_ids()
+        :param output_format: see map_omid_openalex_ids()
+        :param lookup_batch_size: see map_omid_openalex_ids()
+        :param pid_index_dir: the directory storing the SortedPidIndex to look up the PIDs in, or None to look them up
+            in the database
+        :param bloom_filter: see map_omid_openalex_ids()
+        :param lookup_cache_size: see map_omid_openalex_ids()
+        :param ra_ids: if True, the rows are those of responsible agents, whose PIDs are looked up in the tables of
+            RA_LOOKUP_TABLES that exist in the database (see get_ra_lookup_tables() and select_ra_lookup_pids())
+        :return: a tuple storing the path to the input table and a dict storing the counters of the Bloom filters (see
+            PidBloomFilter.get_stats()) and of the lookup cache (see utils.LRUCache.get_stats())
+        """
+        file_prefix = basename(file_path).split('.')[0] + '_'
+        multi_mapped_fieldnames = ['omid', 'openalex_id', extra_field] if extra_field else ['omid', 'openalex_id']
+        non_mappped_fieldnames = ['omid', extra_field] if extra_field else ['omid']
+        aligned_fieldnames = ['omid', 'openalex_id', extra_field] if extra_field else ['omid', 'openalex_id']
+        pid_index = SortedPidIndex(pid_index_dir) if pid_index_dir else None
+        writer_options = get_writer_options(output_format)
+
+        with (
+            closing(Mapping.open_read_only_db(db_path)) as conn,
+            open(multi_mapped_path, 'w', newline='') as multi_mapped,
+            MultiFileWriter(non_mapped_dir, fieldnames=non_mappped_fieldnames, file_prefix=file_prefix,
+                            **writer_options) as non_mapped_writer,
+            MultiFileWriter(out_dir, fieldnames=aligned_fieldnames, file_prefix=file_prefix,
+                            **writer_options) as writer
+        ):
+            cursor = conn.cursor()
+            if ra_ids:
+                lookup_tables = Mapping.get_ra_lookup_tables(conn)
+            else:
+                lookup_tables = Mapping.LOOKUP_TABLES
+            hashed_tables = {t: OpenAlexProcessor.has_pid_hash_key(conn, t) for t in lookup_tables}
+            bloom_filters = PidBloomFilter.load(conn, PidBloomFilter.get_filter_dir(db_path), lookup_tables) \
+                if bloom_filter else dict()
+            lookup_cache = LRUCache(lookup_cache_size) if lookup_cache_size > 0 else None
+            multi_mapped_writer = DictWriter(multi_mapped, dialect='unix', fieldnames=multi_mapped_fieldnames)
+            pending = []  # batch of (row, PIDs) tuples to be looked up at once, if lookup_batch_size > 0
+
+            def write_pending():
+                oa_ids_batch = Mapping.get_openalex_ids_batch(cursor, [ids for _, ids in pending], hashed_tables,
+                                                              pid_index, bloom_filters, lookup_cache, ra_ids)
+                for (pending_row, _), oa_ids in zip(pending, oa_ids_batch):
+                    Mapping._write_mapping(pending_row, oa_ids, extra_field, writer, multi_mapped_writer,
+                                           non_mapped_writer)
+                pending.clear()
+
+            skip_id_prefix = ('ids', 'openalex:') if all_rows is False else None
+            for row in read_table_file(file_path, skip_id_prefix=skip_id_prefix):
+                entity_ids: list = row['ids'].split()
+                if any(x.startswith('openalex:') for x in entity_ids) and all_rows is False:
+                    continue
+                if lookup_batch_size > 0:
+                    pending.append((row, entity_ids))
+                    if len(pending) >= lookup_batch_size:
+                        write_pending()
+                else:
+                    oa_ids = Mapping.get_openalex_ids(cursor, entity_ids, hashed_tables, bloom_filters, lookup_cache,
+                                                      ra_ids)
+                    Mapping._write_mapping(row, oa_ids, extra_field, writer, multi_mapped_writer, non_mapped_writer)
+            write_pending()
+        stats = PidBloomFilter.get_stats(bloom_filters)
+        if lookup_cache is not None:
+            stats.update(lookup_cache.get_stats())
+        return file_path, stats
+
+    @staticmethod
+    def _map_tables_parallel(inputs: list, db_path: str, all_rows: bool, output_format: str, lookup_batch_size: int,
+                             pid_index_dir: Union[str, None], workers: int, bloom_filter: bool,
+                             lookup_cache_size: int) -> None:
+        """
+        Maps several directories of reduced OC Meta tables with a single pool of worker processes (see
+        map_table_file()), or in the current process if workers is 1. The input tables of all the directories are
+        submitted together, the largest first, so that the workers stay busy until the end of the process.
+        :param inputs: a list of (inp_dir, out_dir, multi_mapped_filepath, non_mapped_dir, extra_field, ra_ids) tuples
+            (see map_table_file())
+        :return: None
+        """
+        start_time = time.time()
+        tasks = []  # (input file, index of the input) tuples
+        part_paths = dict()
+        parts_dirs = []
+        for i, (inp_dir, _, multi_mapped_filepath, _, _, _) in enumerate(inputs):
+            input_files = sorted(list_table_files(inp_dir))
+            # the multi-mapped OMIDs of each input file are concatenated in the order of the input files
+            parts_dir = tempfile.mkdtemp(prefix='parts_', dir=dirname(multi_mapped_filepath))
+            parts_dirs.append((parts_dir, input_files))
+            part_paths.update({f: join(parts_dir, f'{j}.csv') for j, f in enumerate(input_files)})
+            tasks.extend((f, i) for f in input_files)
+        tasks.sort(key=lambda task: getsize(task[0]), reverse=True)
+
+        def get_task_args(file_path, i):  # the arguments of map_table_file()
+            _, out_dir, _, non_mapped_dir, extra_field, ra_ids = inputs[i]
+            return (file_path, db_path, out_dir, part_paths[file_path], non_mapped_dir, extra_field, all_rows,
+                    output_format, lookup_batch_size, pid_index_dir, bloom_filter, lookup_cache_size, ra_ids)
+
+        lookup_stats = defaultdict(int)
+        with ExitStack() as stack:
+            pbar = stack.enter_context(tqdm(total=len(tasks), desc=f"Mapping {len(inputs)} directories", unit="file"))
+            if workers > 1:
+                executor = stack.enter_context(ProcessPoolExecutor(max_workers=workers))
+                futures = [executor.submit(Mapping.map_table_file, *get_task_args(f, i)) for f, i in tasks]
+                results = (future.result() for future in as_completed(futures))
+            else:
+                results = (Mapping.map_table_file(*get_task_args(f, i)) for f, i in tasks)
+            for file_path, file_stats in results:
+                for counter, value in file_stats.items():
+                    lookup_stats[counter] += value
+                logging.info(f'Mapped file {file_path}')
+                pbar.update(1)
+
+        for (_, _, multi_mapped_filepath, _, extra_field, _), (parts_dir, input_files) in zip(inputs, parts_dirs):
+            with open(multi_mapped_filepath, 'w', newline='') as multi_mapped:
+                fieldnames = ['omid', 'openalex_id', extra_field] if extra_field else ['omid', 'openalex_id']
+                DictWriter(multi_mapped, dialect='unix', fieldnames=fieldnames).writeheader()
+                for f in input_files:
+                    with open(part_paths[f], 'r', newline='') as part:
+                        shutil.copyfileobj(part, multi_mapped)
+            shutil.rmtree(parts_dir)
+
+        Mapping._log_lookup_stats(lookup_stats, bloom_filter, lookup_cache_size)
+        print(f"Mapped {len(tasks)} files of {', '.join(inp[0] for inp in inputs)} with {workers} workers in "
+              f"{(time.time() - start_time) / 60} minutes")
+
+    @staticmethod
+    def _prepare_pid_index(db_path: str, pid_index_dir: Union[str, None]) -> str:
+        # the index is built (again) if it does not exist or the database changed since it was built
+        pid_index_dir = pid_index_dir or splitext(db_path)[0] + '_pid_index'
+        if not SortedPidIndex.is_current(pid_index_dir, db_path):
+            logging.info(f'Building the PID index of {db_path} in {pid_index_dir}.')
+            SortedPidIndex.build(db_path, pid_index_dir)
+        return pid_index_dir
+
+    @staticmethod
+    def _log_lookup_stats(stats: dict, bloom_filter: bool, lookup_cache_size: int) -> None:
+        # logged as warnings, the level kept by the log of main.py
+        if bloom_filter:
+            logging.warning(PidBloomFilter.format_stats(stats))
+        if lookup_cache_size > 0:
+            logging.warning(f"Lookup cache ({lookup_cache_size} PIDs): {stats['hits']} hits, {stats['misses']} misses, "
+                            f"{stats['evictions']} evictions")
+
+    @staticmethod
+    def row_fingerprint(row: dict) -> int:
+        """
+        Computes a stable 64-bit fingerprint of a row of the reduced OC Meta tables, i.e. the first 8 bytes of the
+        BLAKE2b digest of the values of its 'ids' and 'type' fields, read as a signed integer. Two versions of the row
+        of the same OMID have the same fingerprint only if they are mapped in the same way.
+        :param row: a row of the reduced OC Meta tables (the 'type' field is optional)
+        :return: the fingerprint of the row
+        """
+        content = '{}\x1f{}'.format(row['ids'], row.get('type') or '')
+        return int.from_bytes(blake2b(content.encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+
+    @staticmethod
+    def _open_fingerprint_index(index_path: str, settings: dict) -> sql.Connection:
+        """
+        Opens the database of the fingerprints of the rows mapped by the previous incremental run (see
+        map_omid_openalex_ids()). The fingerprints are discarded if the previous run used different settings, so that
+        all the rows are mapped again.
+        :param index_path: the path to the database file
+        :param settings: the settings of the current run that affect the content of the output rows
+        :return: the connection to the database
+        """
+        index = sql.connect(index_path)
+        index.execute('CREATE TABLE IF NOT EXISTS Fingerprints (omid TEXT PRIMARY KEY, fingerprint INTEGER) WITHOUT ROWID')
+        index.execute('CREATE TABLE IF NOT EXISTS RunInfo (key TEXT PRIMARY KEY, value TEXT)')
+        index.execute('DROP TABLE IF EXISTS NewFingerprints')
+        index.execute('CREATE TABLE NewFingerprints (omid TEXT PRIMARY KEY, fingerprint INTEGER) WITHOUT ROWID')
+        previous_settings = index.execute("SELECT value FROM RunInfo WHERE key='settings'").fetchone()
+        if previous_settings and json.loads(previous_settings[0]) != settings:
+            logging.warning('The previous mapping run used different settings: all the rows are mapped again.')
+            index.execute('DELETE FROM Fingerprints')
+        index.commit()
+        return index
+
+    @staticmethod
+    def _get_run_status(index: sql.Connection) -> Union[str, None]:
+        res = index.execute("SELECT value FROM RunInfo WHERE key='status'").fetchone()
+        return res[0] if res else None
+
+    @staticmethod
+    def _set_run_status(index: sql.Connection, status: str) -> None:
+        index.execute("INSERT OR REPLACE INTO RunInfo VALUES ('status', ?)", (status,))
+        index.commit()
+
+    @staticmethod
+    def _stage_previous_output(index: sql.Connection, out_dirs: list) -> None:
+        """
+        Moves the tables written by the previous run in out_dirs to the PREVIOUS_OUTPUT_DIR subdirectory of each
+        directory, so that the rows of the unchanged OMIDs can be carried forward. The progress is recorded in the
+        fingerprint index, so that an interrupted run can be launched again: the output of a completed run is
+        staged again, the output of an interrupted staging step is staged entirely, and the partial output of an
+        interrupted mapping step is discarded.
+        :param index: the connection to the fingerprint index
+        :param out_dirs: the output directories of map_omid_openalex_ids()
+        :return: None
+        """
+        status = Mapping._get_run_status(index)
+        if status == 'running':  # the tables of the previous run are already staged: discard the partial output
+            for d in out_dirs:
+                for file_path in list_table_files(d):
+                    remove(file_path)
+            return
+        if status != 'staging':
+            for d in out_dirs:
+                if isdir(join(d, Mapping.PREVIOUS_OUTPUT_DIR)):  # left by a completed run
+                    shutil.rmtree(join(d, Mapping.PREVIOUS_OUTPUT_DIR))
+            Mapping._set_run_status(index, 'staging')
+        for d in out_dirs:
+            previous_dir = join(d, Mapping.PREVIOUS_OUTPUT_DIR)
+            makedirs(previous_dir, exist_ok=True)
+            for file_path in list_table_files(d):
+                shutil.move(file_path, join(previous_dir, basename(file_path)))
+        Mapping._set_run_status(index, 'running')
+
+    @staticmethod
+    def _diff_fingerprints(index: sql.Connection, inp_dir: str, skip_id_prefix: Union[tuple, None],
+                           batch_size: int) -> tuple:
+        """
+        Loads the fingerprints of all the input rows of an incremental run into the NewFingerprints table of the
+        fingerprint index, then compares them with those of the previous run (the Fingerprints table) with two
+        set-based anti-joins, rather than with a query for each row.
+        :param index: the connection to the fingerprint index
+        :param inp_dir: the directory of the input tables
+        :param skip_id_prefix: the prefix of the rows skipped while reading the input tables (see read_csv_tables())
+        :param batch_size: the number of fingerprints inserted at a time
+        :return: the set of the OMIDs to map, i.e. those that are new or whose row changed, and the set of the OMIDs of
+            the previous run whose output is not carried forward, i.e. those whose row changed or was removed. Both
+            are None if there are no fingerprints of a previous run, meaning that all the OMIDs are mapped and no
+            output is carried forward.
+        """
+        fingerprints = []
+        for row in read_csv_tables(inp_dir, skip_id_prefix=skip_id_prefix):
+            fingerprints.append((row['omid'], Mapping.row_fingerprint(row)))
+            if len(fingerprints) >= batch_size:
+                index.executemany('INSERT OR REPLACE INTO NewFingerprints VALUES (?, ?)', fingerprints)
+                fingerprints = []
+        index.executemany('INSERT OR REPLACE INTO NewFingerprints VALUES (?, ?)', fingerprints)
+        if index.execute('SELECT 1 FROM Fingerprints LIMIT 1').fetchone() is None:
+            return None, None
+        # both tables are keyed on the OMIDs, so that the joins walk them in order
+        to_map = {r[0] for r in index.execute('SELECT n.omid FROM NewFingerprints n LEFT JOIN Fingerprints f '
+                                              'ON f.omid = n.omid WHERE f.fingerprint IS NOT n.fingerprint')}
+        stale = {r[0] for r in index.execute('SELECT f.omid FROM Fingerprints f LEFT JOIN NewFingerprints n '
+                                             'ON n.omid = f.omid WHERE n.fingerprint IS NOT f.fingerprint')}
+        return to_map, stale
+
+    @staticmethod
+    def map_omid_openalex_ids(inp_dir:str, db_path:str, out_dir:str, multi_mapped_dir:str, non_mapped_dir:str, type_field=True, all_rows=True,
+                              output_format: TableFormat = 'csv', incremental: bool = False,
+                              batch_size: int = 100000, lookup_batch_size: int = 0,
+                              execution: Literal['python', 'sql', 'sort_merge'] = 'python',
+                              lookup_engine: Literal['sqlite', 'mmap'] = 'sqlite',
+                              pid_index_dir: Union[str, None] = None, openalex_tables_dirs: Union[dict, None] = None,
+                              sort_max_rows: int = 5000000, workers: int = 1, bloom_filter: bool = False,
+                              lookup_cache_size: int = 0) -> None:
         """
         Creates a mapping table between OMIDs and OpenAlex IDs. The entities in OC Meta that do not align to one single
         entity in OpenAlex (multi-mapped OMIDs) are saved in a separate directory.
@@ -463,8 +2483,77 @@ class Mapping:
             'id' field) otherwise it will not (use for IDs from the OC Meta 'venue' field)
         :param all_rows: bool flag to specify whether all entities should be processed (True) or only those that do not
             already have an OpenAlex ID associated with them.
+        :param output_format: the format of the mapping tables and of the tables of non-mapped entities, one among 'csv'
+            (default), 'parquet', 'csv.gz', 'csv.zst' and 'csv.lz4' (see utils.get_writer_options()). The table of
+            multi-mapped OMIDs is always a single plain CSV file.
+        :param incremental: if True, only the OMIDs that are new or whose row changed since the previous incremental run
+            on the same out_dir are looked up in the database, while the output rows of all the other OMIDs are carried
+            forward from the output of the previous run. The rows are compared by their fingerprints (see
+            row_fingerprint()), persisted in a database in out_dir (see FINGERPRINT_INDEX_FILE). The output of OMIDs
+            no longer in inp_dir is dropped. The fingerprints of all the input rows are computed in a first pass over
+            inp_dir and compared with the previous ones at once (see _diff_fingerprints()): the changed OMIDs are kept
+            in memory. Since the OpenAlex IDs of the unchanged OMIDs are not looked up again, a
+            full (non-incremental) run is needed when the database at db_path is rebuilt from a new OpenAlex dump.
+        :param batch_size: the number of fingerprints inserted at a time in the index (only used if incremental is True)
+            and of rows inserted at a time in the staging tables (only used if execution is 'sql')
+        :param lookup_batch_size: if greater than 0, the PIDs of this many rows are looked up in the database at once,
+            grouped by lookup table (see get_openalex_ids_batch()), instead of with one query per PID (default: 0).
+            The output is the same, and it is written in the same order. Only used if execution is 'python'.
+        :param execution: one among 'python' (default), to look up the PIDs of each row from Python, 'sql', to load all
+            the rows into temporary staging tables (see stage_rows()) and compute the mapping with a single set-based
+            query joining them to the lookup tables (see map_staged_rows()), and 'sort_merge', to compute the mapping
+            with an external sort-merge join of the rows and the OpenAlex tables in openalex_tables_dirs (see
+            sort_merge_rows()), without reading the database. The output is the same.
+        :param lookup_engine: either 'sqlite' (default), to look up the PIDs in the database, or 'mmap', to look them
+            up in a SortedPidIndex compiled from the database, with the same results. The index is built (again) if it
+            does not exist or the database file changed since it was built. Rows are always looked up in batches in
+            the index, of PID_INDEX_BATCH_SIZE rows unless lookup_batch_size is specified. Only used if execution is
+            'python'.
+        :param pid_index_dir: the directory storing the SortedPidIndex (default: the path of the database file without
+            its extension, followed by '_pid_index'). Only used if lookup_engine is 'mmap'.
+        :param openalex_tables_dirs: a dict mapping each OpenAlex entity type to the directory storing its tables
+            created with OpenAlexProcessor.create_openalex_ids_table() (not incremental), from which the database is
+            created, e.g. {'work': 'openalex_tables/works', 'source': 'openalex_tables/sources'}. Only used, and
+            required, if execution is 'sort_merge'.
+        :param sort_max_rows: the max number of rows sorted in memory by each external sort (only used if execution is
+            'sort_merge'). The sorted runs are stored in a temporary subdirectory of out_dir.
+        :param workers: the number of processes the tables in inp_dir are distributed over (default: 1). If greater than
+            1, each input table is mapped by a worker process opening the database as read-only (see
+            map_table_file()), and the multi-mapped OMIDs found by all the workers are merged into a single file. Only
+            supported with the 'python' execution mode and not incremental runs.
+        :param bloom_filter: if True, the PIDs certainly absent from a lookup table, according to its PidBloomFilter,
+            are not looked up, with the same output. The filters are read from PidBloomFilter.get_filter_dir(db_path)
+            and must be built beforehand (see OpenAlexProcessor.create_id_db_table()): tables without a filter, or
+            whose filter is out of date, are looked up as usual. The number of lookups skipped and the false positive
+            rate of the filters are logged at the end. Only supported with the 'python' execution mode.
+        :param lookup_cache_size: if greater than 0, the OpenAlex IDs of up to this many recently looked up PIDs (found
+            or not) are kept in an LRU cache (see utils.LRUCache), so that PIDs occurring in many rows, e.g. the ISSNs
+            of venues, are looked up in the database only once (default: 0, i.e. no cache). Each cached PID takes a
+            few hundred bytes; with multiple workers, each worker has its own cache. The hits, misses and evictions
+            of the cache are logged at the end. Only supported with the 'python' execution mode.
         :return: None
         """
+        if execution not in ('python', 'sql', 'sort_merge'):
+            raise ValueError("Execution must be one among 'python', 'sql' and 'sort_merge'.")
+        if execution == 'sort_merge' and not openalex_tables_dirs:
+            raise ValueError("The 'sort_merge' execution mode requires openalex_tables_dirs.")
+        if lookup_engine not in ('sqlite', 'mmap'):
+            raise ValueError("Lookup engine must be either 'sqlite' or 'mmap'.")
+        if workers > 1 and (execution != 'python' or incremental):
+            raise ValueError("Multiple workers are only supported with the 'python' execution mode and not incremental "
+                             "runs.")
+        if bloom_filter and execution != 'python':
+            raise ValueError("Bloom filters are only supported with the 'python' execution mode.")
+        if lookup_cache_size > 0 and execution != 'python':
+            raise ValueError("The lookup cache is only supported with the 'python' execution mode.")
+        if lookup_engine == 'mmap' and execution != 'python':
+            raise ValueError(f"The 'mmap' lookup engine cannot be used with the '{execution}' execution mode.")
+        pid_index = None
+        if lookup_engine == 'mmap':
+            pid_index_dir = Mapping._prepare_pid_index(db_path, pid_index_dir)
+            pid_index = SortedPidIndex(pid_index_dir)
+            # the index is searched with vectorised binary searches, which pay off on batches of PIDs
+            lookup_batch_size = lookup_batch_size if lookup_batch_size > 0 else Mapping.PID_INDEX_BATCH_SIZE
         makedirs(multi_mapped_dir, exist_ok=True)
         makedirs(out_dir, exist_ok=True)
         makedirs(non_mapped_dir, exist_ok=True)
@@ -474,77 +2563,193 @@ class Mapping:
         non_mappped_fieldnames = ['omid', 'type'] if type_field else ['omid']
         aligned_fieldnames = ['omid', 'openalex_id', 'type'] if type_field else ['omid', 'openalex_id']
 
+        index_path = join(out_dir, Mapping.FINGERPRINT_INDEX_FILE)
+        out_dirs = [out_dir, multi_mapped_dir, non_mapped_dir]
+        if incremental:
+            index = Mapping._open_fingerprint_index(index_path, {'type_field': type_field, 'all_rows': all_rows})
+            Mapping._stage_previous_output(index, out_dirs)
+        else:
+            index = None
+            if exists(index_path):  # fingerprints of a previous incremental run, not matching the new output
+                remove(index_path)
+
+        if workers > 1:
+            inputs = [(inp_dir, out_dir, multi_mapped_filepath, non_mapped_dir, 'type' if type_field else None, False)]
+            Mapping._map_tables_parallel(inputs, db_path, all_rows, output_format, lookup_batch_size,
+                                         pid_index_dir if pid_index is not None else None, workers, bloom_filter,
+                                         lookup_cache_size)
+            return
+
         with (
-            sql.connect(db_path) as conn,
+            # the database is not read by the sort-merge join
+            sql.connect(':memory:' if execution == 'sort_merge' else db_path) as conn,
+            ExitStack() as stack,
             open(multi_mapped_filepath, 'w', newline='') as multi_mapped,
-            MultiFileWriter(non_mapped_dir, fieldnames=non_mappped_fieldnames) as non_mapped_writer,
-            MultiFileWriter(out_dir, fieldnames=aligned_fieldnames) as writer
+            MultiFileWriter(non_mapped_dir, fieldnames=non_mappped_fieldnames, **get_writer_options(output_format)) as non_mapped_writer,
+            MultiFileWriter(out_dir, fieldnames=aligned_fieldnames, **get_writer_options(output_format)) as writer
         ):
 
             cursor = conn.cursor()
+            hashed_tables = {t: OpenAlexProcessor.has_pid_hash_key(conn, t) for t in Mapping.LOOKUP_TABLES}
+            bloom_filters = PidBloomFilter.load(conn, PidBloomFilter.get_filter_dir(db_path), Mapping.LOOKUP_TABLES) \
+                if bloom_filter else dict()
+            lookup_cache = LRUCache(lookup_cache_size) if lookup_cache_size > 0 else None
             multi_mapped_writer = DictWriter(multi_mapped, dialect='unix', fieldnames=multi_mapped_fieldnames)
             multi_mapped_writer.writeheader()
+            pending = []  # batch of (row, PIDs) tuples to be looked up at once, if lookup_batch_size > 0
+            staged_count = 0  # number of rows loaded into the staging tables, if execution is 'sql' or 'sort_merge'
+            if execution == 'sql':
+                Mapping._create_staging_tables(conn)
+            elif execution == 'sort_merge':
+                sort_dir = stack.enter_context(tempfile.TemporaryDirectory(prefix='sort_merge_', dir=out_dir))
+                staged_rows = stack.enter_context(open(join(sort_dir, 'rows.csv'), 'w+', encoding='utf-8', newline=''))
+                staged_writer = csv.writer(staged_rows, dialect='unix')
+                meta_pids = stack.enter_context(ExternalSorter(sort_dir, sort_max_rows))
+
+            def write_mapping(row, oa_ids):
+                Mapping._write_mapping(row, oa_ids, 'type' if type_field else None, writer, multi_mapped_writer,
+                                       non_mapped_writer)
+
+            def write_pending():
+                oa_ids_batch = Mapping.get_openalex_ids_batch(cursor, [ids for _, ids in pending], hashed_tables,
+                                                              pid_index, bloom_filters, lookup_cache)
+                for (row, _), oa_ids in zip(pending, oa_ids_batch):
+                    write_mapping(row, oa_ids)
+                pending.clear()
+
+            # with all_rows=False, rows of entities with an OpenAlex ID are skipped before being decoded
+            skip_id_prefix = ('ids', 'openalex:') if all_rows is False else None
+            # the OMIDs to map and those whose previous output is dropped (None: all of them), if incremental
+            to_map, stale = Mapping._diff_fingerprints(index, inp_dir, skip_id_prefix, batch_size) \
+                if index is not None else (None, None)
+            for row in read_csv_tables(inp_dir, skip_id_prefix=skip_id_prefix):
+                if to_map is not None and row['omid'] not in to_map:
+                    continue  # the output row is carried forward from the previous run
 
-            for row in read_csv_tables(inp_dir):
                 entity_ids: list = row['ids'].split()
-                oa_ids = set()
 
                 if any(x.startswith('openalex:') for x in entity_ids) and all_rows is False:
                     continue  # skip to next row
 
-                # if there is an ISSN for the entity in OC Meta, look only for ISSN in OpenAlex
-                if any(x.startswith('issn:') for x in entity_ids):
-                    for pid in entity_ids:
-                        if pid.startswith('issn'):
-                            query = "SELECT openalex_id FROM SourcesIssn WHERE supported_id=?"
-                            cursor.execute(query, (pid,))
-                            for res in cursor.fetchall():
-                                oa_ids.add(res[0])
-                        else:
-                            continue
-
-                # if there is a DOI for the entity in OC Meta and no ISSNs, look only for DOI in OpenAlex
-                elif any(x.startswith('doi:') for x in entity_ids):
-                    for pid in entity_ids:
-                        if pid.startswith('doi:'):
-                            query = "SELECT openalex_id FROM WorksDoi WHERE supported_id=?"
-                            cursor.execute(query, (pid,))
-                            for res in cursor.fetchall():
-                                oa_ids.add(res[0])
-                        else:
-                            continue
-
-                # if there is no ISSN nor DOI for the entity in OC Meta, look for all the other IDs in OpenAlex
+                if execution == 'sort_merge':
+                    rid = f'{staged_count:012d}'  # zero-padded, so that row numbers are sorted as strings
+                    staged_writer.writerow((rid, row['omid'], row.get('type') or ''))
+                    meta_pids.update((pid, rid) for _, pid in Mapping.select_lookup_pids(entity_ids))
+                    staged_count += 1
+                elif execution == 'sql':
+                    pending.append((row, entity_ids))
+                    if len(pending) >= batch_size:
+                        Mapping.stage_rows(conn, pending, staged_count, hashed_tables)
+                        staged_count += len(pending)
+                        pending.clear()
+                elif lookup_batch_size > 0:
+                    pending.append((row, entity_ids))
+                    if len(pending) >= lookup_batch_size:
+                        write_pending()
                 else:
-                    for pid in entity_ids:
-                        if pid.startswith('pmid:'):
-                            curr_lookup_table = 'WorksPmid'
-                        elif pid.startswith('pmcid:'):
-                            curr_lookup_table = 'WorksPmcid'
-                        elif pid.startswith('wikidata:'):
-                            curr_lookup_table = 'SourcesWikidata'
-                        else:
-                            # only PIDs for bibliographic resources supported by both OC Meta and OpenAlex are considered
-                            continue
-                        query = "SELECT openalex_id FROM {} WHERE supported_id=?".format(curr_lookup_table)
-                        cursor.execute(query, (pid,))
-                        for res in cursor.fetchall():
-                            oa_ids.add(res[0])
-
-                if oa_ids:
-                    if type_field:
-                        out_row = {'omid': row['omid'], 'openalex_id': ' '.join(oa_ids),
-                                   'type': row['type']}
-                    else:
-                        out_row = {'omid': row['omid'], 'openalex_id': ' '.join(oa_ids)}
-
-                    if len(oa_ids) > 1:
-                        # multi-mapped OMID
-                        multi_mapped_writer.writerow(out_row)
-                    else:
-                        writer.write_row(out_row)
-                else:
-                    if type_field:
-                        non_mapped_writer.write_row({'omid': row['omid'], 'type': row['type']})
-                    else:
-                        non_mapped_writer.write_row({'omid': row['omid']})
+                    write_mapping(row, Mapping.get_openalex_ids(cursor, entity_ids, hashed_tables, bloom_filters,
+                                                                lookup_cache))
+
+            if execution == 'sql':
+                Mapping.stage_rows(conn, pending, staged_count, hashed_tables)
+                for omid, res_type, oa_ids in Mapping.map_staged_rows(conn, hashed_tables):
+                    write_mapping({'omid': omid, 'type': res_type}, oa_ids)
+                Mapping._drop_staging_tables(conn)
+            elif execution == 'sort_merge':
+                staged_rows.seek(0)
+                rows = csv.reader(staged_rows, dialect='unix')
+                for omid, res_type, oa_ids in Mapping.sort_merge_rows(rows, meta_pids, openalex_tables_dirs, sort_dir,
+                                                                      sort_max_rows):
+                    write_mapping({'omid': omid, 'type': res_type}, oa_ids)
+            else:
+                write_pending()
+                lookup_stats = PidBloomFilter.get_stats(bloom_filters)
+                if lookup_cache is not None:
+                    lookup_stats.update(lookup_cache.get_stats())
+                Mapping._log_lookup_stats(lookup_stats, bloom_filter, lookup_cache_size)
+
+            if stale is not None:
+                # carry forward the output rows of the unchanged OMIDs
+                for d, write in ((out_dir, writer.write_row), (multi_mapped_dir, multi_mapped_writer.writerow),
+                                 (non_mapped_dir, non_mapped_writer.write_row)):
+                    for row in read_csv_tables(join(d, Mapping.PREVIOUS_OUTPUT_DIR)):
+                        if row['omid'] not in stale:
+                            write(row)
+
+        if index is not None:
+            # the fingerprints of this run replace those of the previous one in a single transaction
+            index.commit()
+            index.execute('BEGIN')
+            index.execute('DROP TABLE Fingerprints')
+            index.execute('ALTER TABLE NewFingerprints RENAME TO Fingerprints')
+            index.execute("INSERT OR REPLACE INTO RunInfo VALUES ('settings', ?)",
+                          (json.dumps({'type_field': type_field, 'all_rows': all_rows}),))
+            index.execute("INSERT OR REPLACE INTO RunInfo VALUES ('status', 'done')")
+            index.commit()
+            index.close()
+            for d in out_dirs:
+                shutil.rmtree(join(d, Mapping.PREVIOUS_OUTPUT_DIR))
+
+    @staticmethod
+    def map_meta_tables(meta_ids_out: str, db_path: str, out_dir: str, tables: Union[list, None] = None,
+                        all_rows: bool = True, output_format: TableFormat = 'csv', lookup_batch_size: int = 0,
+                        lookup_engine: Literal['sqlite', 'mmap'] = 'sqlite', pid_index_dir: Union[str, None] = None,
+                        workers: int = 1, bloom_filter: bool = False, lookup_cache_size: int = 0) -> None:
+        """
+        Maps the OMIDs of several reduced OC Meta tables created by MetaProcessor.preprocess_meta_tables() to OpenAlex
+        IDs in a single stage: the primary entities ('primary_ents', whose PIDs are looked up as in
+        map_omid_openalex_ids()), the venues ('venues', likewise) and the responsible agents ('resp_ags', whose ORCIDs
+        and RORs are looked up in the tables of RA_LOOKUP_TABLES that exist in the database, see
+        select_ra_lookup_pids()). The input tables of all of them are distributed over a single pool of worker
+        processes opening the database as read-only (see map_table_file()), so that the tables are mapped concurrently
+        rather than one after the other. The output of each table is written to a subdirectory of out_dir named after
+        it, storing the 'mapped', 'multi_mapped' and 'non_mapped' directories of map_omid_openalex_ids(). The output
+        rows store the type of the primary entities and the role of the responsible agents (see META_TABLE_FIELDS).
+        :param meta_ids_out: the directory storing the reduced OC Meta tables, each in a subdirectory named after it
+        :param db_path: the path to the database file
+        :param out_dir: the directory where the output of each table is written
+        :param tables: the reduced tables to map, among 'primary_ents', 'venues' and 'resp_ags' (default: None, i.e.
+            all the tables in meta_ids_out)
+        :param all_rows: see map_omid_openalex_ids()
+        :param output_format: see map_omid_openalex_ids()
+        :param lookup_batch_size: see map_omid_openalex_ids()
+        :param lookup_engine: see map_omid_openalex_ids()
+        :param pid_index_dir: see map_omid_openalex_ids()
+        :param workers: the number of worker processes (default: 1, i.e. the tables are mapped in the current process)
+        :param bloom_filter: see map_omid_openalex_ids()
+        :param lookup_cache_size: see map_omid_openalex_ids(). Each worker has its own cache.
+        :return: None
+        """
+        if tables is None:
+            tables = [t for t in Mapping.META_TABLE_FIELDS if isdir(join(meta_ids_out, t))]
+        unknown_tables = [t for t in tables if t not in Mapping.META_TABLE_FIELDS]
+        if unknown_tables:
+            raise ValueError(f"Unknown tables {unknown_tables}. Supported tables: 'primary_ents', 'venues', 'resp_ags'")
+        if lookup_engine not in ('sqlite', 'mmap'):
+            raise ValueError("Lookup engine must be either 'sqlite' or 'mmap'.")
+        if lookup_engine == 'mmap':
+            pid_index_dir = Mapping._prepare_pid_index(db_path, pid_index_dir)
+            lookup_batch_size = lookup_batch_size if lookup_batch_size > 0 else Mapping.PID_INDEX_BATCH_SIZE
+        else:
+            pid_index_dir = None
+        if 'resp_ags' in tables:
+            with closing(Mapping.open_read_only_db(db_path)) as conn:
+                ra_lookup_tables = Mapping.get_ra_lookup_tables(conn)
+            missing_tables = [t for t in Mapping.RA_LOOKUP_TABLES if t not in ra_lookup_tables]
+            if not ra_lookup_tables:
+                logging.warning(f'None of the tables {missing_tables} exists in {db_path}: '
+                                f'all the responsible agents are written as non-mapped')
+            elif missing_tables:
+                logging.warning(f'The tables {missing_tables} do not exist in {db_path}: '
+                                f'the PIDs of responsible agents are not looked up in them')
+
+        inputs = []
+        for table in tables:
+            mapped_dir, multi_mapped_dir, non_mapped_dir = [join(out_dir, table, d)
+                                                            for d in ('mapped', 'multi_mapped', 'non_mapped')]
+            for d in (mapped_dir, multi_mapped_dir, non_mapped_dir):
+                makedirs(d, exist_ok=True)
+            inputs.append((join(meta_ids_out, table), mapped_dir, join(multi_mapped_dir, 'multi_mapped_omids.csv'),
+                           non_mapped_dir, Mapping.META_TABLE_FIELDS[table], table == 'resp_ags'))
+        Mapping._map_tables_parallel(inputs, db_path, all_rows, output_format, lookup_batch_size, pid_index_dir,
+                                     workers, bloom_filter, lookup_cache_size)
@@ -1,54 +1,454 @@
 import csv
-from os import makedirs, listdir
-from os.path import join, isdir
+from os import makedirs, listdir, remove, walk, fsync
+from os.path import join, isdir, exists, relpath
 from csv import DictWriter
 from tqdm import tqdm
 import pandas as pd
 import json
+import gzip
+import shutil
+import subprocess
+import logging
+import re
+import heapq
+import tempfile
+from contextlib import ExitStack
+from collections import OrderedDict
 
+try:
+    from isal import igzip
+except ImportError:
+    igzip = None
 
-def read_csv_tables(*dirs, use_pandas=False):
+try:
+    from zlib_ng import gzip_ng
+except ImportError:
+    gzip_ng = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+DECOMPRESSION_BACKENDS = ('isal', 'zlib-ng', 'pigz', 'gzip')  # in order of preference for the 'auto' backend
+COMPRESSION_EXTENSIONS = {'gzip': 'gz', 'zstd': 'zst', 'lz4': 'lz4'}
+DEFAULT_COMPRESSION_LEVELS = {'gzip': 6, 'zstd': 3, 'lz4': 0}
+TABLE_FORMATS = ('csv', 'parquet') + tuple(f'csv.{ext}' for ext in COMPRESSION_EXTENSIONS.values())
+TABLE_FILE_EXTENSIONS = tuple(f'.{f}' for f in TABLE_FORMATS)
+JSON_FILE_EXTENSIONS = ('.json',) + tuple(f'.json.{ext}' for ext in COMPRESSION_EXTENSIONS.values())
+DICTIONARY_COLUMNS = ('type', 'ra_role')  # low-cardinality columns, dictionary-encoded in Parquet tables
+
+
+class _PipeReader:
+    """
+    A file-like object reading the standard output of an external decompression command (e.g. 'pigz -dc <file>').
+    An error is raised on closing if the command failed before its output was read entirely.
+    """
+    def __init__(self, args):
+        self.process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.stdout = self.process.stdout
+        self.eof = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __iter__(self):
+        yield from self.stdout
+        self.eof = True
+
+    def read(self, size=-1):
+        data = self.stdout.read(size)
+        self.eof = self.eof or not data and size != 0
+        return data
+
+    def readline(self, size=-1):
+        line = self.stdout.readline(size)
+        self.eof = self.eof or not line and size != 0
+        return line
+
+    def close(self):
+        self.stdout.close()
+        if not self.eof:
+            self.process.terminate()  # the output was not read entirely: the command is interrupted on purpose
+        returncode = self.process.wait()
+        stderr = self.process.stderr.read().decode(errors='replace')
+        self.process.stderr.close()
+        if self.eof and returncode != 0:
+            raise OSError(f'{self.process.args[0]} exited with code {returncode}: {stderr.strip()}')
+
+
+def get_decompression_backend(backend='auto'):
+    """
+    Resolves the name of the backend used to decompress gzip files, checking that it is available.
+
+    :param backend: One among 'auto', 'isal', 'zlib-ng', 'pigz' and 'gzip' (default: 'auto'). 'isal' and 'zlib-ng'
+        require the isal and zlib-ng packages respectively, 'pigz' requires the pigz executable to be in the PATH,
+        'gzip' is the standard library's module. 'auto' selects the first available backend in this order.
+    :return: The name of an available backend. If the requested backend is not available, 'gzip' is returned.
+    """
+    available = {
+        'isal': igzip is not None,
+        'zlib-ng': gzip_ng is not None,
+        'pigz': shutil.which('pigz') is not None,
+        'gzip': True,
+    }
+    if backend == 'auto':
+        return next(b for b in DECOMPRESSION_BACKENDS if available[b])
+    if backend not in available:
+        raise ValueError(f"Decompression backend must be one of {', '.join(('auto',) + DECOMPRESSION_BACKENDS)}.")
+    if not available[backend]:
+        logging.warning(f'The {backend} decompression backend is not available: falling back to gzip.')
+        return 'gzip'
+    return backend
+
+
+def open_gzip(file_path, backend='auto'):
+    """
+    Opens a gzip-compressed file for reading in binary mode, decompressing it with the specified backend.
+
+    :param file_path: The path to the .gz file.
+    :param backend: The decompression backend (see get_decompression_backend()).
+    :return: A binary file-like object, usable as a context manager and iterable line by line.
+    """
+    backend = get_decompression_backend(backend)
+    if backend == 'isal':
+        return igzip.open(file_path, 'rb')
+    elif backend == 'zlib-ng':
+        return gzip_ng.open(file_path, 'rb')
+    elif backend == 'pigz':
+        return _PipeReader(['pigz', '-dc', file_path])
+    return gzip.open(file_path, 'rb')
+
+
+def get_compression(compression):
+    """
+    Resolves the name of the codec used to compress the files written by MultiFileWriter, checking that it is available.
+
+    :param compression: One among None (no compression), 'gzip', 'zstd' and 'lz4'. 'zstd' and 'lz4' require the
+        zstandard and lz4 packages respectively.
+    :return: The name of an available codec, or None. If the requested codec is not available, 'gzip' is returned.
+    """
+    if compression is None:
+        return None
+    available = {
+        'gzip': True,
+        'zstd': zstandard is not None,
+        'lz4': lz4_frame is not None,
+    }
+    if compression not in available:
+        raise ValueError(f"Compression must be one of {', '.join(COMPRESSION_EXTENSIONS)} (or None).")
+    if not available[compression]:
+        logging.warning(f'The {compression} compression is not available: falling back to gzip.')
+        return 'gzip'
+    return compression
+
+
+def get_file_compression(file_path):
     """
-    Reads the output CSV non-compressed tables from one or more directories and yields either rows
-    as dictionaries (default) or entire pandas DataFrames, depending on the `use_pandas` parameter.
+    Infers the codec a file is compressed with from its extension (e.g. '0.csv.zst').
+
+    :param file_path: The path to the file.
+    :return: One among 'gzip', 'zstd' and 'lz4', or None if the file is not compressed.
+    """
+    return next((c for c, ext in COMPRESSION_EXTENSIONS.items() if file_path.endswith(f'.{ext}')), None)
+
+
+def open_compressed(file_path, mode='rb', compression='auto', level=None, encoding=None, newline=None):
+    """
+    Opens a file that is possibly compressed with gzip, zstd or lz4, with the same interface as the built-in open().
+    gzip files are decompressed with the fastest available backend (see get_decompression_backend(); pigz is not
+    used, since it only provides binary streams).
+
+    :param file_path: The path to the file.
+    :param mode: The mode the file is opened in, e.g. 'rb', 'rt', 'wt' (default: 'rb').
+    :param compression: The codec of the file: 'auto' (default) infers it from the file extension (see
+        get_file_compression()), None opens the file as a plain file.
+    :param level: The compression level, only used when writing (default: the codec's value in
+        DEFAULT_COMPRESSION_LEVELS).
+    :param encoding: The encoding of the file, only used in text mode.
+    :param newline: The newline mode of the file, only used in text mode.
+    :return: A file-like object, usable as a context manager.
+    """
+    if compression == 'auto':
+        compression = get_file_compression(file_path)
+    if compression is None:
+        return open(file_path, mode, encoding=encoding, newline=newline)
+    if compression not in COMPRESSION_EXTENSIONS:
+        raise ValueError(f"Compression must be one of auto, {', '.join(COMPRESSION_EXTENSIONS)} (or None).")
+
+    text_kwargs = {'encoding': encoding, 'newline': newline} if 't' in mode else dict()
+    if level is None:
+        level = DEFAULT_COMPRESSION_LEVELS[compression]
+    reading = mode.startswith('r')
+    if compression == 'gzip':
+        if reading:
+            module = igzip or gzip_ng or gzip
+            return module.open(file_path, mode, **text_kwargs)
+        # isal only supports levels 0-3, so zlib-ng (or the standard library) is used for writing
+        return (gzip_ng or gzip).open(file_path, mode, compresslevel=level, **text_kwargs)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ImportError(f'Reading or writing the zstd-compressed file {file_path} requires the zstandard '
+                              f'package.')
+        if reading:
+            return zstandard.open(file_path, mode, **text_kwargs)
+        return zstandard.open(file_path, mode, cctx=zstandard.ZstdCompressor(level=level), **text_kwargs)
+    if lz4_frame is None:
+        raise ImportError(f'Reading or writing the lz4-compressed file {file_path} requires the lz4 package.')
+    if reading:
+        return lz4_frame.open(file_path, mode, **text_kwargs)
+    return lz4_frame.open(file_path, mode, compression_level=level, **text_kwargs)
+
+
+def get_writer_options(output_format='csv'):
+    """
+    Returns the keyword arguments to pass to MultiFileWriter (or SchemeRoutingWriter) for writing tables in the
+    specified format. Parquet tables are written in larger files, each split into several row groups. If pyarrow is not
+    installed, a warning is logged and CSV tables are written instead. Compressed CSV tables ('csv.gz', 'csv.zst' and
+    'csv.lz4') are written with the default level of the codec (see open_compressed()).
+
+    :param output_format: One among 'csv' (default), 'parquet', 'csv.gz', 'csv.zst' and 'csv.lz4'.
+    :return: A dict of keyword arguments for MultiFileWriter.
+    """
+    if output_format not in TABLE_FORMATS:
+        raise ValueError(f"Unknown output format '{output_format}'. Supported formats: {', '.join(TABLE_FORMATS)}")
+    if output_format == 'parquet':
+        if pq is None:
+            logging.warning("Output format 'parquet' requires the pyarrow package, which is not installed: "
+                            "writing CSV tables instead.")
+            return dict()
+        return {'file_extension': 'parquet', 'nrows': 1000000, 'row_group_size': 100000}
+    if output_format != 'csv':
+        return {'compression': get_file_compression(output_format)}
+    return dict()
+
+
+def list_table_files(directory):
+    """
+    Lists the paths to the CSV (possibly compressed) and Parquet tables stored in a directory (subdirectories are not
+    considered).
+
+    :param directory: The path to the directory.
+    :return: The list of the paths to the table files in the directory.
+    """
+    return [join(directory, file) for file in listdir(directory) if file.endswith(TABLE_FILE_EXTENSIONS)]
+
+
+def remove_table_files(directory):
+    """
+    Deletes the CSV (possibly compressed) and Parquet tables stored in a directory or in any of its subdirectories,
+    e.g. the output of a previous run, whose files might be named differently from those written again (see
+    MultiFileWriter's file_prefix) and would be kept alongside them.
+
+    :param directory: The path to the directory (nothing is done if it does not exist).
+    :return: The number of deleted files.
+    """
+    deleted = 0
+    if not isdir(directory):
+        return deleted
+    for root, dirs, files in walk(directory):
+        for file in files:
+            if file.endswith(TABLE_FILE_EXTENSIONS):
+                remove(join(root, file))
+                deleted += 1
+    return deleted
+
+
+def iter_csv_records(lines):
+    """
+    Groups the raw lines of a CSV file into records, joining the lines of the records with quoted fields spanning
+    multiple lines. A record is complete when it stores an even number of quote characters, since quotes inside quoted
+    fields are escaped by doubling them (the quote byte never occurs inside multibyte UTF-8 characters).
+
+    :param lines: An iterable of the raw lines (bytes) of a CSV file, e.g. the file opened in binary mode.
+    :return: Yields the raw records (bytes), each ending with its line terminator.
+    """
+    buffer = []
+    quotes = 0
+    for line in lines:
+        buffer.append(line)
+        quotes += line.count(b'"')
+        if quotes % 2:  # the record continues on the next line, inside a quoted field
+            continue
+        yield buffer[0] if len(buffer) == 1 else b''.join(buffer)
+        buffer = []
+        quotes = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def get_csv_field(record, index):
+    """
+    Extracts the value of a field from a raw CSV record without decoding the whole record.
+
+    :param record: The raw record (bytes), as yielded by iter_csv_records().
+    :param index: The position of the field in the record.
+    :return: The raw value of the field (bytes), unquoted, or None if the record has fewer fields.
+    """
+    pos = 0
+    for i in range(index + 1):
+        if record[pos:pos + 1] == b'"':
+            end = pos + 1
+            while True:  # skip the escaped quotes ('""') inside the field
+                end = record.find(b'"', end)
+                if end < 0 or record[end + 1:end + 2] != b'"':
+                    break
+                end += 2
+            if end < 0:
+                return None
+            value = record[pos + 1:end].replace(b'""', b'"')
+            end += 1  # the position of the delimiter after the closing quote
+        else:
+            end = record.find(b',', pos)
+            value = record[pos:end if end >= 0 else len(record)].rstrip(b'\r\n')
+        if i == index:
+            return value
+        if end < 0 or record[end:end + 1] != b',':  # last field of the record
+            return None
+        pos = end + 1
+
+
+def skip_records_with_id_prefix(lines, field, prefix):
+    """
+    Prefilters the raw lines of a CSV file with a header row, skipping the records where the value of a field is a
+    whitespace-separated list of IDs including one that starts with prefix (e.g. 'openalex:'). Records are tested on
+    their raw bytes, and only the value of the field is extracted from the records containing the prefix anywhere
+    (see get_csv_field()), so that the skipped records are never decoded nor parsed by the csv module.
+
+    :param lines: An iterable of the raw lines (bytes) of a CSV file.
+    :param field: The name of the field storing the IDs (e.g. 'id').
+    :param prefix: The prefix of the IDs of the records to skip (e.g. 'openalex:').
+    :return: Yields the decoded records (str) that are kept, starting with the header, ready to be parsed by a csv
+        reader.
+    """
+    records = iter_csv_records(lines)
+    header = next(records, None)
+    if header is None:
+        return
+    header = header.decode('utf-8')
+    index = next(csv.reader([header])).index(field)
+    yield header
+    prefix = prefix.encode('utf-8')
+    for record in records:
+        if prefix in record:
+            value = get_csv_field(record, index)
+            if value is not None and any(pid.startswith(prefix) for pid in value.split()):
+                continue
+        yield record.decode('utf-8')
+
+
+def read_table_file(file_path, use_pandas=False, skip_id_prefix=None):
+    """
+    Reads a single CSV or Parquet table and yields either its rows as dictionaries (default) or the whole table as a
+    pandas DataFrame, depending on the `use_pandas` parameter. Parquet tables are read one row group at a time when
+    rows are yielded as dictionaries. CSV tables compressed with gzip, zstd or lz4 are decompressed while reading them,
+    the codec being inferred from the file extension (see open_compressed()).
+
+    :param file_path: The path to the CSV or Parquet file.
+    :param use_pandas: Optional parameter specifying whether to use pandas DataFrame (default is False).
+    :param skip_id_prefix: Optional tuple storing the name of a field and a prefix (e.g. ('ids', 'openalex:')): the
+        rows where the field stores an ID starting with the prefix are skipped. In CSV tables, they are skipped on
+        the raw bytes of the lines, before decoding them (see skip_records_with_id_prefix()). Only used if use_pandas is
+        False.
+    :return: Yields rows as dictionaries or a single pandas DataFrame.
+    """
+    if file_path.endswith('.parquet'):
+        if pq is None:
+            raise ImportError(f'Reading the Parquet table {file_path} requires the pyarrow package.')
+        if use_pandas:
+            yield pd.read_parquet(file_path)
+        else:
+            parquet_file = pq.ParquetFile(file_path)
+            for i in range(parquet_file.num_row_groups):
+                for row in parquet_file.read_row_group(i).to_pylist():
+                    if skip_id_prefix and any(pid.startswith(skip_id_prefix[1])
+                                              for pid in (row[skip_id_prefix[0]] or '').split()):
+                        continue
+                    yield row
+        return
+
+    csv.field_size_limit(131072 * 12)  # increase the default field size limit
+    if use_pandas:
+        with open_compressed(file_path, 'rb') as f:
+            df = pd.read_csv(f, encoding='utf-8')
+        yield df
+    elif skip_id_prefix:
+        with open_compressed(file_path, 'rb') as f:
+            yield from csv.DictReader(skip_records_with_id_prefix(f, *skip_id_prefix), dialect='unix')
+    else:
+        with open_compressed(file_path, 'rt', encoding='utf-8') as f:
+            reader = csv.DictReader(f, dialect='unix')
+            for row in reader:
+                yield row
+
+
+def read_csv_tables(*dirs, use_pandas=False, skip_id_prefix=None):
+    """
+    Reads the output CSV tables (plain or compressed) and Parquet tables (see read_table_file()) from one or more
+    directories and yields either rows as dictionaries (default) or entire pandas DataFrames, depending on the
+    `use_pandas` parameter.
 
     :param dirs: One or more directories to read files from, provided as variable-length arguments.
     :param use_pandas: Optional parameter specifying whether to use pandas DataFrame (default is False).
+    :param skip_id_prefix: Optional tuple storing the name of a field and an ID prefix, to skip the rows where the field
+        stores an ID with that prefix (see read_table_file()).
     :return: Yields rows as dictionaries or entire pandas DataFrames from all CSV files in the specified directories.
     """
-    csv.field_size_limit(131072 * 12)  # increase the default field size limit
     for directory in dirs:
         if isdir(directory):
-            files = [file for file in listdir(directory) if file.endswith('.csv')]
-            for file in tqdm(files, desc=f"Processing {directory}", unit="file"):
-                file_path = join(directory, file)
-                if use_pandas:
-                    df = pd.read_csv(file_path, encoding='utf-8')
-                    yield df
-                else:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        reader = csv.DictReader(f, dialect='unix')
-                        for row in reader:
-                            yield row
+            files = list_table_files(directory)
+            for file_path in tqdm(files, desc=f"Processing {directory}", unit="file"):
+                yield from read_table_file(file_path, use_pandas, skip_id_prefix)
         else:
             raise ValueError("Each argument must be a string representing the path to an existing directory.")
 
 
 class MultiFileWriter:
     """
-    A context manager for writing rows to CSV files with automatic file splitting.
+    A context manager for writing rows to CSV, JSON-Lines or Parquet files with automatic file splitting.
 
     :param out_dir: The directory for storing CSV files.
     :param max_rows_per_file: Max rows before creating a new file (default: 10,000).
     :type max_rows_per_file: int, optional
     :param fieldnames: Field names for the CSV file.
     :type fieldnames: List[str]
-    :param file_extension: File extension for the CSV files (default: 'csv').
+    :param file_extension: File extension for the output files (default: 'csv'). One among 'csv', 'json' (JSON-Lines)
+        and 'parquet' (requires pyarrow and fieldnames). In Parquet files, all the columns are stored as strings and
+        the columns in DICTIONARY_COLUMNS are dictionary-encoded.
     :type file_extension: str, optional
+    :param row_group_size: Number of rows buffered and written as a row group of a Parquet file (default: 10,000).
+    :type row_group_size: int, optional
     :param encoding: Encoding for writing CSV files (default: 'utf-8').
     :type encoding: str, optional
     :param dialect: CSV dialect to use (default: 'unix').
     :type dialect: str, optional
+    :param file_prefix: String prepended to the progressive number in the name of each file (default: ''). Allows
+        several writers (e.g. one per worker process) to write to the same directory without overwriting each other.
+    :type file_prefix: str, optional
+    :param compression: Codec used to compress the CSV and JSON-Lines files, one among 'gzip', 'zstd' and 'lz4'
+        (default: None, no compression). The codec extension is appended to the name of each file (e.g. '0.csv.zst').
+        If the codec is not available, a warning is logged and gzip is used instead (see get_compression()), with
+        its default level. For
+        Parquet files, the codec is passed to pyarrow and the file extension is not changed.
+    :type compression: str, optional
+    :param compression_level: Compression level (default: the codec's value in DEFAULT_COMPRESSION_LEVELS for CSV and
+        JSON-Lines files, pyarrow's default for Parquet files).
+    :type compression_level: int, optional
 
     Example::
 
@@ -62,9 +462,18 @@ class MultiFileWriter:
         self.out_dir = out_dir
         self.max_rows_per_file = nrows  # maximum number of rows per file
         self.file_name = 0
+        self.files_written = []  # paths to all the files opened by the writer
         self.rows_written = 0
         self.current_file = None
         self.kwargs = kwargs
+        self.compression_level = kwargs.get('compression_level')
+        if kwargs.get('file_extension') != 'parquet':
+            self.compression = get_compression(kwargs.get('compression'))
+            if self.compression != kwargs.get('compression'):
+                # the level of the requested codec might be out of the range of the fallback one
+                self.compression_level = None
+        else:
+            self.compression = kwargs.get('compression')  # resolved by pyarrow
         makedirs(out_dir, exist_ok=True)
         csv.field_size_limit(131072 * 12)  # increase the default field size limit
 
@@ -76,12 +485,21 @@ class MultiFileWriter:
         self.close()
 
     def _open_new_file(self):
-        if self.current_file:
-            self.current_file.close()
+        self._close_current_file()
         file_extension = self.kwargs.get('file_extension', 'csv')
-        file_path = join(self.out_dir, f'{self.file_name}.{file_extension}')
+        file_prefix = self.kwargs.get('file_prefix', '')
+        file_path = join(self.out_dir, f'{file_prefix}{self.file_name}.{file_extension}')
+        if self.compression and file_extension != 'parquet':
+            file_path += f'.{COMPRESSION_EXTENSIONS[self.compression]}'
+        self.files_written.append(file_path)
+
+        if file_extension == 'parquet':
+            self._open_parquet_file(file_path)
+            return
+
         encoding = self.kwargs.get('encoding', 'utf-8')
-        self.current_file = open(file_path, 'w', encoding=encoding, newline='')
+        self.current_file = open_compressed(file_path, 'wt', self.compression, self.compression_level,
+                                            encoding=encoding, newline='')
 
         if file_extension == 'csv':
             fieldnames = self.kwargs.get('fieldnames', None)
@@ -92,7 +510,46 @@ class MultiFileWriter:
         elif file_extension == 'json':
             self.write_line = self._write_jsonl_row
         else:
-            raise ValueError("File extension must be either 'csv' or 'json'.")
+            raise ValueError("File extension must be one among 'csv', 'json' and 'parquet'.")
+
+    def _open_parquet_file(self, file_path):
+        if pq is None:
+            raise ImportError("Writing Parquet files requires the pyarrow package.")
+        fieldnames = self.kwargs.get('fieldnames', None)
+        if not fieldnames:
+            raise ValueError("Field names must be specified for writing Parquet files.")
+        self.schema = pa.schema([
+            (f, pa.dictionary(pa.int32(), pa.string()) if f in DICTIONARY_COLUMNS else pa.string()) for f in fieldnames
+        ])
+        self.row_group = []
+        self.current_file = pq.ParquetWriter(file_path, self.schema, compression=self.compression or 'snappy',
+                                             compression_level=self.compression_level)
+        self.write_line = self._write_parquet_row
+
+    def _write_parquet_row(self, row):
+        self.row_group.append(row)
+        if len(self.row_group) >= self.kwargs.get('row_group_size', 10000):
+            self._flush_row_group()
+
+    def _flush_row_group(self):
+        if not self.row_group:
+            return
+        columns = []
+        for field in self.schema:
+            # values are stored as strings, as they would be in a CSV file
+            values = [row.get(field.name, '') for row in self.row_group]
+            values = [v if v is None or isinstance(v, str) else str(v) for v in values]
+            columns.append(pa.array(values, type=pa.string()).dictionary_encode()
+                           if pa.types.is_dictionary(field.type) else pa.array(values, type=pa.string()))
+        self.current_file.write_table(pa.Table.from_arrays(columns, schema=self.schema))
+        self.row_group = []
+
+    def _close_current_file(self):
+        if self.current_file:
+            if self.kwargs.get('file_extension') == 'parquet':
+                self._flush_row_group()
+            self.current_file.close()
+            self.current_file = None
 
     def _write_csv_row(self, row):
         self.writer.writerow(row)
@@ -110,5 +567,351 @@ class MultiFileWriter:
             self._open_new_file()
 
     def close(self):
-        if self.current_file:
-            self.current_file.close()
+        self._close_current_file()
+
+
+class SchemeRoutingWriter:
+    """
+    A context manager routing rows to a separate MultiFileWriter for each PID scheme, so that rows storing PIDs of
+    different schemes (e.g. 'doi:10.1234/abc', 'pmid:123') are written to different subdirectories of out_dir, named
+    after the scheme (e.g. 'doi', 'pmid'). The writer for a scheme is created the first time a PID of that scheme is met.
+
+    :param out_dir: The directory storing the subdirectories for each scheme.
+    :param key: The field of the rows storing the prefixed PID (default: 'supported_id').
+    :type key: str, optional
+    :param nrows: Max rows before creating a new file in the directory of a scheme (default: 10,000).
+    :type nrows: int, optional
+    :param kwargs: Any other keyword argument accepted by MultiFileWriter (e.g. fieldnames, file_prefix).
+
+    Example::
+
+        with SchemeRoutingWriter('openalex_tables/works', fieldnames=['supported_id', 'openalex_id']) as writer:
+            writer.write_row({'supported_id': 'doi:10.1234/abc', 'openalex_id': 'W123'})  # -> openalex_tables/works/doi
+            writer.write_row({'supported_id': 'pmid:456', 'openalex_id': 'W123'})  # -> openalex_tables/works/pmid
+    """
+    def __init__(self, out_dir, key='supported_id', nrows=10000, **kwargs):
+        self.out_dir = out_dir
+        self.key = key
+        self.nrows = nrows
+        self.kwargs = kwargs
+        self.writers = dict()
+        makedirs(out_dir, exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write_row(self, row):
+        scheme = row[self.key].split(':', 1)[0]
+        writer = self.writers.get(scheme)
+        if writer is None:
+            writer = MultiFileWriter(join(self.out_dir, scheme), self.nrows, **self.kwargs)
+            writer.__enter__()
+            self.writers[scheme] = writer
+        writer.write_row(row)
+
+    @property
+    def files_written(self):
+        return [f for writer in self.writers.values() for f in writer.files_written]
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+
+
+class CheckpointJournal:
+    """
+    A journal recording, in a JSON-Lines file, each input file whose processing has been completed, together with the
+    output files produced from it. It allows a long-running process to be resumed after a crash, skipping the input
+    files already completed and discarding the output files written for the input files that were not.
+
+    :param journal_path: The path to the JSON-Lines file storing the journal.
+    :param resume: If True, the entries of an existing journal are loaded; otherwise, the journal is started anew
+        (default: False).
+    :type resume: bool, optional
+
+    Example::
+
+        journal = CheckpointJournal('out/checkpoint.jsonl', resume=True)
+        for input_file in input_files:
+            if journal.is_completed(input_file):
+                continue
+            CheckpointJournal.discard_partial_files('out', prefix_for(input_file))
+            output_files = process(input_file)
+            journal.record(input_file, output_files)
+    """
+    def __init__(self, journal_path, resume=False):
+        self.journal_path = journal_path
+        self.completed = dict()
+        if resume and exists(journal_path):
+            with open(journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:  # the last line may be truncated if the process crashed writing it
+                        continue
+                    self.completed[entry['input']] = entry['outputs']
+        elif exists(journal_path):
+            remove(journal_path)
+        elif resume:
+            logging.warning(f'No checkpoint journal found at {journal_path}: all the input files are processed again.')
+
+    def is_completed(self, input_file):
+        return input_file in self.completed
+
+    def record(self, input_file, output_files):
+        """
+        Records an input file as completed, together with the output files produced from it.
+
+        :param input_file: The name or path identifying the input file.
+        :param output_files: The list of the paths to the output files produced from the input file.
+        """
+        self.completed[input_file] = list(output_files)
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'input': input_file, 'outputs': list(output_files)}, ensure_ascii=False) + '\n')
+            f.flush()
+            fsync(f.fileno())
+
+    def discard_unrecorded_files(self, out_dir, base_dir):
+        """
+        Deletes the table files in out_dir or in any of its subdirectories that are not recorded as the output of a
+        completed input file, e.g. the files written by a previous run without a checkpoint, which would otherwise be
+        kept alongside the files written again for the same input files.
+
+        :param out_dir: The directory storing the output files.
+        :param base_dir: The directory the paths to the output files recorded in the journal are relative to.
+        :return: The number of deleted files.
+        """
+        recorded = {path for outputs in self.completed.values() for path in outputs}
+        deleted = 0
+        if not isdir(out_dir):
+            return deleted
+        for root, dirs, files in walk(out_dir):
+            for file in files:
+                path = join(root, file)
+                if file.endswith(TABLE_FILE_EXTENSIONS) and relpath(path, base_dir) not in recorded:
+                    remove(path)
+                    deleted += 1
+        if deleted:
+            logging.warning(f'Deleted {deleted} table files in {out_dir} not recorded in the checkpoint journal.')
+        return deleted
+
+    @staticmethod
+    def discard_partial_files(out_dir, file_prefix):
+        """
+        Deletes the files written by a MultiFileWriter with the specified file_prefix in out_dir or in any of its
+        subdirectories (e.g. the directories created by a SchemeRoutingWriter), i.e. the files named as the prefix
+        followed by a progressive number and the file extension.
+
+        :param out_dir: The directory storing the output files.
+        :param file_prefix: The prefix of the names of the output files to delete.
+        :return: The number of deleted files.
+        """
+        pattern = re.compile(re.escape(file_prefix) + r'\d+\.')
+        deleted = 0
+        if not isdir(out_dir):
+            return deleted
+        for root, dirs, files in walk(out_dir):
+            for file in files:
+                if pattern.match(file):
+                    remove(join(root, file))
+                    deleted += 1
+        return deleted
+
+
+class ExternalSorter:
+    """
+    A context manager sorting a stream of rows (tuples of strings) with bounded memory. Rows are collected in an
+    in-memory list; when the list reaches max_rows_in_memory rows, they are sorted and spilled to a run file in a
+    temporary directory. Iterating over the sorter yields all the rows in sorted order: if nothing was spilled, the rows
+    are sorted in memory, otherwise the sorted runs are combined with a k-way merge (in several passes if they are more
+    than MAX_MERGE_FAN_IN), so that the runs are only read and written sequentially. The temporary directory is deleted
+    on exit.
+
+    :param tmp_dir: The directory where the temporary directory storing the runs is created (default: the system's
+        temporary directory).
+    :type tmp_dir: str, optional
+    :param max_rows_in_memory: Max rows kept in memory before spilling them to disk (default: 5,000,000).
+    :type max_rows_in_memory: int, optional
+
+    Example::
+
+        with ExternalSorter('tmp', max_rows_in_memory=1000000) as sorter:
+            sorter.update((row['supported_id'], row['openalex_id']) for row in rows)
+            for pid, openalex_id in sorter:
+                ...
+    """
+    MAX_MERGE_FAN_IN = 256  # max number of runs merged at once, i.e. of files open at the same time
+    _RUN_DIR_PREFIX = 'sort_'
+
+    def __init__(self, tmp_dir=None, max_rows_in_memory=5000000):
+        self.tmp_dir = tmp_dir
+        self.max_rows_in_memory = max_rows_in_memory
+        self.buffer = []
+        self.runs = []
+        self._run_dir = None
+        self._run_count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add(self, row):
+        self.buffer.append(row)
+        if len(self.buffer) >= self.max_rows_in_memory:
+            self._spill_buffer()
+
+    def update(self, rows):
+        for row in rows:
+            self.add(row)
+
+    def _new_run_path(self):
+        if self._run_dir is None:
+            if self.tmp_dir:
+                makedirs(self.tmp_dir, exist_ok=True)
+            self._run_dir = tempfile.mkdtemp(prefix=self._RUN_DIR_PREFIX, dir=self.tmp_dir)
+        self._run_count += 1
+        return join(self._run_dir, f'{self._run_count}.csv')
+
+    def _spill(self, sorted_rows):
+        run_path = self._new_run_path()
+        with open(run_path, 'w', encoding='utf-8', newline='') as f:
+            csv.writer(f, dialect='unix').writerows(sorted_rows)
+        self.runs.append(run_path)
+
+    def _spill_buffer(self):
+        self._spill(sorted(self.buffer))
+        self.buffer.clear()
+
+    @staticmethod
+    def _read_run(f):
+        for row in csv.reader(f, dialect='unix'):
+            yield tuple(row)
+
+    def _merge_runs(self, run_paths):
+        csv.field_size_limit(131072 * 12)  # increase the default field size limit
+        with ExitStack() as stack:
+            readers = [self._read_run(stack.enter_context(open(p, 'r', encoding='utf-8', newline='')))
+                       for p in run_paths]
+            yield from heapq.merge(*readers)
+
+    def _iter_buffer(self):
+        return sorted(self.buffer)
+
+    def __iter__(self):
+        if not self.runs:
+            yield from self._iter_buffer()
+            return
+        if self.buffer:
+            self._spill_buffer()
+        while len(self.runs) > self.MAX_MERGE_FAN_IN:
+            to_merge, self.runs = self.runs[:self.MAX_MERGE_FAN_IN], self.runs[self.MAX_MERGE_FAN_IN:]
+            self._spill(self._merge_runs(to_merge))
+            for run_path in to_merge:
+                remove(run_path)
+        yield from self._merge_runs(self.runs)
+
+    def close(self):
+        self.buffer.clear()
+        self.runs = []
+        if self._run_dir and isdir(self._run_dir):
+            shutil.rmtree(self._run_dir)
+        self._run_dir = None
+
+
+class ExternalDeduplicator(ExternalSorter):
+    """
+    A context manager removing the duplicates from a stream of rows (tuples of strings) with bounded memory. Rows are
+    collected in an in-memory set; when the set reaches max_rows_in_memory rows, they are sorted and spilled to a run
+    file in a temporary directory. Iterating over the deduplicator yields each distinct row once: if nothing was spilled,
+    the rows are read from the set, otherwise the sorted runs are combined with a k-way merge (in several passes if
+    they are more than MAX_MERGE_FAN_IN), skipping consecutive equal rows. The temporary directory is deleted on exit.
+
+    :param tmp_dir: The directory where the temporary directory storing the runs is created (default: the system's
+        temporary directory).
+    :type tmp_dir: str, optional
+    :param max_rows_in_memory: Max rows kept in memory before spilling them to disk (default: 5,000,000).
+    :type max_rows_in_memory: int, optional
+
+    Example::
+
+        with ExternalDeduplicator('meta_ids', max_rows_in_memory=1000000) as dedup:
+            for row in rows:
+                dedup.add(tuple(row.values()))
+            for unique_row in dedup:
+                writer.write_row(dict(zip(fieldnames, unique_row)))
+    """
+    _RUN_DIR_PREFIX = 'dedup_'
+
+    def __init__(self, tmp_dir=None, max_rows_in_memory=5000000):
+        super().__init__(tmp_dir, max_rows_in_memory)
+        self.buffer = set()
+
+    def add(self, row):
+        self.buffer.add(row)
+        if len(self.buffer) >= self.max_rows_in_memory:
+            self._spill_buffer()
+
+    def _merge_runs(self, run_paths):
+        previous = None
+        for row in super()._merge_runs(run_paths):
+            if row != previous:
+                yield row
+                previous = row
+
+    def _iter_buffer(self):
+        return self.buffer
+
+
+class LRUCache:
+    """
+    A dict-like cache storing at most capacity items: when it is full, storing a new item evicts the least recently
+    used one. The hits, misses and evictions are counted, e.g. to be logged at the end of a process.
+
+    :param capacity: Max number of items stored.
+    :type capacity: int
+
+    Example::
+
+        cache = LRUCache(100000)
+        oa_ids = cache.get(pid)
+        if oa_ids is None:
+            oa_ids = lookup(pid)
+            cache.put(pid, oa_ids)
+    """
+
+    def __init__(self, capacity):
+        if capacity < 1:
+            raise ValueError('The capacity of the cache must be at least 1.')
+        self.capacity = capacity
+        self.items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def get(self, key, default=None):
+        try:
+            value = self.items[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.items[key] = value
+        self.items.move_to_end(key)
+        if len(self.items) > self.capacity:
+            self.items.popitem(last=False)
+            self.evictions += 1
+
+    def get_stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
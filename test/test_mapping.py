@@ -16,9 +16,13 @@
 import unittest
 import os
 from os.path import join, exists
-from oc_alignoa.mapping import Mapping
+from unittest import mock
+from oc_alignoa.mapping import Mapping, OpenAlexProcessor, SortedPidIndex, PidBloomFilter
 import shutil
 import csv
+import sqlite3
+from contextlib import closing
+from oc_alignoa.utils import read_csv_tables, LRUCache, ExternalSorter
 
 class TestMapping(unittest.TestCase):
 
@@ -78,6 +82,311 @@ class TestMapping(unittest.TestCase):
 
         self.assertFilesEqual(expected, actual_out_file)
 
+    def test_mapping_incremental(self):
+        root = self.actual_output_dir
+        db_path = join(root, 'test_db.db')
+        meta_dir = join(root, 'meta_ids')
+        out_dirs = [join(root, 'mapped'), join(root, 'multi_mapped'), join(root, 'non_mapped')]
+        os.makedirs(meta_dir, exist_ok=True)
+
+        def load_db(rows):
+            with closing(sqlite3.connect(db_path)) as conn, conn:
+                for table in Mapping.LOOKUP_TABLES:
+                    conn.execute(f'DROP TABLE IF EXISTS {table}')
+                    conn.execute(f'CREATE TABLE {table} (supported_id TEXT, openalex_id TEXT)')
+                conn.executemany('INSERT INTO WorksDoi VALUES (?, ?)', rows)
+
+        def write_meta(rows):
+            with open(join(meta_dir, '0.csv'), 'w', encoding='utf-8', newline='') as f:
+                f.write('omid,ids,type\n' + ''.join(f'{omid},{ids},{res_type}\n' for omid, ids, res_type in rows))
+
+        def run(incremental=True):
+            self.process.map_omid_openalex_ids(meta_dir, db_path, *out_dirs, incremental=incremental)
+            return [{(r['omid'], r.get('openalex_id'), r['type']) for r in read_csv_tables(d)} for d in out_dirs]
+
+        load_db([('doi:10.1/a', 'W1'), ('doi:10.1/b', 'W2'), ('doi:10.1/b', 'W3'), ('doi:10.1/c', 'W4')])
+        write_meta([('omid:br/1', 'doi:10.1/a', 'journal article'), ('omid:br/2', 'doi:10.1/b', 'book'),
+                    ('omid:br/3', 'doi:10.1/none', 'book'), ('omid:br/4', 'doi:10.1/c', 'book')])
+        mapped, multi_mapped, non_mapped = run()
+        self.assertEqual(mapped, {('omid:br/1', 'W1', 'journal article'), ('omid:br/4', 'W4', 'book')})
+        self.assertEqual({r[0] for r in multi_mapped}, {'omid:br/2'})
+        self.assertEqual(non_mapped, {('omid:br/3', None, 'book')})
+
+        # the lookup of omid:br/1 would now change, but its row is unchanged: its output is carried forward
+        load_db([('doi:10.1/a', 'W9'), ('doi:10.1/c', 'W4'), ('doi:10.1/d', 'W5')])
+        write_meta([('omid:br/1', 'doi:10.1/a', 'journal article'), ('omid:br/3', 'doi:10.1/d', 'book'),
+                    ('omid:br/4', 'doi:10.1/c', 'book chapter'), ('omid:br/5', 'doi:10.1/c', 'book')])
+        mapped, multi_mapped, non_mapped = run()
+        self.assertEqual(mapped, {('omid:br/1', 'W1', 'journal article'), ('omid:br/3', 'W5', 'book'),
+                                  ('omid:br/4', 'W4', 'book chapter'), ('omid:br/5', 'W4', 'book')})
+        self.assertEqual(multi_mapped, set())  # omid:br/2 is no longer in the input
+        self.assertEqual(non_mapped, set())
+        self.assertFalse(any(exists(join(d, Mapping.PREVIOUS_OUTPUT_DIR)) for d in out_dirs))
+
+        # a full run looks up all the rows again and discards the fingerprints
+        mapped, _, _ = run(incremental=False)
+        self.assertIn(('omid:br/1', 'W9', 'journal article'), mapped)
+        self.assertFalse(exists(join(out_dirs[0], Mapping.FINGERPRINT_INDEX_FILE)))
+
+    def _create_lookup_fixture(self):
+        """
+        Creates the database (WorksDoi keyed on the fingerprints of the PIDs), its Bloom filters, a reduced OC Meta
+        table and the same PIDs as CSV tables of OpenAlex IDs, shared by the tests of the lookup strategies.
+        """
+        root = self.actual_output_dir
+        db_path = join(root, 'test_db.db')
+        meta_dir = join(root, 'meta_ids')
+        os.makedirs(meta_dir, exist_ok=True)
+        with closing(sqlite3.connect(db_path)) as conn, conn:
+            for table in Mapping.LOOKUP_TABLES:
+                if table == 'WorksDoi':  # keyed on the fingerprints of the PIDs
+                    conn.execute(f'CREATE TABLE {table} (supported_id TEXT, openalex_id TEXT, pid_hash INTEGER)')
+                else:
+                    conn.execute(f'CREATE TABLE {table} (supported_id TEXT, openalex_id TEXT)')
+            conn.executemany('INSERT INTO WorksDoi VALUES (?, ?, ?)',
+                             [(pid, oaid, OpenAlexProcessor.pid_fingerprint(pid))
+                              for pid, oaid in [('doi:10.1/a', 'W1'), ('doi:10.1/b', 'W2'), ('doi:10.1/b', 'W3')]])
+            conn.executemany('INSERT INTO WorksPmid VALUES (?, ?)', [('pmid:1', 'W4'), ('pmid:2', 'W5')])
+            conn.executemany('INSERT INTO SourcesIssn VALUES (?, ?)', [('issn:1234-5678', 'S1')])
+            conn.executemany('INSERT INTO SourcesWikidata VALUES (?, ?)', [('wikidata:Q1', 'S2')])
+        with closing(sqlite3.connect(db_path)) as conn:
+            for table in Mapping.LOOKUP_TABLES:
+                PidBloomFilter.build(conn, table, PidBloomFilter.get_filter_dir(db_path))
+        with open(join(meta_dir, '0.csv'), 'w', encoding='utf-8', newline='') as f:
+            f.write('omid,ids,type\n'
+                    'omid:br/1,doi:10.1/a pmid:2,journal article\n'  # DOIs take precedence over PMIDs
+                    'omid:br/2,doi:10.1/b,book\n'
+                    'omid:br/3,issn:1234-5678 wikidata:Q1,journal\n'  # ISSNs take precedence over all the other PIDs
+                    'omid:br/4,pmid:1 wikidata:Q1,journal article\n'
+                    'omid:br/5,doi:10.1/none pmid:1,book\n'
+                    'omid:br/6,doi:10.1/a,journal article\n'
+                    'omid:br/7,doi:10.1/A,book\n')  # PIDs are matched exactly, although fingerprints are case-insensitive
+
+        # the same PIDs in the OpenAlex tables, for the sort-merge join (DOIs are routed to a separate table)
+        openalex_tables_dirs = {'work': join(root, 'openalex_tables', 'works'),
+                                'source': join(root, 'openalex_tables', 'sources')}
+        for table_dir, rows in [(join(openalex_tables_dirs['work'], 'doi'),
+                                 'doi:10.1/a,W1\ndoi:10.1/b,W2\ndoi:10.1/b,W3\n'),
+                                (openalex_tables_dirs['work'], 'pmid:1,W4\npmid:2,W5\n'),
+                                (openalex_tables_dirs['source'], 'issn:1234-5678,S1\nwikidata:Q1,S2\n')]:
+            os.makedirs(table_dir, exist_ok=True)
+            with open(join(table_dir, '0.csv'), 'w', encoding='utf-8', newline='') as f:
+                f.write('supported_id,openalex_id\n' + rows)
+        return db_path, meta_dir, openalex_tables_dirs
+
+    # the output of the fixture of _create_lookup_fixture() with any lookup strategy
+    LOOKUP_FIXTURE_OUTPUT = [[('omid:br/1', {'W1'}), ('omid:br/3', {'S1'}), ('omid:br/6', {'W1'})],
+                             [('omid:br/2', {'W2', 'W3'}), ('omid:br/4', {'W4', 'S2'})],
+                             [('omid:br/5', set()), ('omid:br/7', set())]]
+
+    def _map_lookup_fixture(self, meta_dir, db_path, name, **kwargs):
+        out_dirs = [join(self.actual_output_dir, name, d) for d in ['mapped', 'multi_mapped', 'non_mapped']]
+        with mock.patch.object(Mapping, 'LOOKUP_QUERY_SIZE', 2):
+            self.process.map_omid_openalex_ids(meta_dir, db_path, *out_dirs, **kwargs)
+        return [[(r['omid'], set(r.get('openalex_id', '').split())) for r in read_csv_tables(d)] for d in out_dirs]
+
+    def test_mapping_batched_lookups(self):
+        db_path, meta_dir, _ = self._create_lookup_fixture()
+        for lookup_batch_size in [0, 1, 4, 100]:
+            with self.subTest(lookup_batch_size=lookup_batch_size):
+                self.assertEqual(self._map_lookup_fixture(meta_dir, db_path, str(lookup_batch_size),
+                                                          lookup_batch_size=lookup_batch_size),
+                                 self.LOOKUP_FIXTURE_OUTPUT)
+
+    def test_mapping_sql_execution(self):
+        db_path, meta_dir, _ = self._create_lookup_fixture()
+        # the set-based SQL execution mode gives the same output as the row-wise lookups
+        self.assertEqual(self._map_lookup_fixture(meta_dir, db_path, 'sql', execution='sql', batch_size=4),
+                         self.LOOKUP_FIXTURE_OUTPUT)
+        # the staging tables are dropped
+        with closing(sqlite3.connect(db_path)) as conn:
+            self.assertNotIn('MetaRows', {r[0] for r in conn.execute("SELECT name FROM sqlite_master")})
+
+    def test_mapping_mmap_engine(self):
+        db_path, meta_dir, _ = self._create_lookup_fixture()
+        manifest_path = join(self.actual_output_dir, 'test_db_pid_index', SortedPidIndex.MANIFEST_FILE)
+        for i, kwargs in enumerate([{}, {'lookup_batch_size': 4}]):
+            self.assertEqual(self._map_lookup_fixture(meta_dir, db_path, str(i), lookup_engine='mmap', **kwargs),
+                             self.LOOKUP_FIXTURE_OUTPUT)
+        self.assertTrue(exists(manifest_path))
+        self.assertTrue(SortedPidIndex.is_current(join(self.actual_output_dir, 'test_db_pid_index'), db_path))
+
+        # a stale index is built again from the changed database
+        with closing(sqlite3.connect(db_path)) as conn, conn:
+            conn.execute('INSERT INTO WorksDoi VALUES (?, ?, ?)',
+                         ('doi:10.1/none', 'W6', OpenAlexProcessor.pid_fingerprint('doi:10.1/none')))
+        self.assertFalse(SortedPidIndex.is_current(join(self.actual_output_dir, 'test_db_pid_index'), db_path))
+        mapped, _, non_mapped = self._map_lookup_fixture(meta_dir, db_path, 'stale', lookup_engine='mmap')
+        self.assertIn(('omid:br/5', {'W6'}), mapped)
+        self.assertEqual(non_mapped, [('omid:br/7', set())])
+        self.assertTrue(SortedPidIndex.is_current(join(self.actual_output_dir, 'test_db_pid_index'), db_path))
+
+    def test_mapping_sort_merge(self):
+        db_path, meta_dir, openalex_tables_dirs = self._create_lookup_fixture()
+        spill = ExternalSorter._spill
+        with mock.patch.object(ExternalSorter, '_spill', autospec=True, side_effect=spill) as mock_spill:
+            output = self._map_lookup_fixture(meta_dir, db_path, 'sort_merge', execution='sort_merge',
+                                              openalex_tables_dirs=openalex_tables_dirs, sort_max_rows=2)
+        self.assertEqual(output, self.LOOKUP_FIXTURE_OUTPUT)
+        # with at most 2 rows sorted in memory, the PIDs are spilled to sorted runs merged on disk
+        self.assertGreater(mock_spill.call_count, 1)
+        # the runs are deleted with the temporary directory
+        self.assertFalse([d for d in os.listdir(join(self.actual_output_dir, 'sort_merge', 'mapped'))
+                          if d.startswith('sort_merge_')])
+
+    def test_mapping_bloom_filter(self):
+        db_path, meta_dir, _ = self._create_lookup_fixture()
+        with closing(sqlite3.connect(db_path)) as conn:
+            bloom_filters = PidBloomFilter.load(conn, PidBloomFilter.get_filter_dir(db_path), Mapping.LOOKUP_TABLES)
+        self.assertCountEqual(bloom_filters, Mapping.LOOKUP_TABLES)
+        # Bloom filters have no false negatives
+        dois = ['doi:10.1/b', 'doi:10.1/a']
+        self.assertEqual(bloom_filters['WorksDoi'].filter_pids(dois), dois)
+        self.assertTrue(bloom_filters['SourcesIssn'].might_contain('issn:1234-5678'))
+        self.assertFalse(bloom_filters['WorksPmcid'].might_contain('pmcid:PMC1'))  # empty table
+
+        # doi:10.1/none is skipped, while doi:10.1/A passes the filter, since fingerprints are case-insensitive
+        for i, (kwargs, expected_stats) in enumerate([
+                ({}, 'skipped 1 of 8 PID lookups, 1 false positives'),
+                ({'lookup_batch_size': 4}, 'skipped 1 of 8 PID lookups, 1 false positives')]):
+            with self.assertLogs(level='WARNING') as logs:
+                output = self._map_lookup_fixture(meta_dir, db_path, str(i), bloom_filter=True, **kwargs)
+            self.assertEqual(output, self.LOOKUP_FIXTURE_OUTPUT)
+            self.assertIn(f'Bloom filters: {expected_stats} (50.0000% of the absent PIDs)', logs.output[-1])
+
+        # a filter built before rows were added to its table is not used, and is used again once rebuilt
+        with closing(sqlite3.connect(db_path)) as conn:
+            conn.execute('INSERT INTO WorksDoi VALUES (?, ?, ?)',
+                         ('doi:10.1/none', 'W6', OpenAlexProcessor.pid_fingerprint('doi:10.1/none')))
+            conn.commit()
+            with self.assertLogs(level='WARNING') as logs:
+                bloom_filters = PidBloomFilter.load(conn, PidBloomFilter.get_filter_dir(db_path),
+                                                    Mapping.LOOKUP_TABLES)
+            self.assertNotIn('WorksDoi', bloom_filters)
+            self.assertEqual(logs.output, ['WARNING:root:The Bloom filter of WorksDoi is out of date and is not used'])
+            mapped, _, _ = self._map_lookup_fixture(meta_dir, db_path, 'stale', bloom_filter=True)
+            self.assertIn(('omid:br/5', {'W6'}), mapped)
+            PidBloomFilter.build(conn, 'WorksDoi', PidBloomFilter.get_filter_dir(db_path))
+            bloom_filters = PidBloomFilter.load(conn, PidBloomFilter.get_filter_dir(db_path), Mapping.LOOKUP_TABLES)
+        self.assertTrue(bloom_filters['WorksDoi'].might_contain('doi:10.1/none'))
+
+    def test_mapping_lookup_cache(self):
+        db_path, meta_dir, _ = self._create_lookup_fixture()
+        # doi:10.1/a is looked up again for omid:br/6, unless it was evicted by the PIDs of the rows in between
+        for i, (kwargs, expected_stats) in enumerate([
+                ({'lookup_cache_size': 10}, '(10 PIDs): 1 hits, 7 misses, 0 evictions'),
+                ({'lookup_cache_size': 2}, '(2 PIDs): 0 hits, 8 misses, 6 evictions'),
+                ({'lookup_cache_size': 2, 'lookup_batch_size': 4, 'bloom_filter': True},
+                 '(2 PIDs): 0 hits, 8 misses, 6 evictions')]):
+            with self.subTest(**kwargs), self.assertLogs(level='WARNING') as logs:
+                self.assertEqual(self._map_lookup_fixture(meta_dir, db_path, str(i), **kwargs),
+                                 self.LOOKUP_FIXTURE_OUTPUT)
+                self.assertIn(f'Lookup cache {expected_stats}', logs.output[-1])
+
+        # the least recently used PIDs are evicted from a full cache
+        cache = LRUCache(2)
+        with closing(sqlite3.connect(db_path)) as conn:
+            hashed_tables = {t: OpenAlexProcessor.has_pid_hash_key(conn, t) for t in Mapping.LOOKUP_TABLES}
+            for entity_ids in [['doi:10.1/a'], ['doi:10.1/a'], ['issn:1234-5678'], ['pmid:1'], ['doi:10.1/a']]:
+                oa_ids = Mapping.get_openalex_ids(conn.cursor(), entity_ids, hashed_tables, lookup_cache=cache)
+        self.assertEqual(oa_ids, {'W1'})
+        self.assertEqual(cache.get_stats(), {'hits': 1, 'misses': 4, 'evictions': 2})
+
+    def test_mapping_workers(self):
+        db_path, meta_dir, _ = self._create_lookup_fixture()
+        with open(join(meta_dir, '1.csv'), 'w', encoding='utf-8', newline='') as f:
+            f.write('omid,ids,type\nomid:br/8,pmid:2,book\nomid:br/9,doi:10.1/b,book\n')
+        expected_mapped, expected_multi_mapped, expected_non_mapped = self.LOOKUP_FIXTURE_OUTPUT
+        for i, kwargs in enumerate([{}, {'lookup_engine': 'mmap', 'lookup_batch_size': 4, 'bloom_filter': True}]):
+            with self.subTest(**kwargs):
+                mapped, multi_mapped, non_mapped = self._map_lookup_fixture(meta_dir, db_path, str(i), workers=2,
+                                                                            **kwargs)
+                self.assertCountEqual(mapped, expected_mapped + [('omid:br/8', {'W5'})])
+                self.assertCountEqual(multi_mapped, expected_multi_mapped + [('omid:br/9', {'W2', 'W3'})])
+                self.assertCountEqual(non_mapped, expected_non_mapped)
+                # each worker writes tables named after its input table, and the multi-mapped OMIDs are merged
+                out_root = join(self.actual_output_dir, str(i))
+                for d in ['mapped', 'non_mapped']:
+                    self.assertCountEqual(os.listdir(join(out_root, d)), ['0_0.csv', '1_0.csv'])
+                self.assertEqual(os.listdir(join(out_root, 'multi_mapped')), ['multi_mapped_omids.csv'])
+
+    def test_map_meta_tables(self):
+        root = self.actual_output_dir
+        db_path = join(root, 'test_db.db')
+        meta_ids_out = join(root, 'meta_ids')
+        os.makedirs(meta_ids_out, exist_ok=True)
+        with closing(sqlite3.connect(db_path)) as conn, conn:
+            for table in Mapping.LOOKUP_TABLES + ['AuthorsOrcid', 'InstitutionsRor']:  # no FundersRor table
+                conn.execute(f'CREATE TABLE {table} (supported_id TEXT, openalex_id TEXT)')
+            conn.executemany('INSERT INTO WorksDoi VALUES (?, ?)', [('doi:10.1/a', 'W1')])
+            conn.executemany('INSERT INTO SourcesIssn VALUES (?, ?)', [('issn:1234-5678', 'S1')])
+            conn.executemany('INSERT INTO SourcesWikidata VALUES (?, ?)', [('wikidata:Q1', 'S2')])
+            conn.executemany('INSERT INTO AuthorsOrcid VALUES (?, ?)', [('orcid:0000-0001', 'A1')])
+            conn.executemany('INSERT INTO InstitutionsRor VALUES (?, ?)', [('ror:01abc', 'I1'), ('ror:01abc', 'I2')])
+        for table, content in [('primary_ents', 'omid,ids,type\nomid:br/1,doi:10.1/a,journal article\n'
+                                                'omid:br/2,doi:10.1/b,book\n'),
+                               ('venues', 'omid,ids\nomid:br/3,issn:1234-5678 wikidata:Q1\nomid:br/4,wikidata:Q1\n'),
+                               ('resp_ags', 'omid,ids,ra_role\nomid:ra/1,orcid:0000-0001,author\n'
+                                            'omid:ra/1,orcid:0000-0001,editor\nomid:ra/2,ror:01abc,publisher\n'
+                                            'omid:ra/3,viaf:1 ror:02def,publisher\n')]:
+            os.makedirs(join(meta_ids_out, table), exist_ok=True)
+            with open(join(meta_ids_out, table, '0.csv'), 'w', encoding='utf-8', newline='') as f:
+                f.write(content)
+
+        outputs = []
+        for i, kwargs in enumerate([{}, {'workers': 2, 'lookup_batch_size': 2}]):
+            out_dir = join(root, str(i))
+            with self.assertLogs(level='WARNING') as logs:
+                Mapping.map_meta_tables(meta_ids_out, db_path, out_dir, **kwargs)
+            self.assertIn("['FundersRor'] do not exist", logs.output[0])
+            outputs.append({t: [list(read_csv_tables(join(out_dir, t, d)))
+                                for d in ['mapped', 'multi_mapped', 'non_mapped']]
+                            for t in ['primary_ents', 'venues', 'resp_ags']})
+
+        output = outputs[0]
+        self.assertEqual(output['primary_ents'], [
+            [{'omid': 'omid:br/1', 'openalex_id': 'W1', 'type': 'journal article'}],
+            [], [{'omid': 'omid:br/2', 'type': 'book'}]])
+        self.assertEqual(output['venues'], [[{'omid': 'omid:br/3', 'openalex_id': 'S1'},
+                                             {'omid': 'omid:br/4', 'openalex_id': 'S2'}], [], []])
+        mapped, multi_mapped, non_mapped = output['resp_ags']
+        self.assertEqual(mapped, [{'omid': 'omid:ra/1', 'openalex_id': 'A1', 'ra_role': 'author'},
+                                  {'omid': 'omid:ra/1', 'openalex_id': 'A1', 'ra_role': 'editor'}])
+        self.assertEqual(len(multi_mapped), 1)
+        self.assertEqual(set(multi_mapped[0]['openalex_id'].split()), {'I1', 'I2'})
+        self.assertEqual(non_mapped, [{'omid': 'omid:ra/3', 'ra_role': 'publisher'}])
+        # the output of the worker processes is the same
+        for table, table_output in outputs[1].items():
+            for rows, expected_rows in zip(table_output, output[table]):
+                self.assertCountEqual([r['omid'] for r in rows], [r['omid'] for r in expected_rows])
+
+    def test_map_meta_tables_ror_precedence(self):
+        root = self.actual_output_dir
+        db_path = join(root, 'test_db.db')
+        meta_ids_out = join(root, 'meta_ids')
+        os.makedirs(join(meta_ids_out, 'resp_ags'), exist_ok=True)
+        with closing(sqlite3.connect(db_path)) as conn, conn:
+            for table in Mapping.RA_LOOKUP_TABLES:
+                conn.execute(f'CREATE TABLE {table} (supported_id TEXT, openalex_id TEXT)')
+            # ror:01abc identifies both an institution and a funder
+            conn.executemany('INSERT INTO InstitutionsRor VALUES (?, ?)', [('ror:01abc', 'I1')])
+            conn.executemany('INSERT INTO FundersRor VALUES (?, ?)', [('ror:01abc', 'F1'), ('ror:02def', 'F2')])
+        with open(join(meta_ids_out, 'resp_ags', '0.csv'), 'w', encoding='utf-8', newline='') as f:
+            f.write('omid,ids,ra_role\nomid:ra/1,ror:01abc,publisher\nomid:ra/2,ror:02def,publisher\n'
+                    'omid:ra/3,ror:03ghi,publisher\n')
+
+        for i, kwargs in enumerate([{}, {'lookup_batch_size': 2}, {'lookup_cache_size': 10, 'lookup_batch_size': 1}]):
+            with self.subTest(**kwargs):
+                out_dir = join(root, str(i))
+                Mapping.map_meta_tables(meta_ids_out, db_path, out_dir, tables=['resp_ags'], **kwargs)
+                mapped, multi_mapped, non_mapped = [list(read_csv_tables(join(out_dir, 'resp_ags', d)))
+                                                    for d in ['mapped', 'multi_mapped', 'non_mapped']]
+                # the institution takes precedence, the funders table is only queried for RORs of no institution
+                self.assertEqual(mapped, [{'omid': 'omid:ra/1', 'openalex_id': 'I1', 'ra_role': 'publisher'},
+                                          {'omid': 'omid:ra/2', 'openalex_id': 'F2', 'ra_role': 'publisher'}])
+                self.assertEqual(multi_mapped, [])
+                self.assertEqual(non_mapped, [{'omid': 'omid:ra/3', 'ra_role': 'publisher'}])
+
     def assertFilesEqual(self, expected_file, actual_file):
         with open(expected_file, 'r', encoding='utf-8') as expected, open(actual_file, 'r', encoding='utf-8') as actual:
             # convert output files to sets of tuples for comparing them (order of rows is slightly messed
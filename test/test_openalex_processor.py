@@ -17,8 +17,14 @@ import unittest
 import os
 import shutil
 import csv
+import gzip
+import json
+import sqlite3
+from contextlib import closing
+from unittest import mock
 from os.path import join
-from oc_alignoa.mapping import OpenAlexProcessor
+from oc_alignoa.mapping import OpenAlexProcessor, Mapping
+from oc_alignoa.utils import pq, read_csv_tables, MultiFileWriter, zstandard, lz4_frame
 
 
 class TestOpenAlexProcessor(unittest.TestCase):
@@ -57,6 +63,317 @@ class TestOpenAlexProcessor(unittest.TestCase):
 
         self.assertFilesEqual(self.expected_out_file_works, works_output_file)
         self.assertFilesEqual(self.expected_out_file_sources, source_output_file)
+
+    def test_create_openalex_ids_table_parallel(self):
+        processor = self.openalex_processor
+
+        processor.create_openalex_ids_table(self.works_inp_dir, self.works_out_dir, 'work', workers=2)
+        processor.create_openalex_ids_table(self.sources_inp_dir, self.sources_out_dir, 'source', workers=2)
+
+        # each input file is written to its own set of output files, named after the input file
+        works_output_file = join(self.works_out_dir, 'updated_date_test_part_test_0.csv')
+        source_output_file = join(self.sources_out_dir, 'updated_date_test_part_test_0.csv')
+        self.assertTrue(os.path.exists(works_output_file))
+        self.assertTrue(os.path.exists(source_output_file))
+
+        self.assertFilesEqual(self.expected_out_file_works, works_output_file)
+        self.assertFilesEqual(self.expected_out_file_sources, source_output_file)
+
+    def test_create_openalex_ids_table_resume(self):
+        processor = self.openalex_processor
+        works_output_file = join(self.works_out_dir, 'updated_date_test_part_test_0.csv')
+
+        processor.create_openalex_ids_table(self.works_inp_dir, self.works_out_dir, 'work', checkpoint=True)
+        self.assertFilesEqual(self.expected_out_file_works, works_output_file)
+        with open(join(self.works_out_dir, 'checkpoint.jsonl'), 'r', encoding='utf-8') as f:
+            entries = [json.loads(line) for line in f]
+        self.assertEqual(entries, [{'input': join('updated_date_test', 'part_test.gz'),
+                                    'outputs': ['updated_date_test_part_test_0.csv']}])
+
+        # completed files are skipped when resuming
+        os.remove(works_output_file)
+        processor.create_openalex_ids_table(self.works_inp_dir, self.works_out_dir, 'work', resume=True)
+        self.assertFalse(os.path.exists(works_output_file))
+
+        # the partial output of files that were not completed is discarded and written again
+        os.remove(join(self.works_out_dir, 'checkpoint.jsonl'))
+        stale_file = join(self.works_out_dir, 'updated_date_test_part_test_1.csv')
+        with open(stale_file, 'w', encoding='utf-8') as f:
+            f.write('openalex_id,supported_id\n')
+        processor.create_openalex_ids_table(self.works_inp_dir, self.works_out_dir, 'work', resume=True)
+        self.assertFalse(os.path.exists(stale_file))
+        self.assertFilesEqual(self.expected_out_file_works, works_output_file)
+
+    def test_create_openalex_ids_table_resume_without_checkpoint(self):
+        processor = self.openalex_processor
+        processor.create_openalex_ids_table(self.works_inp_dir, self.works_out_dir, 'work')
+        rows = list(read_csv_tables(self.works_out_dir))
+
+        # the tables of a run without checkpoint are not recorded in any journal: they are replaced, not duplicated
+        processor.create_openalex_ids_table(self.works_inp_dir, self.works_out_dir, 'work', resume=True)
+        self.assertNotIn('0.csv', os.listdir(self.works_out_dir))
+        self.assertCountEqual(list(read_csv_tables(self.works_out_dir)), rows)
+
+    def test_create_openalex_ids_table_rerun_with_workers(self):
+        processor = self.openalex_processor
+        processor.create_openalex_ids_table(self.works_inp_dir, self.works_out_dir, 'work', split_by_id_type=True)
+        scheme_dirs = [join(self.works_out_dir, d) for d in os.listdir(self.works_out_dir)]
+        rows = list(read_csv_tables(*scheme_dirs))
+        self.assertTrue(rows)
+
+        # the tables of the serial run are named differently from those of the workers: they are replaced
+        processor.create_openalex_ids_table(self.works_inp_dir, self.works_out_dir, 'work', workers=2,
+                                            split_by_id_type=True)
+        self.assertFalse(any('0.csv' in files for _, _, files in os.walk(self.works_out_dir)))
+        self.assertCountEqual(list(read_csv_tables(*scheme_dirs)), rows)
+
+    @unittest.skipIf(pq is None, 'pyarrow is not installed')
+    def test_create_openalex_ids_table_parquet(self):
+        processor = self.openalex_processor
+        db_file = join(self.actual_output_dir, 'test_db.db')
+
+        processor.create_openalex_ids_table(self.works_inp_dir, self.works_out_dir, 'work', output_format='parquet')
+        self.assertEqual(os.listdir(self.works_out_dir), ['0.parquet'])
+        processor.create_id_db_table(self.works_out_dir, db_file, 'doi', 'work')
+
+        with open(self.expected_out_file_works, 'r', encoding='utf-8') as f:
+            expected_dois = set(tuple(row.values()) for row in csv.DictReader(f) if row['supported_id'].startswith('doi:'))
+        with closing(sqlite3.connect(db_file)) as conn:
+            self.assertEqual(expected_dois, set(conn.execute('SELECT supported_id, openalex_id FROM WorksDoi').fetchall()))
+
+    def test_create_openalex_ids_table_compressed(self):
+        processor = self.openalex_processor
+        with open(self.expected_out_file_works, 'r', encoding='utf-8') as f:
+            expected_rows = list(csv.DictReader(f))
+
+        # zstd and lz4 fall back to gzip if the zstandard and lz4 packages are not installed
+        for output_format, available in [('csv.gz', True), ('csv.zst', zstandard), ('csv.lz4', lz4_frame)]:
+            with self.subTest(output_format=output_format):
+                shutil.rmtree(self.works_out_dir, ignore_errors=True)
+                processor.create_openalex_ids_table(self.works_inp_dir, self.works_out_dir, 'work',
+                                                    output_format=output_format)
+                expected_file = f'0.{output_format}' if available else '0.csv.gz'
+                self.assertEqual(os.listdir(self.works_out_dir), [expected_file])
+                self.assertCountEqual(expected_rows, list(read_csv_tables(self.works_out_dir)))
+                self.assertEqual(len(expected_rows), len(next(read_csv_tables(self.works_out_dir, use_pandas=True))))
+
+    def test_compressed_jsonl_files(self):
+        rows = [{'id': 'https://openalex.org/S1', 'display_name': 'Café'}, {'id': 'https://openalex.org/S2'},
+                {'id': 'https://openalex.org/S3'}]
+        with MultiFileWriter(self.sources_out_dir, nrows=2, file_extension='json', compression='gzip',
+                             compression_level=1) as writer:
+            for row in rows:
+                writer.write_row(row)
+        self.assertEqual(sorted(os.listdir(self.sources_out_dir)), ['0.json.gz', '1.json.gz'])
+        with gzip.open(join(self.sources_out_dir, '0.json.gz'), 'rt', encoding='utf-8') as f:
+            self.assertEqual(rows[:2], [json.loads(line) for line in f])
+
+    def test_compression_fallback_level(self):
+        # the level of the requested codec is not passed to gzip, which only accepts levels from 0 to 9
+        with mock.patch('oc_alignoa.utils.zstandard', None), self.assertLogs(level='WARNING'):
+            with MultiFileWriter(self.sources_out_dir, fieldnames=['a'], compression='zstd',
+                                 compression_level=19) as writer:
+                writer.write_row({'a': '1'})
+        self.assertEqual(os.listdir(self.sources_out_dir), ['0.csv.gz'])
+        with gzip.open(join(self.sources_out_dir, '0.csv.gz'), 'rt', encoding='utf-8') as f:
+            self.assertEqual(list(csv.DictReader(f)), [{'a': '1'}])
+
+    def test_create_openalex_ids_table_ids_only_parser(self):
+        processor = self.openalex_processor
+
+        processor.create_openalex_ids_table(self.works_inp_dir, self.works_out_dir, 'work', parser='ids_only')
+        processor.create_openalex_ids_table(self.sources_inp_dir, self.sources_out_dir, 'source', parser='ids_only')
+
+        self.assertFilesEqual(self.expected_out_file_works, join(self.works_out_dir, '0.csv'))
+        self.assertFilesEqual(self.expected_out_file_sources, join(self.sources_out_dir, '0.csv'))
+
+    def test_create_openalex_ids_table_split_by_id_type(self):
+        processor = self.openalex_processor
+
+        processor.create_openalex_ids_table(self.works_inp_dir, self.works_out_dir, 'work', split_by_id_type=True)
+        processor.create_openalex_ids_table(self.sources_inp_dir, self.sources_out_dir, 'source', split_by_id_type=True)
+
+        for out_dir, expected_file, schemes in [(self.works_out_dir, self.expected_out_file_works, ['doi', 'pmid']),
+                                                (self.sources_out_dir, self.expected_out_file_sources, ['issn', 'wikidata'])]:
+            with open(expected_file, 'r', encoding='utf-8') as expected:
+                expected_rows = [tuple(row.items()) for row in csv.DictReader(expected)]
+            for scheme in schemes:
+                with open(join(out_dir, scheme, '0.csv'), 'r', encoding='utf-8') as actual:
+                    actual_content = set(tuple(row.items()) for row in csv.DictReader(actual))
+                expected_content = set(r for r in expected_rows if r[0][1].startswith(scheme + ':'))
+                self.assertEqual(expected_content, actual_content)
+
+    def test_decompression_backends(self):
+        processor = self.openalex_processor
+        input_file = join(self.works_inp_dir, 'updated_date_test', 'part_test.gz')
+        expected = list(processor.read_dump_file(input_file, decompression='gzip'))
+        for backend in ['auto', 'isal', 'zlib-ng', 'pigz']:  # unavailable backends fall back to gzip
+            self.assertEqual(expected, list(processor.read_dump_file(input_file, decompression=backend)))
+
+    def test_parse_ids_only_fallback(self):
+        # the 'ids' key occurs twice: the whole line must be parsed
+        line = b'{"x": {"ids": {"a": 1}}, "id": "https://openalex.org/W1", "ids": {"openalex": "https://openalex.org/W1"}}'
+        self.assertIn('x', self.openalex_processor.parse_ids_only(line))
+        # the value of a PID in 'ids' contains a closing brace
+        line = b'{"id": "https://openalex.org/W1", "ids": {"openalex": "https://openalex.org/W1", "doi": "https://doi.org/10.1/a}b"}}'
+        self.assertEqual(self.openalex_processor.parse_ids_only(line)['ids']['doi'], 'https://doi.org/10.1/a}b')
+
+    def test_load_openalex_ids_db(self):
+        processor = self.openalex_processor
+        db_file = join(self.actual_output_dir, 'test_db.db')
+        os.makedirs(self.actual_output_dir, exist_ok=True)
+
+        processor.load_openalex_ids_db(self.works_inp_dir, db_file, 'work', batch_size=10)
+        processor.load_openalex_ids_db(self.sources_inp_dir, db_file, 'source', csv_out_dir=self.sources_out_dir)
+
+        with open(self.expected_out_file_works, 'r', encoding='utf-8') as f:
+            expected_works = set(tuple(row.values()) for row in csv.DictReader(f))
+        with closing(sqlite3.connect(db_file)) as conn:
+            actual_works = set()
+            for table_name in ['WorksDoi', 'WorksPmid', 'WorksPmcid']:
+                actual_works.update(conn.execute(f'SELECT supported_id, openalex_id FROM {table_name}').fetchall())
+            indexes = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+        self.assertEqual(expected_works, actual_works)
+        self.assertIn('idx_worksdoi', indexes)
+        self.assertIn('idx_sourcesissn', indexes)
+        self.assertFilesEqual(self.expected_out_file_sources, join(self.sources_out_dir, '0.csv'))
+
+    def test_create_id_db_table_resume(self):
+        processor = self.openalex_processor
+        db_file = join(self.actual_output_dir, 'test_db.db')
+        processor.create_openalex_ids_table(self.works_inp_dir, self.works_out_dir, 'work')
+        processor.create_id_db_table(self.works_out_dir, db_file, 'doi', 'work')
+        processor.create_id_db_table(self.works_out_dir, db_file, 'pmid', 'work')
+        with closing(sqlite3.connect(db_file)) as conn:
+            expected_dois = conn.execute('SELECT * FROM WorksDoi').fetchall()
+            expected_pmids = conn.execute('SELECT * FROM WorksPmid').fetchall()
+            # simulate a crash while loading WorksPmid: the index is only created once all the rows are loaded
+            conn.execute('DROP INDEX idx_workspmid')
+            conn.execute('DELETE FROM WorksPmid WHERE rowid > 1')
+            conn.commit()
+
+        with self.assertRaises(ValueError):
+            processor.create_id_db_table(self.works_out_dir, db_file, 'doi', 'work')
+        processor.create_id_db_table(self.works_out_dir, db_file, 'doi', 'work', resume=True)
+        processor.create_id_db_table(self.works_out_dir, db_file, 'pmid', 'work', resume=True)
+        with closing(sqlite3.connect(db_file)) as conn:
+            self.assertEqual(expected_dois, conn.execute('SELECT * FROM WorksDoi').fetchall())
+            self.assertCountEqual(expected_pmids, conn.execute('SELECT * FROM WorksPmid').fetchall())
+            indexes = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+        self.assertIn('idx_workspmid', indexes)
+
+    def test_load_openalex_ids_db_resume(self):
+        processor = self.openalex_processor
+        db_file = join(self.actual_output_dir, 'test_db.db')
+        os.makedirs(self.actual_output_dir, exist_ok=True)
+        processor.load_openalex_ids_db(self.works_inp_dir, db_file, 'work')
+        with closing(sqlite3.connect(db_file)) as conn:
+            expected_rows = {t: conn.execute(f'SELECT * FROM {t}').fetchall() for t in ['WorksDoi', 'WorksPmid', 'WorksPmcid']}
+
+        processor.load_openalex_ids_db(self.works_inp_dir, db_file, 'work', resume=True)  # all the tables are complete
+        with closing(sqlite3.connect(db_file)) as conn:
+            conn.execute('DROP INDEX idx_workspmcid')
+            conn.execute('DELETE FROM WorksPmcid')
+            conn.commit()
+        processor.load_openalex_ids_db(self.works_inp_dir, db_file, 'work', resume=True)
+        with closing(sqlite3.connect(db_file)) as conn:
+            for table_name, rows in expected_rows.items():
+                self.assertCountEqual(rows, conn.execute(f'SELECT * FROM {table_name}').fetchall())
+
+    def test_int_openalex_ids(self):
+        processor = self.openalex_processor
+        self.assertEqual(processor.encode_openalex_id('W2741809807'), (1 << 56) + 2741809807)
+        for oaid in ['W2741809807', 'S168707975', 'A5023888391']:
+            self.assertEqual(processor.decode_openalex_id(processor.encode_openalex_id(oaid)), oaid)
+        self.assertEqual(processor.decode_openalex_id('W2741809807'), 'W2741809807')
+
+        db_file = join(self.actual_output_dir, 'test_db.db')
+        os.makedirs(self.actual_output_dir, exist_ok=True)
+        processor.load_openalex_ids_db(self.works_inp_dir, db_file, 'work', int_ids=True)
+        processor.create_openalex_ids_table(self.sources_inp_dir, self.sources_out_dir, 'source')
+        processor.create_id_db_table(self.sources_out_dir, db_file, 'issn', 'source', int_ids=True)
+
+        with open(self.expected_out_file_works, 'r', encoding='utf-8') as f:
+            expected_works = set(tuple(row.values()) for row in csv.DictReader(f))
+        with open(self.expected_out_file_sources, 'r', encoding='utf-8') as f:
+            expected_issns = set(tuple(row.values()) for row in csv.DictReader(f) if row['supported_id'].startswith('issn:'))
+        with closing(sqlite3.connect(db_file)) as conn:
+            actual_works = set()
+            for table_name in ['WorksDoi', 'WorksPmid', 'WorksPmcid']:
+                actual_works.update(conn.execute(f'SELECT supported_id, openalex_id FROM {table_name}').fetchall())
+            actual_issns = set(conn.execute('SELECT supported_id, openalex_id FROM SourcesIssn').fetchall())
+            types = {r[0] for r in conn.execute('SELECT DISTINCT typeof(openalex_id) FROM SourcesIssn UNION '
+                                                'SELECT DISTINCT typeof(openalex_id) FROM WorksDoi')}
+        self.assertEqual(types, {'integer'})
+        self.assertEqual(expected_works, {(pid, processor.decode_openalex_id(oaid)) for pid, oaid in actual_works})
+        self.assertEqual(expected_issns, {(pid, processor.decode_openalex_id(oaid)) for pid, oaid in actual_issns})
+
+    def test_hash_keys(self):
+        processor = self.openalex_processor
+        self.assertEqual(processor.pid_fingerprint('doi:10.1/ABC '), processor.pid_fingerprint('doi:10.1/abc'))
+        self.assertNotEqual(processor.pid_fingerprint('doi:10.1/abc'), processor.pid_fingerprint('doi:10.1/abd'))
+
+        db_file = join(self.actual_output_dir, 'test_db.db')
+        os.makedirs(self.actual_output_dir, exist_ok=True)
+        processor.load_openalex_ids_db(self.works_inp_dir, db_file, 'work', int_ids=True, hash_keys=True)
+        processor.create_openalex_ids_table(self.sources_inp_dir, self.sources_out_dir, 'source')
+        processor.create_id_db_table(self.sources_out_dir, db_file, 'issn', 'source', hash_keys=True)
+        with closing(sqlite3.connect(db_file)) as conn:
+            index_sql = conn.execute("SELECT sql FROM sqlite_master WHERE name='idx_worksdoi'").fetchone()[0]
+            self.assertIn('pid_hash', index_sql)
+            self.assertTrue(processor.has_pid_hash_key(conn, 'SourcesIssn'))
+            self.assertEqual(Mapping.lookup_openalex_ids(conn.cursor(), 'SourcesIssn', 'issn:0044-295X', True),
+                             [('S2754884180',)])
+            self.assertEqual(Mapping.lookup_openalex_ids(conn.cursor(), 'SourcesIssn', 'issn:0044-295x', True), [])
+
+        # the mapping looks up PIDs by fingerprint and decodes the integer OpenAlex IDs
+        meta_dir = join(self.actual_output_dir, 'meta_ids')
+        os.makedirs(meta_dir, exist_ok=True)
+        with open(join(meta_dir, '0.csv'), 'w', encoding='utf-8', newline='') as f:
+            f.write('omid,ids,type\nomid:br/1,doi:10.1109/ieeestd.2011.5712778,journal article\n'
+                    'omid:br/2,issn:0044-295X,journal\nomid:br/3,doi:10.1/none,journal article\n')
+        mapping_out = join(self.actual_output_dir, 'mapping')
+        Mapping.map_omid_openalex_ids(meta_dir, db_file, join(mapping_out, 'mapped'), join(mapping_out, 'multi_mapped'),
+                                      join(mapping_out, 'non_mapped'))
+        with open(join(mapping_out, 'mapped', '0.csv'), 'r', encoding='utf-8') as f:
+            mapped = {(r['omid'], r['openalex_id']) for r in csv.DictReader(f)}
+        self.assertEqual(mapped, {('omid:br/1', 'W4212922081'), ('omid:br/2', 'S2754884180')})
+
+    def test_incremental_refresh(self):
+        processor = self.openalex_processor
+        dump_dir = join(self.actual_output_dir, 'dump', 'works')
+        merged_dir = join(self.actual_output_dir, 'dump', 'merged_ids', 'works')
+        db_file = join(self.actual_output_dir, 'test_db.db')
+
+        def write_partition(partition, entities):
+            os.makedirs(join(dump_dir, partition), exist_ok=True)
+            with gzip.open(join(dump_dir, partition, 'part_000.gz'), 'wt', encoding='utf-8') as f:
+                for oaid, doi in entities:
+                    ids = {'openalex': 'https://openalex.org/' + oaid, 'doi': 'https://doi.org/' + doi}
+                    f.write(json.dumps({'id': 'https://openalex.org/' + oaid, 'ids': ids}) + '\n')
+
+        def table_content():
+            with closing(sqlite3.connect(db_file)) as conn:
+                return set(conn.execute('SELECT supported_id, openalex_id FROM WorksDoi').fetchall())
+
+        write_partition('updated_date=2023-01-01', [('W1', '10.1/a'), ('W2', '10.1/b'), ('W3', '10.1/c')])
+        processor.create_openalex_ids_table(dump_dir, self.works_out_dir, 'work', incremental=True)
+        processor.create_id_db_table(self.works_out_dir, db_file, 'doi', 'work', incremental=True)
+        self.assertEqual(table_content(), {('doi:10.1/a', 'W1'), ('doi:10.1/b', 'W2'), ('doi:10.1/c', 'W3')})
+
+        # W2 is updated with a new DOI and W3 is merged into W1
+        write_partition('updated_date=2023-02-01', [('W2', '10.1/b2')])
+        os.makedirs(merged_dir, exist_ok=True)
+        with gzip.open(join(merged_dir, '2023-02-01.csv.gz'), 'wt', encoding='utf-8') as f:
+            f.write('merge_date,id,merge_into_id\n2023-02-01,W3,W1\n')
+
+        processor.create_openalex_ids_table(dump_dir, self.works_out_dir, 'work', incremental=True)
+        processor.create_id_db_table(self.works_out_dir, db_file, 'doi', 'work', incremental=True, merged_ids_dir=merged_dir)
+        self.assertEqual(table_content(), {('doi:10.1/a', 'W1'), ('doi:10.1/b2', 'W2')})
+
+        with open(join(self.works_out_dir, processor.INGESTED_PARTITIONS_FILE), 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f), ['updated_date=2023-01-01', 'updated_date=2023-02-01'])
+
     ## Can't test this method because the database file cannot be deleted after the test in tearDown(), or
     ##   else the database will not be accessible, for some reason.
     # def test_create_id_db_table(self):
@@ -18,7 +18,14 @@ import os
 from os.path import join
 import shutil
 from oc_alignoa.mapping import MetaProcessor
+from oc_alignoa.utils import read_csv_tables, skip_records_with_id_prefix
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
 import csv
+import zipfile
+import io
 
 
 class MetaProcessorTest(unittest.TestCase):
@@ -89,6 +96,152 @@ class MetaProcessorTest(unittest.TestCase):
         all_rows_actual_file = join(actual_out_dir_all_rows, 'primary_ents', '0.csv')
         self.assertFilesEqual(all_rows_expected_file, all_rows_actual_file)
 
+    def test_preprocess_meta_tables_checkpoint(self):
+        self.meta_processor.preprocess_meta_tables(self.test_data, self.actual_output_dir, checkpoint=True)
+
+        self.assertTrue(os.path.exists(join(self.actual_output_dir, 'checkpoint.jsonl')))
+        self.assertFalse(os.path.exists(join(self.actual_output_dir, 'partial')))
+        for table in ['primary_ents', 'venues', 'resp_ags']:
+            out_files = os.listdir(join(self.actual_output_dir, table))
+            self.assertEqual(len(out_files), 1)
+            self.assertFilesEqual(join(self.expected_output_dir, table, 'test.csv'),
+                                  join(self.actual_output_dir, table, out_files[0]))
+
+        # all the files of the dump are recorded as completed: resuming does not process them again
+        primary_ents_file = join(self.actual_output_dir, 'primary_ents', os.listdir(join(self.actual_output_dir, 'primary_ents'))[0])
+        os.remove(primary_ents_file)
+        self.meta_processor.preprocess_meta_tables(self.test_data, self.actual_output_dir, resume=True)
+        self.assertFalse(os.path.exists(primary_ents_file))
+
+    def test_preprocess_meta_tables_resume_without_checkpoint(self):
+        self.meta_processor.preprocess_meta_tables(self.test_data, self.actual_output_dir)
+        primary_ents_dir = join(self.actual_output_dir, 'primary_ents')
+        rows = list(read_csv_tables(primary_ents_dir))
+
+        # the tables of a run without checkpoint are not recorded in any journal: they are replaced, not duplicated
+        self.meta_processor.preprocess_meta_tables(self.test_data, self.actual_output_dir, resume=True)
+        self.assertNotIn('0.csv', os.listdir(primary_ents_dir))
+        self.assertCountEqual(list(read_csv_tables(primary_ents_dir)), rows)
+
+    def test_preprocess_meta_tables_rerun_with_workers(self):
+        self.meta_processor.preprocess_meta_tables(self.test_data, self.actual_output_dir)
+        expected = {t: list(read_csv_tables(join(self.actual_output_dir, t)))
+                    for t in ['primary_ents', 'venues', 'resp_ags']}
+
+        # the tables of the serial run are named differently from those of the workers: they are replaced
+        self.meta_processor.preprocess_meta_tables(self.test_data, self.actual_output_dir, workers=2)
+        self.assertNotIn('0.csv', os.listdir(join(self.actual_output_dir, 'primary_ents')))
+        for table, rows in expected.items():
+            self.assertCountEqual(list(read_csv_tables(join(self.actual_output_dir, table))), rows)
+
+    def test_preprocess_meta_tables_bounded_dedup(self):
+        # rows are spilled to disk every 2 distinct rows and deduplicated with a k-way merge
+        self.meta_processor.preprocess_meta_tables(self.test_data, self.actual_output_dir, dedup_max_rows=2)
+
+        for table in ['venues', 'resp_ags']:
+            with open(join(self.expected_output_dir, table, 'test.csv'), 'r', encoding='utf-8') as f:
+                expected_content = set(tuple(row.items()) for row in csv.DictReader(f))
+            actual_rows = [tuple(row.items()) for row in read_csv_tables(join(self.actual_output_dir, table))]
+            self.assertEqual(expected_content, set(actual_rows))
+            self.assertEqual(len(actual_rows), len(set(actual_rows)))
+        # the run files are deleted
+        self.assertEqual(sorted(os.listdir(self.actual_output_dir)), ['primary_ents', 'resp_ags', 'venues'])
+
+    def test_preprocess_meta_tables_parallel(self):
+        # split the rows of the test dump over two CSV files, so that the same venues and agents occur in both
+        with zipfile.ZipFile(self.test_data) as archive:
+            lines = archive.read('test.csv').decode('utf-8').splitlines(keepends=True)
+        rows = list(csv.reader(lines))
+        os.makedirs(self.actual_output_dir, exist_ok=True)
+        dump_zip = join(self.actual_output_dir, 'dump.zip')
+        with zipfile.ZipFile(dump_zip, 'w') as archive:
+            for i, chunk in enumerate([rows[1::2], rows[2::2]]):
+                with archive.open(f'csv/{i}.csv', 'w') as f:
+                    text = ''.join(','.join('"{}"'.format(v.replace('"', '""')) for v in r) + '\n' for r in [rows[0]] + chunk)
+                    f.write(text.encode('utf-8'))
+
+        out_dir = join(self.actual_output_dir, 'meta_ids')
+        self.meta_processor.preprocess_meta_tables(dump_zip, out_dir, workers=2)
+
+        self.assertEqual(sorted(os.listdir(join(out_dir, 'primary_ents'))), ['csv_0_0.csv', 'csv_1_0.csv'])
+        self.assertFalse(os.path.exists(join(out_dir, 'partial')))
+        for table in ['primary_ents', 'venues', 'resp_ags']:
+            with open(join(self.expected_output_dir, table, 'test.csv'), 'r', encoding='utf-8') as f:
+                expected_content = set(tuple(row.items()) for row in csv.DictReader(f))
+            actual_rows = [tuple(row.items()) for row in read_csv_tables(join(out_dir, table))]
+            self.assertEqual(expected_content, set(actual_rows))
+            self.assertEqual(len(actual_rows), len(set(actual_rows)))  # duplicates are removed over the whole dump
+
+    @unittest.skipIf(pq is None, 'pyarrow is not installed')
+    def test_preprocess_meta_tables_parquet(self):
+        self.meta_processor.preprocess_meta_tables(self.test_data, self.actual_output_dir, output_format='parquet')
+
+        for table in ['primary_ents', 'venues', 'resp_ags']:
+            self.assertEqual(os.listdir(join(self.actual_output_dir, table)), ['0.parquet'])
+            with open(join(self.expected_output_dir, table, 'test.csv'), 'r', encoding='utf-8') as f:
+                expected_content = set(tuple(row.items()) for row in csv.DictReader(f))
+            actual_content = set(tuple(row.items()) for row in read_csv_tables(join(self.actual_output_dir, table)))
+            self.assertEqual(expected_content, actual_content)
+
+        # low-cardinality columns are dictionary-encoded
+        schema = pq.read_schema(join(self.actual_output_dir, 'primary_ents', '0.parquet'))
+        self.assertEqual(str(schema.field('type').type), 'dictionary<values=string, indices=int32, ordered=0>')
+        self.assertEqual(str(schema.field('omid').type), 'string')
+
+    @unittest.skipIf(pq is None, 'pyarrow is not installed')
+    def test_preprocess_meta_tables_arrow_parser(self):
+        # the 'arrow' parser produces the same tables as the 'csv' parser; small chunks spread entities and
+        #   duplicates over several chunks
+        for data in [self.test_data, self.test_data_dir_all_rows]:
+            for all_rows in [True, False]:
+                tables = dict()
+                for parser in ['csv', 'arrow']:
+                    out_dir = join(self.actual_output_dir, parser)
+                    shutil.rmtree(out_dir, ignore_errors=True)
+                    self.meta_processor.preprocess_meta_tables(data, out_dir, all_rows=all_rows, parser=parser,
+                                                               chunk_size=5)
+                    tables[parser] = {t: sorted(tuple(row.items()) for row in read_csv_tables(join(out_dir, t)))
+                                      for t in ['primary_ents', 'venues', 'resp_ags']}
+                self.assertEqual(tables['csv'], tables['arrow'])
+                self.assertTrue(tables['arrow']['primary_ents'])
+
+    def test_preprocess_meta_tables_tables(self):
+        # only the 'id' and 'type' fields are read to create the table of primary entities alone
+        rows = list(self.meta_processor.read_compressed_meta_dump(self.test_data, columns=['id', 'type']))
+        self.assertTrue(rows)
+        self.assertTrue(all(list(row) == ['id', 'type'] for row in rows))
+
+        for kwargs in [{}, {'workers': 2}]:
+            shutil.rmtree(self.actual_output_dir, ignore_errors=True)
+            self.meta_processor.preprocess_meta_tables(self.test_data, self.actual_output_dir,
+                                                       tables=['primary_ents', 'resp_ags'], **kwargs)
+            self.assertEqual(sorted(os.listdir(self.actual_output_dir)), ['primary_ents', 'resp_ags'])
+            for table in ['primary_ents', 'resp_ags']:
+                with open(join(self.expected_output_dir, table, 'test.csv'), 'r', encoding='utf-8') as f:
+                    expected_content = set(tuple(row.items()) for row in csv.DictReader(f))
+                actual_content = set(tuple(row.items()) for row in read_csv_tables(join(self.actual_output_dir, table)))
+                self.assertEqual(expected_content, actual_content)
+
+        with self.assertRaises(ValueError):
+            self.meta_processor.preprocess_meta_tables(self.test_data, self.actual_output_dir, tables=['works'])
+
+    def test_skip_records_with_id_prefix(self):
+        # only the 'id' field is checked, also in quoted fields with escaped quotes, delimiters and line breaks
+        data = ('"id","title"\n"omid:br/1 openalex:W1","a"\n"omid:br/2","about openalex:W2"\n'
+                '"omid:br/3","multi\nline ""openalex:W3"", title"\n"omid:br/4 doi:10.1/openalex:x","b"\n'
+                'omid:br/5 openalex:W5,c\n"omid:br/6","d"\n').encode('utf-8')
+        rows = list(csv.DictReader(skip_records_with_id_prefix(io.BytesIO(data), 'id', 'openalex:'), dialect='unix'))
+        self.assertEqual([row['id'] for row in rows], ['omid:br/2', 'omid:br/3', 'omid:br/4 doi:10.1/openalex:x', 'omid:br/6'])
+        self.assertEqual(rows[1]['title'], 'multi\nline "openalex:W3", title')
+
+        # the prefilter gives the same output as the check on the decoded rows
+        with zipfile.ZipFile(self.test_data_dir_all_rows) as archive:
+            csv_file = [n for n in archive.namelist() if n.endswith('.csv')][0]
+            kept = list(self.meta_processor.read_meta_dump_member(archive, csv_file, skip_openalex=True))
+            all_rows = list(self.meta_processor.read_meta_dump_member(archive, csv_file))
+        self.assertEqual(kept, [r for r in all_rows if not any(pid.startswith('openalex:') for pid in r['id'].split())])
+        self.assertLess(len(kept), len(all_rows))
+
     def assertFilesEqual(self, expected_file, actual_file):
         with open(expected_file, 'r', encoding='utf-8') as expected, open(actual_file, 'r', encoding='utf-8') as actual:
             # convert output files to sets of tuples for comparing them (order of rows is slightly messed